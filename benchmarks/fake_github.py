@@ -0,0 +1,491 @@
+"""
+A local stand-in for the parts of the GitHub API the CMS uses, serving a synthetic data repository.
+
+Run it on its own and point the app at it with GITHUB_API_URL:
+
+    python -m benchmarks.fake_github --items 10,1000 --latency 50 --port 9000
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import re
+import tarfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Set
+
+import yaml
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+REPO = "bench/data"
+BRANCH = "main"
+BLOB_ALIAS = re.compile(r'(b\d+): object\(oid: "([0-9a-f]+)"\)')
+
+
+def git_blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def collection_id_for_size(size: int) -> str:
+    return f"items-{size}"
+
+
+class FakeRepository:
+    def __init__(self, name: str = REPO, branch: str = BRANCH):
+        """
+        An in-memory git repository: blobs, trees as path to blob SHA maps, and commits.
+
+        Args:
+            name (str): Repository name in the format "owner/repo"
+            branch (str): The default branch
+        """
+        self.name = name
+        self.branch = branch
+        self.blobs: Dict[str, bytes] = {}
+        self.trees: Dict[str, Dict[str, str]] = {}
+        self.commits: Dict[str, Dict] = {}
+        self.refs: Dict[str, Optional[str]] = {branch: None}
+        self.private = False
+
+    def add_tree(self, files: Dict[str, str]) -> str:
+        sha = hashlib.sha1("\n".join(f"{path} {sha}" for path, sha in sorted(files.items())).encode("utf-8")).hexdigest()
+        self.trees[sha] = files
+        return sha
+
+    def add_commit(self, tree: str, parents: List[str], message: str) -> str:
+        sha = hashlib.sha1(json.dumps([tree, parents, message, len(self.commits)]).encode("utf-8")).hexdigest()
+        date = datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+        self.commits[sha] = {"tree": tree, "parents": parents, "message": message, "date": date}
+        return sha
+
+    def head(self) -> Optional[str]:
+        return self.refs[self.branch]
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """
+        Resolve "HEAD", a branch or a commit SHA to a commit SHA.
+        """
+        if ref == "HEAD":
+            return self.head()
+        if ref in self.refs:
+            return self.refs[ref]
+        return ref if ref in self.commits else None
+
+    def ancestors(self, commit: str) -> Set[str]:
+        """
+        Get a commit and all the commits it descends from.
+        """
+        found, stack = set(), [commit]
+        while stack:
+            sha = stack.pop()
+            if sha not in found:
+                found.add(sha)
+                stack.extend(self.commits[sha]["parents"])
+        return found
+
+    def compare_status(self, base: str, head: str) -> str:
+        """
+        Describe how head relates to base, as the compare API does.
+        """
+        if base == head:
+            return "identical"
+        if base in self.ancestors(head):
+            return "ahead"
+        return "behind" if head in self.ancestors(base) else "diverged"
+
+    def files_at(self, ref: str) -> Optional[Dict[str, str]]:
+        commit = self.resolve(ref)
+        return self.trees[self.commits[commit]["tree"]] if commit else None
+
+    def change_tree(self, base_tree: Optional[str], changes: Dict[str, Optional[bytes]]) -> str:
+        """
+        Make a tree from a base tree, adding or replacing files and removing those changed to None.
+        """
+        files = dict(self.trees[base_tree]) if base_tree else {}
+        for path, data in changes.items():
+            if data is None:
+                files.pop(path, None)
+            else:
+                sha = git_blob_sha(data)
+                self.blobs[sha] = data
+                files[path] = sha
+        return self.add_tree(files)
+
+    def commit_changes(self, changes: Dict[str, Optional[bytes]], message: str) -> str:
+        """
+        Commit file changes on top of the branch head and move the branch to the new commit.
+        """
+        head = self.head()
+        tree = self.change_tree(self.commits[head]["tree"] if head else None, changes)
+        sha = self.add_commit(tree, [head] if head else [], message)
+        self.refs[self.branch] = sha
+        return sha
+
+
+def make_item(index: int, repeatables: int) -> Dict:
+    """
+    Make a synthetic item with Markdown, a date and repeatable fields nested two levels deep.
+    """
+    return {
+        "data": {
+            "id": f"item-{index:05d}",
+            "title": f"Item {index}",
+            "summary": f"Summary of item {index}, a synthetic item for benchmarking.",
+            "body": f"# Item {index}\n\nSome **Markdown** text.\n\n" + "\n".join(f"- Point {n}" for n in range(5)),
+            "published": "2024-01-%02d" % (index % 28 + 1),
+            "links": [
+                {
+                    "id": f"link-{index}-{n}",
+                    "name": f"Link {n}",
+                    "url": f"https://example.com/{index}/{n}",
+                    "notes": [{"id": f"note-{index}-{n}-{m}", "text": f"Note {m}"} for m in range(2)],
+                }
+                for n in range(repeatables)
+            ],
+        }
+    }
+
+
+def make_collection(size: int) -> Dict:
+    return {
+        "id": collection_id_for_size(size),
+        "label": f"{size} items",
+        "description": f"A synthetic collection of {size} items",
+        "field_map": {"id": "id", "label": "title"},
+        "indexes": ["links/id"],
+        "fields": [
+            {"id": "id", "label": "ID"},
+            {"id": "title", "label": "Title", "type": "string", "editable": True},
+            {"id": "summary", "label": "Summary", "type": "text", "editable": True},
+            {"id": "body", "label": "Body", "type": "govspeak", "editable": True},
+            {"id": "published", "label": "Published", "type": "date", "editable": True},
+            {
+                "id": "links",
+                "label": "Links",
+                "label_single": "Link",
+                "type": "repeatable",
+                "field_map": {"id": "id", "label": "name"},
+                "fields": [
+                    {"id": "id", "label": "ID", "default_value": "generate_uuid()"},
+                    {"id": "name", "label": "Name", "type": "string", "editable": True},
+                    {"id": "url", "label": "URL", "type": "string", "editable": True},
+                    {
+                        "id": "notes",
+                        "label": "Notes",
+                        "label_single": "Note",
+                        "type": "repeatable",
+                        "field_map": {"id": "id", "label": "text"},
+                        "fields": [
+                            {"id": "id", "label": "ID", "default_value": "generate_uuid()"},
+                            {"id": "text", "label": "Text", "type": "string", "editable": True},
+                        ],
+                    },
+                ],
+            },
+        ],
+    }
+
+
+def generate_repository(sizes: Sequence[int], repeatables: int = 3) -> FakeRepository:
+    """
+    Generate a data repository with a collection of each size, e.g. "items-1000" with 1,000 items.
+
+    Args:
+        sizes (Sequence[int]): Number of items in each collection
+        repeatables (int): Number of repeatable "links" in each item, each with two nested "notes"
+    """
+    repository = FakeRepository()
+    changes = {"config.yml": yaml.dump({"collections": [make_collection(size) for size in sizes]}).encode("utf-8")}
+    for size in sizes:
+        for index in range(size):
+            item = make_item(index, repeatables)
+            changes[f"data/collections/{collection_id_for_size(size)}/{item['data']['id']}.yml"] = (
+                yaml.dump(item).encode("utf-8")
+            )
+    repository.commit_changes(changes, "Generate benchmark content")
+    return repository
+
+
+def create_app(repository: FakeRepository, latency: float = 0.0) -> Starlette:
+    """
+    Create the fake GitHub API app.
+
+    Every GET response has an ETag and conditional requests get a 304, as on GitHub.
+
+    Args:
+        repository (FakeRepository): The repository to serve
+        latency (float): Seconds to wait before answering each request
+    """
+    stats = {"requests": 0, "by_route": {}}
+
+    def not_found() -> Response:
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    def check_repo(request: Request) -> bool:
+        return f"{request.path_params['owner']}/{request.path_params['repo']}" == repository.name
+
+    async def user(request: Request) -> Response:
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse({"message": "Requires authentication"}, status_code=401)
+        return JSONResponse({"login": "benchmark", "id": 1, "name": "Benchmark User", "email": None})
+
+    async def repo(request: Request) -> Response:
+        if not check_repo(request):
+            return not_found()
+        return JSONResponse({
+            "full_name": repository.name,
+            "default_branch": repository.branch,
+            "private": repository.private,
+            "permissions": {"admin": False, "push": True, "pull": True},
+        })
+
+    async def contents(request: Request) -> Response:
+        if not check_repo(request):
+            return not_found()
+        path = request.path_params["path"].strip("/")
+
+        if request.method == "PUT":
+            body = await request.json()
+            current = repository.files_at(repository.branch).get(path)
+            if current is not None and body.get("sha") != current:
+                return JSONResponse({"message": f"{path} does not match {body.get('sha')}"}, status_code=409)
+            parent = repository.head()
+            commit = repository.commit_changes({path: base64.b64decode(body["content"])}, body.get("message", ""))
+            return JSONResponse({
+                "content": {"name": path.rsplit("/", 1)[-1], "path": path, "sha": repository.files_at(commit)[path]},
+                "commit": {"sha": commit, "parents": [{"sha": parent}]},
+            })
+
+        files = repository.files_at(request.query_params.get("ref", "HEAD"))
+        if files is None:
+            return not_found()
+        if path in files:
+            data = repository.blobs[files[path]]
+            return JSONResponse({
+                "type": "file",
+                "name": path.rsplit("/", 1)[-1],
+                "path": path,
+                "sha": files[path],
+                "size": len(data),
+                "encoding": "base64",
+                "content": base64.b64encode(data).decode("ascii"),
+            })
+        prefix = path + "/"
+        entries = [
+            {"type": "file", "name": file_path[len(prefix):], "path": file_path, "sha": sha}
+            for file_path, sha in sorted(files.items())
+            if file_path.startswith(prefix) and "/" not in file_path[len(prefix):]
+        ]
+        return JSONResponse(entries) if entries else not_found()
+
+    async def commit(request: Request) -> Response:
+        if not check_repo(request):
+            return not_found()
+        sha = repository.resolve(request.path_params["ref"])
+        if sha is None:
+            return JSONResponse({"message": "No commit found"}, status_code=422)
+        if request.headers.get("accept") == "application/vnd.github.sha":
+            return Response(sha, media_type="text/plain")
+        commit = repository.commits[sha]
+        return JSONResponse({"sha": sha, "commit": {"message": commit["message"], "committer": {"date": commit["date"]}}})
+
+    async def compare(request: Request) -> Response:
+        if not check_repo(request):
+            return not_found()
+        base, _, head = request.path_params["spec"].partition("...")
+        before, after = repository.files_at(base), repository.files_at(head)
+        if before is None or after is None:
+            return not_found()
+        files = []
+        for path in sorted(set(before) | set(after)):
+            if path not in after:
+                files.append({"filename": path, "status": "removed"})
+            elif path not in before:
+                files.append({"filename": path, "status": "added"})
+            elif before[path] != after[path]:
+                files.append({"filename": path, "status": "modified"})
+        status = repository.compare_status(repository.resolve(base), repository.resolve(head))
+        return JSONResponse({"status": status, "files": files[:300]})
+
+    async def tree(request: Request) -> Response:
+        if not check_repo(request):
+            return not_found()
+        ref, _, path = request.path_params["tree_ish"].partition(":")
+        files = repository.trees.get(ref) or repository.files_at(ref)
+        if files is None:
+            return not_found()
+        prefix = path.strip("/") + "/" if path.strip("/") else ""
+        entries = {}
+        subtrees: Dict[str, Dict[str, str]] = {}
+        for file_path, sha in sorted(files.items()):
+            if not file_path.startswith(prefix):
+                continue
+            name, _, rest = file_path[len(prefix):].partition("/")
+            if rest:
+                subtrees.setdefault(name, {})[rest] = sha
+                entries.setdefault(name, {"path": name, "mode": "040000", "type": "tree"})
+            else:
+                entries[name] = {"path": name, "mode": "100644", "type": "blob", "sha": sha, "size": len(repository.blobs[sha])}
+        if not entries:
+            return not_found()
+        # As on GitHub, the SHA of a directory changes whenever any of the files under it do
+        for name, subtree in subtrees.items():
+            entries[name]["sha"] = repository.add_tree(subtree)
+        return JSONResponse({"sha": ref, "tree": list(entries.values()), "truncated": False})
+
+    async def blob(request: Request) -> Response:
+        if not check_repo(request) or request.path_params["sha"] not in repository.blobs:
+            return not_found()
+        data = repository.blobs[request.path_params["sha"]]
+        if request.headers.get("accept") == "application/vnd.github.raw":
+            return Response(data, media_type="application/vnd.github.raw")
+        return JSONResponse({"sha": request.path_params["sha"], "encoding": "base64", "content": base64.b64encode(data).decode("ascii")})
+
+    async def tarball(request: Request) -> Response:
+        if not check_repo(request):
+            return not_found()
+        sha = repository.resolve(request.path_params["ref"])
+        if sha is None:
+            return not_found()
+        buffer = io.BytesIO()
+        top = f"{repository.name.replace('/', '-')}-{sha[:7]}"
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for path, blob_sha in repository.files_at(sha).items():
+                data = repository.blobs[blob_sha]
+                info = tarfile.TarInfo(f"{top}/{path}")
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        return Response(buffer.getvalue(), media_type="application/x-gzip")
+
+    async def graphql(request: Request) -> Response:
+        query = (await request.json()).get("query", "")
+        result = {}
+        for alias, sha in BLOB_ALIAS.findall(query):
+            data = repository.blobs.get(sha)
+            result[alias] = {"text": data.decode("utf-8"), "isTruncated": False, "isBinary": False} if data is not None else None
+        return JSONResponse({"data": {"repository": result}})
+
+    async def ref(request: Request) -> Response:
+        if not check_repo(request) or request.path_params["branch"] not in repository.refs:
+            return not_found()
+        branch = request.path_params["branch"]
+        if request.method == "PATCH":
+            body = await request.json()
+            new = repository.commits.get(body["sha"])
+            if new is None:
+                return JSONResponse({"message": "Object does not exist"}, status_code=422)
+            if not body.get("force") and repository.refs[branch] not in new["parents"]:
+                return JSONResponse({"message": "Update is not a fast forward"}, status_code=422)
+            repository.refs[branch] = body["sha"]
+        return JSONResponse({"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": repository.refs[branch]}})
+
+    async def git_commit(request: Request) -> Response:
+        if not check_repo(request):
+            return not_found()
+        if request.method == "POST":
+            body = await request.json()
+            if body["tree"] not in repository.trees:
+                return JSONResponse({"message": "Tree SHA does not exist"}, status_code=422)
+            sha = repository.add_commit(body["tree"], body.get("parents", []), body.get("message", ""))
+        else:
+            sha = request.path_params["sha"]
+            if sha not in repository.commits:
+                return not_found()
+        commit = repository.commits[sha]
+        return JSONResponse(
+            {
+                "sha": sha,
+                "tree": {"sha": commit["tree"]},
+                "parents": [{"sha": parent} for parent in commit["parents"]],
+                "message": commit["message"],
+                "committer": {"date": commit["date"]}
+            },
+            status_code=201 if request.method == "POST" else 200
+        )
+
+    async def create_tree(request: Request) -> Response:
+        if not check_repo(request):
+            return not_found()
+        body = await request.json()
+        changes = {
+            entry["path"]: entry["content"].encode("utf-8") if entry.get("content") is not None else None
+            for entry in body.get("tree", [])
+        }
+        return JSONResponse({"sha": repository.change_tree(body.get("base_tree"), changes)}, status_code=201)
+
+    async def get_stats(request: Request) -> Response:
+        return JSONResponse(stats)
+
+    app = Starlette(routes=[
+        Route("/_stats", get_stats),
+        Route("/user", user),
+        Route("/graphql", graphql, methods=["POST"]),
+        Route("/repos/{owner}/{repo}", repo),
+        Route("/repos/{owner}/{repo}/contents/{path:path}", contents, methods=["GET", "PUT"]),
+        Route("/repos/{owner}/{repo}/commits/{ref}", commit),
+        Route("/repos/{owner}/{repo}/compare/{spec:path}", compare),
+        Route("/repos/{owner}/{repo}/tarball/{ref}", tarball),
+        Route("/repos/{owner}/{repo}/git/trees", create_tree, methods=["POST"]),
+        Route("/repos/{owner}/{repo}/git/trees/{tree_ish:path}", tree),
+        Route("/repos/{owner}/{repo}/git/blobs/{sha}", blob),
+        Route("/repos/{owner}/{repo}/git/commits", git_commit, methods=["POST"]),
+        Route("/repos/{owner}/{repo}/git/commits/{sha}", git_commit),
+        Route("/repos/{owner}/{repo}/git/ref/heads/{branch}", ref),
+        Route("/repos/{owner}/{repo}/git/refs/heads/{branch}", ref, methods=["PATCH"]),
+    ])
+
+    @app.middleware("http")
+    async def simulate_github(request: Request, call_next):
+        stats["requests"] += 1
+        route = next((route.path for route in app.routes if route.matches(request.scope)[0].name == "FULL"), "unmatched")
+        stats["by_route"][route] = stats["by_route"].get(route, 0) + 1
+        if latency:
+            await asyncio.sleep(latency)
+
+        response = await call_next(request)
+        if request.method != "GET" or response.status_code != 200:
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        headers = {**dict(response.headers), "ETag": etag}
+        headers.pop("content-length", None)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, status_code=200, headers=headers)
+
+    app.state.stats = stats
+    app.state.repository = repository
+    app.state.started_at = time.time()
+    return app
+
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_github", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=parse_sizes, default=[10, 1000], help="Comma separated collection sizes")
+    parser.add_argument("--repeatables", type=int, default=3, help="Repeatable links in each item")
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds to wait before answering each request")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args(argv)
+
+    app = create_app(generate_repository(args.items, args.repeatables), args.latency / 1000)
+    print(f"Serving {REPO} with collections {', '.join(collection_id_for_size(size) for size in args.items)}")
+    print(f"Run the app with GITHUB_API_URL=http://{args.host}:{args.port} DATA_REPO={REPO}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Benchmark the CMS routes against the local GitHub stand-in, without network access.
+
+    python -m benchmarks.run --items 10,1000 --requests 200 --concurrency 10 --latency 20
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+Each scenario is requested --requests times after a warm-up, reporting p50/p99 latency,
+throughput and the GitHub requests made per request. Results are saved as JSON under
+benchmarks/results so runs can be compared.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+APP_KEY = "benchmark-app-key"
+FAKE_GITHUB_URL = "http://fake-github.local"
+
+# The app reads its settings when it is imported, so they are set first
+os.environ.setdefault("APP_HOST", "http://localhost:8000")
+os.environ.setdefault("APP_KEY", APP_KEY)
+os.environ.setdefault("GITHUB_CLIENT_ID", "benchmark")
+os.environ.setdefault("GITHUB_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("GITHUB_API_URL", FAKE_GITHUB_URL)
+os.environ.setdefault("CONTENT_BACKEND", "github")
+# The stand-in is only connected once the app has started, and each scenario loads what it needs
+os.environ.setdefault("CONTENT_WARMUP", "false")
+
+import httpx
+from itsdangerous import TimestampSigner
+
+from benchmarks.fake_github import REPO, collection_id_for_size, create_app, generate_repository, parse_sizes
+
+os.environ.setdefault("DATA_REPO", REPO)
+
+# (name, method, path template); {collection} and {item} are filled in for each request
+SCENARIOS: List[Tuple[str, str, str]] = [
+    ("home", "GET", "/"),
+    ("collection", "GET", "/collections/{collection}"),
+    ("item", "GET", "/collections/{collection}/{item}"),
+    ("edit", "GET", "/collections/{collection}/{item}/edit"),
+    ("update", "POST", "/collections/{collection}/{item}/update"),
+    ("api_collection", "GET", "/api/v1/collections/{collection}"),
+    ("api_item", "GET", "/api/v1/collections/{collection}/{item}"),
+]
+
+
+def session_cookie(access_token: str = "benchmark-token") -> str:
+    """
+    Sign a session holding an access token, as Starlette's SessionMiddleware does after logging in.
+    """
+    data = base64.b64encode(json.dumps({"user": {"access_token": access_token}}).encode("utf-8"))
+    return TimestampSigner(os.environ["APP_KEY"]).sign(data).decode("utf-8")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Get a nearest-rank percentile, e.g. fraction 0.99 for p99.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    upstream_requests: Callable[[], Awaitable[int]],
+    name: str,
+    method: str,
+    template: str,
+    size: int,
+    requests: int,
+    concurrency: int,
+    warmup: int
+) -> Dict:
+    """
+    Request a scenario repeatedly and summarise its latency, throughput and GitHub requests.
+    """
+    collection_id = collection_id_for_size(size)
+
+    def request_for(index: int) -> Tuple[str, Dict]:
+        path = template.format(collection=collection_id, item=f"item-{index % size:05d}")
+        if method == "POST":
+            return path, {"data": {"title": f"Item {index % size} updated {index}", "summary": "Updated by the benchmark"}}
+        return path, {}
+
+    for index in range(warmup):
+        path, kwargs = request_for(index)
+        await client.request(method, path, **kwargs)
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(index)
+
+    async def worker() -> None:
+        while not queue.empty():
+            path, kwargs = request_for(queue.get_nowait())
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    calls_before = await upstream_requests()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    # Less one for the request asking for the count
+    calls = await upstream_requests() - calls_before - 1
+
+    return {
+        "scenario": name,
+        "items": size,
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "throughput_rps": round(requests / elapsed, 1),
+        "github_requests_per_request": round(calls / requests, 2),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    # Imported here so the settings above are in place first
+    import src.services.github_service as github_service
+    from src.main import app
+
+    if args.github_url:
+        github_client = httpx.AsyncClient()
+    else:
+        github_app = create_app(generate_repository(args.items, args.repeatables), args.latency / 1000)
+        github_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=github_app))
+
+    async def upstream_requests() -> int:
+        response = await github_client.get(f"{os.environ['GITHUB_API_URL']}/_stats")
+        return response.json()["requests"]
+
+    results = []
+    # The app's pooled GitHub client is one that talks to the stand-in, installed before the app starts so that
+    # its startup checks are made against the stand-in too. The app closes it when it shuts down
+    github_service._http_client = github_client
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://benchmark.local",
+            cookies={"session": session_cookie()},
+            timeout=None
+        ) as client:
+            for size in args.items:
+                for name, method, template in SCENARIOS:
+                    if args.scenarios and name not in args.scenarios:
+                        continue
+                    result = await run_scenario(
+                        client, upstream_requests, name, method, template, size, args.requests, args.concurrency, args.warmup
+                    )
+                    results.append(result)
+                    print_result(result)
+
+    return {
+        "started_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        "commit": git_commit(),
+        "settings": {
+            "items": args.items,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "latency_ms": args.latency,
+            "repeatables": args.repeatables,
+            "github_url": args.github_url,
+        },
+        "results": results,
+    }
+
+
+def print_result(result: Dict) -> None:
+    print(
+        f"{result['scenario']:<16} {result['items']:>6} items  p50 {result['p50_ms']:>8.2f} ms  "
+        f"p99 {result['p99_ms']:>8.2f} ms  {result['throughput_rps']:>8.1f} req/s  "
+        f"{result['github_requests_per_request']:>6.2f} GitHub req/req  {result['statuses']}"
+    )
+
+
+def compare(previous: Dict, current: Dict) -> None:
+    """
+    Print how each scenario's latency and throughput changed since a previous run.
+    """
+    before = {(result["scenario"], result["items"]): result for result in previous["results"]}
+    print(f"\nCompared with {previous.get('commit') or 'unknown commit'} at {previous.get('started_at')}:")
+    for result in current["results"]:
+        old = before.get((result["scenario"], result["items"]))
+        if old is None:
+            continue
+        changes = []
+        for key, label in (("p50_ms", "p50"), ("p99_ms", "p99"), ("throughput_rps", "req/s")):
+            change = (result[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            changes.append(f"{label} {old[key]} -> {result[key]} ({change:+.1f}%)")
+        print(f"{result['scenario']:<16} {result['items']:>6} items  " + "  ".join(changes))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=parse_sizes, default=[10, 1000], help="Comma separated collection sizes")
+    parser.add_argument("--repeatables", type=int, default=3, help="Repeatable links in each item")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=5, help="Requests per scenario made before measuring")
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds the GitHub stand-in waits per request")
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), help="Comma separated scenarios to run")
+    parser.add_argument("--github-url", help="Use a stand-in started with python -m benchmarks.fake_github instead")
+    parser.add_argument("--output", help="File to save the results to, defaults to one in benchmarks/results")
+    parser.add_argument("--compare", help="Results of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    if args.github_url:
+        os.environ["GITHUB_API_URL"] = args.github_url
+    results = asyncio.run(run(args))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{results['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(json.load(file), results)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -6,7 +6,7 @@ setup(
     packages=find_packages(where="src"),
     package_dir={"": "src"},
     install_requires=[
-        "requests",
+        "httpx",
         "fastapi",
         "uvicorn",
         "python-dotenv",
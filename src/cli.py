@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables before the services read them
+load_dotenv()
+
+from src.services.content_store import (
+    content_store, git_blob_sha, LocalBackend,
+    COLLECTIONS_PATH, CONTENT_BACKEND, CONTENT_DIR, DATA_REPO, GITHUB_CONTENT_TOKEN
+)
+from src.services.github_service import GithubService, close_http_client
+from src.services.manifest import build_manifest, dump_manifest, manifest_entry, manifest_path
+from src.services.static_export import export_api, extract_tarball, EXPORT_PAGE_SIZE
+from src.services.write_queue import get_write_branch
+
+logger = logging.getLogger(__name__)
+
+
+async def build_manifests(collection_ids: List[str]) -> Dict[str, str]:
+    """
+    Build the manifests of some collections from their items in the content store.
+
+    Items whose blob SHA is unchanged keep the updated time from the current manifest.
+
+    Returns:
+        Dict[str, str]: Manifest text keyed by path, leaving out manifests that are up to date
+    """
+    data_config = await content_store.get_config()
+    files = {}
+    for collection_id in collection_ids or list(data_config.collections):
+        collection = data_config.get_collection(collection_id)
+        if collection is None:
+            raise SystemExit(f"Unknown collection: {collection_id}")
+
+        current = await content_store.get_manifest(collection_id)
+        current_entries = {entry.get("id"): entry for entry in (current.content.get("items") or [] if current else [])}
+        snapshot = await content_store.get_collection(collection_id)
+
+        entries = []
+        for item_id, entry in snapshot.entries.items():
+            previous = current_entries.get(item_id) or {}
+            updated_at = previous.get("updated_at") if previous.get("sha") == entry.sha else None
+            entries.append(manifest_entry(collection, item_id, entry.content, entry.sha, updated_at))
+        for error in snapshot.errors:
+            logger.warning("Left %s/%s out of the manifest: %s", collection_id, error.get("name"), error.get("error"))
+
+        text = dump_manifest(build_manifest(entries))
+        if current is None or git_blob_sha(text.encode("utf-8")) != current.sha:
+            files[manifest_path(COLLECTIONS_PATH, collection_id)] = text
+    return files
+
+
+async def rebuild_index(collection_ids: List[str]) -> None:
+    """
+    Rebuild collection manifests from scratch, committing them to DATA_REPO or writing them to CONTENT_DIR.
+    """
+    if CONTENT_BACKEND == "local":
+        files = await build_manifests(collection_ids)
+        if not files:
+            print("Manifests are up to date")
+        for path, text in files.items():
+            with open(os.path.join(CONTENT_DIR, path), "w", encoding="utf-8") as file:
+                file.write(text)
+            print(f"Wrote {path}")
+        return
+
+    if not GITHUB_CONTENT_TOKEN:
+        raise SystemExit("GITHUB_CONTENT_TOKEN must be set to a token that can write to DATA_REPO")
+
+    github_service = GithubService(access_token=GITHUB_CONTENT_TOKEN)
+
+    async def build(head: str) -> Dict[str, str]:
+        await content_store.refresh(head)
+        return await build_manifests(collection_ids)
+
+    try:
+        commit, files = await github_service.commit_files(
+            DATA_REPO, await get_write_branch(github_service), build, "Rebuild collection manifests"
+        )
+    finally:
+        await close_http_client()
+    if commit is None:
+        print("Manifests are up to date")
+    for path in files:
+        print(f"Committed {path} in {commit['sha'][:7]}")
+
+
+async def export(directory: str, collection_ids: List[str], source: Optional[str], page_size: int) -> None:
+    """
+    Export the public API as static JSON files, rebuilding only those whose sources changed.
+
+    Args:
+        directory (str): The export directory
+        collection_ids (List[str]): Collections to export, all of them if empty
+        source (str, optional): A checkout of DATA_REPO to read, instead of the configured CONTENT_BACKEND
+        page_size (int): Items on each page
+    """
+    if source:
+        content_store.backend = LocalBackend(source)
+
+    try:
+        await content_store.backend.check_access()
+        data_config = await content_store.get_config()
+        for collection_id in collection_ids:
+            if data_config.get_collection(collection_id) is None:
+                raise SystemExit(f"Unknown collection: {collection_id}")
+        written, unchanged, removed = await export_api(
+            directory, collection_ids or list(data_config.collections), page_size, prune=not collection_ids
+        )
+    finally:
+        await close_http_client()
+    print(f"Exported to {directory}: {written} written, {unchanged} unchanged, {removed} removed")
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Mini CMS maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-index", help="Rebuild the _index.yml manifests of collections")
+    rebuild.add_argument("collection_ids", nargs="*", help="Collections to rebuild, defaults to all of them")
+
+    export_parser = commands.add_parser("export", help="Export the public API as static, gzipped JSON files")
+    export_parser.add_argument("directory", help="Directory to export to, kept up to date by later exports")
+    export_parser.add_argument("collection_ids", nargs="*", help="Collections to export, defaults to all of them")
+    export_parser.add_argument(
+        "--source", help="A checkout or tarball of DATA_REPO to export, defaults to the configured CONTENT_BACKEND"
+    )
+    export_parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE, help="Items on each page")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    if args.command == "rebuild-index":
+        asyncio.run(rebuild_index(args.collection_ids))
+    elif args.command == "export":
+        if args.source and os.path.isfile(args.source):
+            with tempfile.TemporaryDirectory() as directory:
+                source = extract_tarball(args.source, directory)
+                asyncio.run(export(args.directory, args.collection_ids, source, args.page_size))
+        else:
+            asyncio.run(export(args.directory, args.collection_ids, args.source, args.page_size))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,15 +1,24 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends, HTTPException, status
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
+from fastapi.exception_handlers import http_exception_handler as default_http_exception_handler
 from dotenv import load_dotenv
 from starlette.middleware.sessions import SessionMiddleware
-from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from src.services.github_service import GithubService
-from src.routes.auth import router as auth_router, get_current_user
+from src.services.github_service import open_http_client, close_http_client, rate_limiter
+from src.services.response_cache import response_cache
+from src.services.shared_cache import shared_cache
+from src.services import metrics
+from src.services.content_store import (
+    content_store, poll_content, warm_up, CONTENT_POLL_INTERVAL, CONTENT_TTL, CONTENT_WARMUP, CONTENT_WARMUP_COLLECTIONS
+)
+from src.routes.auth import router as auth_router, require_repo_access
 from src.routes.collection import router as collection_router
 from src.routes.api import router as api_router
-from src.templates import views, APP_HOST  # Import views from the new module
+from src.routes.webhooks import router as webhooks_router
+from src.templates import views, precompile_views, APP_HOST  # Import views from the new module
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,8 +27,29 @@ DATA_REPO = os.environ.get("DATA_REPO", "")  # Format: owner/repo
 # You should set this in .env
 SECRET_KEY = os.environ.get("APP_KEY", "your-secret-key")
 
-app = FastAPI(servers=[{"url": APP_HOST}])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Compile the views, open the pooled GitHub HTTP client for the lifetime of the app, check the content can be
+    read, warm up the content in the background, and poll for new content if enabled."""
+    await asyncio.to_thread(precompile_views)
+    await open_http_client()
+    await content_store.backend.check_access()
+    app.state.warmup = asyncio.create_task(warm_up(content_store)) if CONTENT_WARMUP else None
+    warm_collections = CONTENT_WARMUP_COLLECTIONS if CONTENT_WARMUP else ""
+    # Warmed up collections are kept loaded in the background, checking for new content every CONTENT_TTL if not polling
+    poll_interval = CONTENT_POLL_INTERVAL or (CONTENT_TTL if warm_collections else 0)
+    poller = asyncio.create_task(poll_content(content_store, poll_interval, warm_collections)) if poll_interval > 0 else None
+    yield
+    for task in (app.state.warmup, poller):
+        if task:
+            task.cancel()
+    await close_http_client()
+
+
+app = FastAPI(servers=[{"url": APP_HOST}], lifespan=lifespan)
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="src/static/dist"), name="static")
@@ -28,23 +58,63 @@ app.mount("/assets", StaticFiles(directory="src/static/assets"),
 
 # Include auth routes
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
-app.include_router(collection_router, prefix="/collections", tags=["collections"], dependencies=[Depends(get_current_user)])
+app.include_router(collection_router, prefix="/collections", tags=["collections"], dependencies=[Depends(require_repo_access)])
 app.include_router(api_router, prefix="/api", tags=["api"])
+app.include_router(webhooks_router, prefix="/api/webhooks", tags=["webhooks"])
 
 @app.get("/")
-async def index(request: Request, user: dict = Depends(get_current_user)):
-    github_service = GithubService(access_token=user.get("access_token"))
-    data_config = github_service.get_repo_content_for_path(
-        DATA_REPO, "config.yml", format="yaml")
-    collections = data_config.get("collections", [])
+async def index(request: Request, user: dict = Depends(require_repo_access)):
+    data_config = await content_store.get_config()
+    collections = data_config.config.get("collections", [])
 
     return views.TemplateResponse(
         request=request, name="index.html", context={"user": user, "collections": collections}
     )
 
 
+@app.get("/status/ready")
+async def readiness(request: Request):
+    """Report whether the content has been warmed up, with a 503 until it has so load balancers hold back traffic"""
+    warmup = getattr(request.app.state, "warmup", None)
+    if warmup is None:
+        return {"ready": True, "collections": []}
+    if not warmup.done() or warmup.cancelled() or warmup.exception() is not None:
+        return JSONResponse({"ready": False}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"ready": True, "collections": warmup.result()}
+
+
+@app.get("/status/cache")
+async def cache_status():
+    """Get the GitHub response cache hit, miss and revalidation counters, and those of the cache shared by workers"""
+    return {**response_cache.stats(), "shared": await shared_cache.run(shared_cache.stats)}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Get request, GitHub call, response cache and rate limit metrics in the Prometheus text format"""
+    cache_stats = response_cache.stats()
+    metrics.github_cache_bytes.set(cache_stats["bytes"])
+    metrics.github_cache_entries.set(cache_stats["entries"])
+
+    rate_limit_stats = rate_limiter.stats()
+    metrics.github_requests_waiting.set(rate_limit_stats["waiting"])
+    metrics.github_rate_limit_remaining.clear()
+    metrics.github_rate_limit_limit.clear()
+    for budget in rate_limit_stats["budgets"]:
+        metrics.github_rate_limit_remaining.set(budget["remaining"], scope=budget["scope"], resource=budget["resource"])
+        metrics.github_rate_limit_limit.set(budget["limit"], scope=budget["scope"], resource=budget["resource"])
+
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/status/rate-limit")
+async def rate_limit_status():
+    """Get the GitHub rate limit budget of each credential and the request scheduler counters"""
+    return rate_limiter.stats()
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     if exc.status_code == status.HTTP_401_UNAUTHORIZED:
         return RedirectResponse(url=request.url_for("auth_login"), status_code=status.HTTP_302_FOUND)
-    raise exc
+    return await default_http_exception_handler(request, exc)
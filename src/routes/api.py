@@ -1,62 +1,428 @@
-from fastapi import APIRouter, Request, Path
-from fastapi.responses import JSONResponse
-from src.services.github_service import GithubService
-from src.routes.collection import get_collection, get_collection_items, get_collection_item
+from fastapi import APIRouter, Depends, Request, Path, Query, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from src.services.content_api import (
+    dumps, get_collection, get_collection_snapshot, get_collection_item_entry, get_collection_item_sha,
+    get_collection_summary, get_collection_version, get_data_config, get_last_modified, make_etag
+)
+from src.services.content_store import content_store, describe_error, item_id_for_file, ItemEntry
+from src.services.markdown_renderer import get_markdown_fields, markdown_renderer
+from src.services.search_index import get_search_fields
+from src.services.collection_query import API_MAX_PAGE_SIZE, get_data, get_page, matches, parse_fields, parse_filters, project
 import os
-import json
-from datetime import datetime
-from typing import Any
+import asyncio
+import logging
+import httpx
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Literal, Optional, Tuple, Union
 
 DATA_REPO = os.environ.get("DATA_REPO", "")  # Format: owner/repo
+# Cache-Control for API responses, so clients and CDNs can reuse them and revalidate with the ETag
+API_CACHE_CONTROL = os.environ.get("API_CACHE_CONTROL", "public, max-age=60")
+# Cache-Control for responses with items that failed to load, which should not be reused without revalidating
+API_CACHE_CONTROL_ERRORS = "no-cache"
+# Bytes of serialized items gathered before a chunk of a streamed response is sent
+STREAM_CHUNK_SIZE = 64 * 1024
+# Publish the content of a private DATA_REPO to anyone through the API. Without it the API refuses to serve it
+API_PUBLISH_PRIVATE_REPO = os.environ.get("API_PUBLISH_PRIVATE_REPO", "false").lower() == "true"
 
-router = APIRouter()
-
-class CustomJSONEncoder(json.JSONEncoder):
-    """Custom JSON encoder to handle datetime objects and other non-serializable types."""
-    def default(self, obj: Any) -> Any:
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
-def serialize_for_json(data: Any) -> Any:
-    """Recursively serialize data to be JSON compatible."""
-    if isinstance(data, dict):
-        return {key: serialize_for_json(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [serialize_for_json(item) for item in data]
-    elif isinstance(data, datetime):
-        return data.isoformat()
-    else:
-        return data
+logger = logging.getLogger(__name__)
+
+async def check_public_access() -> None:
+    """Refuse to publish the content of a private DATA_REPO unless API_PUBLISH_PRIVATE_REPO allows it."""
+    if API_PUBLISH_PRIVATE_REPO:
+        return
+    try:
+        private = await content_store.backend.is_private()
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
+        logger.warning("Error checking whether the content is private: %s", describe_error(e))
+        raise HTTPException(status_code=503, detail="Could not check whether the content is public")
+    if private:
+        raise HTTPException(status_code=403, detail="The content is private and is not published through the API")
+
+router = APIRouter(dependencies=[Depends(check_public_access)])
+
+def json_response(content: Any) -> Response:
+    return Response(content=dumps(content).encode("utf-8"), media_type="application/json")
+
+async def iterate_async(parts: Iterable[str]) -> AsyncIterator[str]:
+    for part in parts:
+        yield part
+
+async def iter_chunks(parts: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[bytes]:
+    """Join serialized parts into chunks of about STREAM_CHUNK_SIZE bytes, parts of items that are still loading as they load."""
+    if not isinstance(parts, AsyncIterable):
+        parts = iterate_async(parts)
+    buffer = []
+    size = 0
+    async for part in parts:
+        data = part.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= STREAM_CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+def iter_json_document(collection: Dict, items: Iterable[Any], extra: Dict) -> Iterable[str]:
+    """Serialize a collection document an item at a time, in the same shape as the non-streamed response.
+
+    Args:
+        collection: The collection configuration
+        items: The items, serialized as they are iterated
+        extra: Keys to add after the collection, e.g. "errors"
+    """
+    yield json_document_start(collection)
+    for index, item in enumerate(items):
+        yield ("," if index else "") + dumps(item)
+    yield json_document_end(extra)
+
+async def iter_loading_json_document(collection: Dict, items: AsyncIterable[Any], errors: List[Dict]) -> AsyncIterator[str]:
+    """Serialize a collection document as its items load, adding the items that failed to load once they all have."""
+    yield json_document_start(collection)
+    index = 0
+    async for item in items:
+        yield ("," if index else "") + dumps(item)
+        index += 1
+    yield json_document_end({"errors": errors} if errors else {})
+
+def json_document_start(collection: Dict) -> str:
+    # The collection without its items ends with "items":[]}, which is reopened to add them
+    head = dumps({"collection": {**{key: value for key, value in collection.items() if key != "items"}, "items": []}})
+    return head[:-3]
+
+def json_document_end(extra: Dict) -> str:
+    return "]}" + "".join(f",{dumps(key)}:{dumps(value)}" for key, value in extra.items()) + "}"
+
+def iter_ndjson(items: Iterable[Any]) -> Iterable[str]:
+    """Serialize items as newline delimited JSON, one item per line."""
+    for item in items:
+        yield dumps(item) + "\n"
+
+async def iter_loading_ndjson(items: AsyncIterable[Any]) -> AsyncIterator[str]:
+    """Serialize items as newline delimited JSON as they load."""
+    async for item in items:
+        yield dumps(item) + "\n"
+
+def get_rendered_fields(collection: Dict, format: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Get the Markdown fields to render to HTML for the requested format, None to return the Markdown."""
+    return get_markdown_fields(collection) if format == "html" else None
+
+def item_content(entry: ItemEntry, rendered_fields: Optional[Tuple[str, ...]]) -> Any:
+    """Get an item, with the Markdown of its fields rendered to HTML if rendered_fields is given."""
+    return entry.content if rendered_fields is None else entry.rendered(rendered_fields)
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Check a request's If-None-Match against a response's ETag, or without one its If-Modified-Since."""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is None:
+        return is_not_modified_since(request, last_modified)
+    # Compared weakly, proxies may mark the ETag weak when they compress the response
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def is_not_modified_since(request: Request, last_modified: Optional[datetime]) -> bool:
+    """Check a request's If-Modified-Since against when the content of a response was committed."""
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+def validator_headers(etag: str, cache_control: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+def not_modified(etag: str, cache_control: str = API_CACHE_CONTROL, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, cache_control, last_modified))
+
+def errors_etag(etag: str, errors: List[Dict]) -> str:
+    """Make the ETag of a response missing items that failed to load, so it is not taken for the complete one."""
+    return make_etag(etag, *(error.get("name") for error in errors)) if errors else etag
+
+def cached_response(
+    request: Request,
+    etag: str,
+    build: Callable[[], Response],
+    cache_control: str = API_CACHE_CONTROL,
+    last_modified: Optional[datetime] = None
+) -> Response:
+    """Respond with 304 if the client has the current version, otherwise build the response.
+
+    ETags are made from the versions of the content a response is built from, so endpoints can check
+    them with is_not_modified before loading that content.
+
+    Args:
+        request: The request, with any If-None-Match or If-Modified-Since header
+        etag: The strong ETag of the content
+        build: Builds the response, only called when the content is sent
+        cache_control: The Cache-Control header to send
+        last_modified: When the content was committed, left out of responses missing items that failed to load
+
+    Returns:
+        A 304 response or the built response, with ETag, Cache-Control and Last-Modified headers
+    """
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, cache_control, last_modified)
+    response = build()
+    response.headers.update(validator_headers(etag, cache_control, last_modified))
+    return response
 
 @router.get("/v1/collections/{collection_id}")
 async def collection(
+    request: Request,
     collection_id: str = Path(..., description="The ID of the collection to retrieve"),
+    limit: Optional[int] = Query(None, ge=1, le=API_MAX_PAGE_SIZE, description="Maximum number of items to return"),
+    cursor: Optional[str] = Query(None, description="The next_cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated IDs of the fields to return"),
+    stream: Optional[Literal["json", "ndjson"]] = Query(
+        None, description="Stream the items as they are serialized, as the usual JSON document or one item per line"
+    ),
+    format: Optional[Literal["html"]] = Query(None, description="Render Markdown fields to HTML"),
 ):
-    github_service = GithubService()
-    collection = get_collection(github_service, collection_id)
-    items = get_collection_items(github_service, collection_id)
+    """Get a collection's items, optionally a page at a time, filtered by "filter[field]" or "filter[field][op]"
+    parameters (op being eq, ne, lt, lte, gt or gte) and projected to some fields."""
+    data_config = await get_data_config()
+    collection = await get_collection(collection_id)
+    field_ids = parse_fields(data_config, collection_id, fields)
+    filters = parse_filters(data_config, collection_id, request.query_params)
+    rendered_fields = get_rendered_fields(collection, format)
+    etag = make_etag(
+        data_config.sha,
+        await get_collection_version(collection_id),
+        request.url.query,
+        rendered_fields and markdown_renderer.settings_key
+    )
+    last_modified = await get_last_modified()
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified=last_modified)
+
+    if stream and limit is None and cursor is None and not await content_store.has_collection(collection_id):
+        return stream_loading_collection(collection, collection_id, stream, filters, field_ids, rendered_fields)
+
+    snapshot = await get_collection_snapshot(collection_id)
+
+    def build() -> Response:
+        next_cursor = None
+        if limit is None and cursor is None and not filters and field_ids is None and rendered_fields is None:
+            items: Iterable[Any] = snapshot.items
+        else:
+            entries, next_cursor = get_page(snapshot, filters, cursor, limit)
+            items = (project(item_content(entry, rendered_fields), field_ids) for entry in entries)
 
-    return JSONResponse(content=serialize_for_json({
-        "collection": {
-            **collection,
-            "items": items
-        }
-    }))
+        extra = {}
+        if limit is not None or cursor is not None:
+            extra["next_cursor"] = next_cursor
+        if snapshot.errors:
+            extra["errors"] = snapshot.errors
+
+        if stream == "ndjson":
+            # Paging and errors are sent as headers, so every line is an item
+            headers = {"X-Item-Errors": str(len(snapshot.errors))}
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+            return StreamingResponse(iter_chunks(iter_ndjson(items)), media_type="application/x-ndjson", headers=headers)
+        if stream == "json":
+            return StreamingResponse(iter_chunks(iter_json_document(collection, items, extra)), media_type="application/json")
+        return json_response({
+            "collection": {
+                **collection,
+                "items": list(items)
+            },
+            **extra
+        })
+
+    return cached_response(
+        request,
+        errors_etag(etag, snapshot.errors),
+        build,
+        API_CACHE_CONTROL_ERRORS if snapshot.errors else API_CACHE_CONTROL,
+        None if snapshot.errors else last_modified
+    )
+
+
+def stream_loading_collection(
+    collection: Dict,
+    collection_id: str,
+    stream: Literal["json", "ndjson"],
+    filters: List[Tuple[str, str, str]],
+    field_ids: Optional[List[str]],
+    rendered_fields: Optional[Tuple[str, ...]]
+) -> Response:
+    """Stream a collection's items while it loads, sending each one as soon as it has been read.
+
+    The items that fail to load are not known until the end, so the response has no ETag or X-Item-Errors
+    header and is not cached. The "json" stream still ends with the "errors".
+    """
+    errors: List[Dict] = []
+
+    async def iter_items() -> AsyncIterator[Any]:
+        async for entry in content_store.iter_collection(collection_id, errors):
+            if not filters or matches(get_data(entry.content), filters):
+                yield project(item_content(entry, rendered_fields), field_ids)
+
+    headers = {"Cache-Control": API_CACHE_CONTROL_ERRORS}
+    if stream == "ndjson":
+        return StreamingResponse(iter_chunks(iter_loading_ndjson(iter_items())), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(
+        iter_chunks(iter_loading_json_document(collection, iter_items(), errors)), media_type="application/json", headers=headers
+    )
+
+
+@router.get("/v1/collections/{collection_id}/_index")
+async def collection_summary(
+    request: Request,
+    collection_id: str = Path(..., description="The ID of the collection to retrieve"),
+):
+    """Get the ID, label, blob SHA and updated time of each item, from the collection's manifest if it has one."""
+    data_config = await get_data_config()
+    collection = await get_collection(collection_id)
+    etag = make_etag(data_config.sha, await get_collection_version(collection_id))
+    last_modified = await get_last_modified()
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified=last_modified)
+    summaries, _ = await get_collection_summary(collection_id)
+
+    return cached_response(
+        request,
+        etag,
+        lambda: json_response({
+            "collection": {
+                **collection,
+                "items": summaries
+            }
+        }),
+        last_modified=last_modified
+    )
+
+
+@router.get("/v1/collections/{collection_id}/by/{field}/{value}")
+async def collection_items_by_field(
+    request: Request,
+    collection_id: str = Path(..., description="The ID of the collection to retrieve"),
+    field: str = Path(..., description="An indexed field path, with nested fields joined by \".\", e.g. links.id"),
+    value: str = Path(..., description="The value to look up"),
+    fields: Optional[str] = Query(None, description="Comma separated IDs of the fields to return"),
+    format: Optional[Literal["html"]] = Query(None, description="Render Markdown fields to HTML"),
+):
+    """Get the items with a value of a field declared under the collection's "indexes" in config.yml."""
+    data_config = await get_data_config()
+    collection = await get_collection(collection_id)
+    field_path = field.replace(".", "/")
+    if not data_config.has_index(collection_id, field_path):
+        raise HTTPException(status_code=404, detail="Index not found")
+    field_ids = parse_fields(data_config, collection_id, fields)
+    rendered_fields = get_rendered_fields(collection, format)
+    etag = make_etag(
+        data_config.sha,
+        await get_collection_version(collection_id),
+        request.url.path,
+        request.url.query,
+        rendered_fields and markdown_renderer.settings_key
+    )
+    last_modified = await get_last_modified()
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified=last_modified)
+    snapshot = await get_collection_snapshot(collection_id)
+    entries = snapshot.lookup(field_path, value)
+
+    return cached_response(
+        request,
+        errors_etag(etag, snapshot.errors),
+        lambda: json_response({
+            "collection": {
+                **collection,
+                "items": [project(item_content(entry, rendered_fields), field_ids) for entry in entries]
+            }
+        }),
+        last_modified=None if snapshot.errors else last_modified
+    )
 
 
 @router.get("/v1/collections/{collection_id}/{item_id}")
 async def collection_item(
+    request: Request,
     collection_id: str = Path(..., description="The ID of the collection to retrieve"),
-    item_id: str = Path(..., description="The ID of the item to retrieve")
+    item_id: str = Path(..., description="The ID of the item to retrieve"),
+    format: Optional[Literal["html"]] = Query(None, description="Render Markdown fields to HTML"),
+):
+    data_config = await get_data_config()
+    collection = await get_collection(collection_id)
+    rendered_fields = get_rendered_fields(collection, format)
+    last_modified = await get_last_modified()
+
+    def item_etag(sha: str) -> str:
+        return make_etag(data_config.sha, sha, rendered_fields and markdown_renderer.settings_key)
+
+    if "If-None-Match" in request.headers or "If-Modified-Since" in request.headers:
+        # The item's blob SHA is listed with the collection's other files, so a 304 does not read the item
+        etag = item_etag(await get_collection_item_sha(collection_id, item_id))
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified=last_modified)
+    entry = await get_collection_item_entry(collection_id, item_id)
+
+    return cached_response(
+        request,
+        item_etag(entry.sha),
+        lambda: json_response({
+            "data": item_content(entry, rendered_fields).get("data", {}),
+            "metadata": {
+                "collection": collection,
+            }
+        }),
+        last_modified=last_modified
+    )
+
+
+@router.get("/v1/search")
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Words to search for"),
+    collection_id: Optional[str] = Query(None, alias="collection", description="Only search this collection"),
+    limit: int = Query(20, ge=1, le=API_MAX_PAGE_SIZE, description="Maximum number of results to return"),
 ):
-    github_service = GithubService()
-    collection = get_collection(github_service, collection_id)
-    item = get_collection_item(github_service, collection_id, item_id)
-
-    return JSONResponse(content=serialize_for_json({
-        "data": item.get("data", {}),
-        "metadata": {
-            "collection": collection,
-        }
-    }))
+    """Search the text, govspeak and label fields of the items in every collection, best match first."""
+    data_config = await get_data_config()
+    if collection_id:
+        await get_collection(collection_id)
+    collection_ids = [collection_id] if collection_id else list(data_config.collections)
+    versions = await asyncio.gather(*(get_collection_version(search_id) for search_id in collection_ids))
+    etag = make_etag(data_config.sha, *versions, request.url.query)
+    last_modified = await get_last_modified()
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified=last_modified)
+    snapshots = await asyncio.gather(*(get_collection_snapshot(search_id) for search_id in collection_ids))
+
+    def build() -> Response:
+        results = []
+        for snapshot in snapshots:
+            collection = data_config.get_collection(snapshot.collection_id)
+            label_field = (collection.get("field_map") or {}).get("label")
+            for entry, score in snapshot.search(get_search_fields(collection), q):
+                item_id = item_id_for_file(entry.name)
+                results.append({
+                    "collection": snapshot.collection_id,
+                    "id": item_id,
+                    "label": get_data(entry.content).get(label_field),
+                    "score": round(score, 4),
+                    "url": f"/api/v1/collections/{snapshot.collection_id}/{item_id}"
+                })
+        results.sort(key=lambda result: -result["score"])
+        return json_response({"query": q, "results": results[:limit]})
+
+    errors = [error for snapshot in snapshots for error in snapshot.errors]
+    return cached_response(
+        request,
+        errors_etag(etag, errors),
+        build,
+        last_modified=None if errors else last_modified
+    )
@@ -3,6 +3,9 @@ from fastapi import APIRouter, Request, Depends, HTTPException, status
 from fastapi.responses import RedirectResponse
 from fastapi_sso.sso.github import GithubSSO
 from src.services.github_service import GithubService
+from src.services.metrics import timing
+from src.services.rate_limit import PRIORITY_INTERACTIVE, content_priority
+from src.services.user_cache import repo_access_cache, user_cache
 
 # Load environment variables
 APP_HOST = os.environ["APP_HOST"]
@@ -21,24 +24,49 @@ sso = GithubSSO(
 
 
 async def get_current_user(request: Request):
+    # Resolve the user once per request, however many dependencies ask for it
+    current_user = getattr(request.state, "current_user", None)
+    if current_user:
+        return current_user
+
     session_user = request.session.get("user")
 
-    if not session_user:
+    if not session_user or not session_user.get("access_token"):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated"
         )
 
-    github_service = GithubService(
-        access_token=session_user.get("access_token"))
-    user = github_service.get_current_user()
+    access_token = session_user.get("access_token")
+    github_service = GithubService(access_token=access_token)
+    with timing("auth"):
+        user = await user_cache.get(access_token, github_service.get_current_user)
 
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated"
         )
-    return {**user, "access_token": session_user.get("access_token")}
+    request.state.current_user = {**user, "access_token": access_token}
+    # Content an editor is waiting for is loaded ahead of the warm-up, the poller and the public API
+    content_priority.set(PRIORITY_INTERACTIVE)
+    return request.state.current_user
+
+
+async def require_repo_access(user: dict = Depends(get_current_user)):
+    # Content is read with the app's token rather than the editor's, so check the editor could read it themselves
+    if not DATA_REPO:
+        return user
+
+    github_service = GithubService(access_token=user["access_token"])
+    access = await repo_access_cache.get(user["access_token"], lambda: github_service.check_repo_access(DATA_REPO))
+
+    if not access["has_access"] or not access["permissions"]["read"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No access to the data repository"
+        )
+    return user
 
 
 @router.get("/user")
@@ -74,6 +102,10 @@ async def auth_callback(request: Request):
 @router.get("/logout")
 async def auth_logout(request: Request):
     """Logout"""
+    access_token = request.session.get("user", {}).get("access_token")
+    if access_token:
+        user_cache.forget(access_token)
+        repo_access_cache.forget(access_token)
     request.session.clear()
     return RedirectResponse(url=request.url_for("auth_logout_success"))
 
@@ -102,4 +134,4 @@ async def check_repo_access(request: Request, user: dict = Depends(get_current_u
 
     github_service = GithubService(access_token=access_token)
 
-    return github_service.check_repo_access(DATA_REPO)
\ No newline at end of file
+    return await github_service.check_repo_access(DATA_REPO)
\ No newline at end of file
@@ -1,60 +1,133 @@
-from fastapi import APIRouter, Request, Depends, Path, HTTPException
+from fastapi import APIRouter, Request, Depends, Path, Query, HTTPException
 from fastapi.responses import RedirectResponse
 from src.routes.auth import get_current_user
 from src.services.github_service import GithubService
+from src.services.content_api import (
+    get_collection, get_collection_snapshot, get_collection_item_entry, get_collection_summary, get_data_config
+)
+from src.services.content_store import content_store, ItemEntry, COLLECTIONS_PATH
+from src.services.data_config import DataConfig
+from src.services.search_index import get_search_fields
+from src.services.write_queue import commit_items, write_queue
+from src.services.yaml_loader import dump_yaml, load_yaml
 from src.templates import views
 import os
-from fastapi.templating import Jinja2Templates
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 import uuid
 
 DATA_REPO = os.environ.get("DATA_REPO", "")  # Format: owner/repo
 
 router = APIRouter()
 
-def get_collection(github_service: GithubService, collection_id: str) -> Dict:
-    """Get collection configuration by ID."""
-    data_config = github_service.get_repo_content_for_path(DATA_REPO, "config.yml", format="yaml")
-    collection = next((c for c in data_config.get("collections", []) if c.get("id") == collection_id), None)
-    if not collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
-    return collection
+async def get_collection_items(collection_id: str) -> Tuple[List[Dict], List[Dict]]:
+    """Get all items in a collection from the content store.
 
-def get_collection_items(github_service: GithubService, collection_id: str) -> List[Dict]:
-    items = []
-    try:
-        items = github_service.list_files_in_directory(DATA_REPO, f"/data/collections/{collection_id}")
-        # Filter out directories and non-YAML files
-        items = [item for item in items if item.get("type") == "file" and
-                (item.get("name").endswith(".yml") or item.get("name").endswith(".yaml"))]
-        # Transform items to get their content
-        items = list(map(
-            lambda item: github_service.get_repo_content_for_path(
-                DATA_REPO, f"/data/collections/{collection_id}/{item.get('name')}", format="yaml"
-            ),
-            items
-        ))
-    except Exception as e:
-        print(f"Error listing files in directory: {str(e)}")
-
-    return items
-
-def get_collection_item(github_service: GithubService, collection_id: str, item_id: str) -> Dict:
-    return github_service.get_repo_content_for_path(
-        DATA_REPO, f"/data/collections/{collection_id}/{item_id}.yml", format="yaml"
-    )
+    Args:
+        collection_id: The ID of the collection
+
+    Returns:
+        Tuple containing:
+        - Items in directory order
+        - Errors for items that failed to load, as dicts with "name" and "error"
+    """
+    collection = await get_collection_snapshot(collection_id)
+    return collection.items, collection.errors
+
+def summary_items(collection: Dict, summaries: List[Dict]) -> List[Dict]:
+    """Turn item summaries into items with just the field_map ID and label, for listing them."""
+    field_map = collection.get("field_map") or {}
+    return [
+        {"data": {field_map.get("id"): summary.get("id"), field_map.get("label"): summary.get("label")}}
+        for summary in summaries
+    ]
+
+async def search_collection_items(collection_id: str, query: str) -> List[Tuple[ItemEntry, float]]:
+    """Search the text, govspeak and label fields of a collection's items.
+
+    Args:
+        collection_id: The ID of the collection
+        query: The words to search for
+
+    Returns:
+        List of (item, score) tuples, best match first
+    """
+    collection = await get_collection(collection_id)
+    snapshot = await get_collection_snapshot(collection_id)
+    return snapshot.search(get_search_fields(collection), query)
+
+async def get_collection_item(collection_id: str, item_id: str) -> Dict:
+    """Get a collection item from the content store."""
+    return (await get_collection_item_entry(collection_id, item_id)).content
+
+async def bulk_update_items(
+    github_service: GithubService,
+    collection_id: str,
+    updates: Dict[str, Dict[str, Any]],
+    commit_message: str
+) -> Optional[Dict]:
+    """Update the editable fields of many items in a single commit.
+
+    Args:
+        github_service: GitHub service with the editor's access token
+        collection_id: The ID of the collection
+        updates: New field values keyed by item ID, then by field ID
+        commit_message: The commit message
 
-def get_field_by_path(collection: Dict, field_path: str) -> Tuple[Dict, Any, List[str]]:
-    """Get field configuration and data by path.
+    Returns:
+        The commit, or None if no item changed
+    """
+    collection = await get_collection(collection_id)
+    # Repeatable fields are edited an entry at a time, not given a value
+    editable_fields = {
+        field.get("id") for field in collection.get("fields", [])
+        if field.get("editable") == True and field.get("type") != "repeatable"
+    }
+    for data in updates.values():
+        for field_id in data:
+            if field_id not in editable_fields:
+                raise HTTPException(status_code=400, detail=f"Field is not editable: {field_id}")
+
+    path = f"{COLLECTIONS_PATH}/{collection_id}"
+
+    async def edit_items(head: str) -> Dict[str, Any]:
+        # Read the items at the head being committed on, so a retry applies the edits to the latest content
+        files = await github_service.list_tree_files(DATA_REPO, head, path)
+        shas = {entry.get("path"): entry.get("sha") for entry in files}
+        missing = [item_id for item_id in updates if f"{item_id}.yml" not in shas]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Items not found: {', '.join(missing)}")
+
+        entries = [{"path": f"{item_id}.yml", "sha": shas[f"{item_id}.yml"]} for item_id in updates]
+        texts = await github_service.get_file_contents(DATA_REPO, head, path, entries)
+
+        contents = {}
+        for entry in entries:
+            if entry["sha"] not in texts:
+                raise HTTPException(status_code=502, detail="Failed to load collection items")
+            item_id = entry["path"][:-len(".yml")]
+            item_content = load_yaml(texts[entry["sha"]]) or {}
+            if not isinstance(item_content, dict) or not isinstance(item_content.setdefault("data", {}), dict):
+                raise HTTPException(status_code=400, detail=f"Item cannot be edited: {item_id}")
+            item_content["data"].update(updates[item_id])
+            # Items that already have the new values are left out of the commit
+            if dump_yaml(item_content) != texts[entry["sha"]]:
+                contents[f"{path}/{entry['path']}"] = item_content
+        return contents
+
+    commit, _ = await commit_items(github_service, DATA_REPO, collection_id, edit_items, commit_message)
+    return commit
+
+def get_field_by_path(data_config: DataConfig, collection_id: str, field_path: str) -> Tuple[Dict, List[str]]:
+    """Get field configuration by path.
 
     Args:
-        collection: Collection configuration
+        data_config: The data config
+        collection_id: The ID of the collection
         field_path: Path to the field (e.g. "field1/0/field2/1")
 
     Returns:
         Tuple containing:
         - Field configuration
-        - Field data
         - List of path parts
     """
     field_parts = field_path.split("/")
@@ -62,13 +135,13 @@ def get_field_by_path(collection: Dict, field_path: str) -> Tuple[Dict, Any, Lis
         raise HTTPException(status_code=400, detail="Invalid field path format")
 
     # Get first level field
-    field = next((f for f in collection.get("fields", []) if f.get("id") == field_parts[0]), None)
+    field = data_config.get_field(collection_id, field_parts[0])
     if not field:
         raise HTTPException(status_code=404, detail="Field not found")
 
     # Get second level field if needed
     if len(field_parts) > 2:
-        field = next((f for f in field.get("fields", []) if f.get("id") == field_parts[2]), None)
+        field = data_config.get_field(collection_id, field_parts[0], field_parts[2])
         if not field:
             raise HTTPException(status_code=404, detail="Nested field not found")
 
@@ -99,18 +172,86 @@ def update_field_data(item_data: Dict, field_parts: List[str], field_data: Dict)
 
 
 @router.get("/{collection_id}")
-async def index(request: Request, user: dict = Depends(get_current_user), collection_id: str = Path(..., description="The ID of the collection to retrieve")):
-    github_service = GithubService(access_token=user.get("access_token"))
-    collection = get_collection(github_service, collection_id)
-    items = get_collection_items(github_service, collection_id)
+async def index(
+    request: Request,
+    user: dict = Depends(get_current_user),
+    collection_id: str = Path(..., description="The ID of the collection to retrieve"),
+    q: str = Query("", description="Words to search the items for")
+):
+    collection = await get_collection(collection_id)
+    data_config = await get_data_config()
+    if q.strip():
+        items = [entry.content for entry, _ in await search_collection_items(collection_id, q)]
+        errors = (await get_collection_snapshot(collection_id)).errors
+        # Search results are not cached as a fragment
+        list_version = None
+    else:
+        summaries, list_version = await get_collection_summary(collection_id)
+        items = summary_items(collection, summaries)
+        # Without a manifest the items were loaded, so any that failed can be reported
+        manifest = await content_store.get_manifest(collection_id)
+        errors = (await get_collection_snapshot(collection_id)).errors if manifest is None else []
 
     return views.TemplateResponse(
         request=request,
         name="collection/collection.html",
+        context={
+            "user": user,
+            "collection": collection,
+            "items": items,
+            "errors": errors,
+            "query": q.strip(),
+            "config_version": data_config.sha,
+            "list_version": list_version
+        }
+    )
+
+
+@router.get("/{collection_id}/bulk-edit")
+async def bulk_edit(
+    request: Request,
+    user: dict = Depends(get_current_user),
+    collection_id: str = Path(..., description="The ID of the collection to retrieve")
+):
+    collection = await get_collection(collection_id)
+    summaries, _ = await get_collection_summary(collection_id)
+    items = summary_items(collection, summaries)
+
+    return views.TemplateResponse(
+        request=request,
+        name="collection/edit/bulk-edit-collection.html",
         context={"user": user, "collection": collection, "items": items}
     )
 
 
+@router.post("/{collection_id}/bulk-update")
+async def bulk_update(
+    request: Request,
+    user: dict = Depends(get_current_user),
+    collection_id: str = Path(..., description="The ID of the collection to retrieve")
+):
+    """Update many items in one commit, from the bulk edit form (item_ids, field and value) or a JSON body
+    of the form {"updates": {"<item id>": {"<field id>": "<value>"}}, "message": "<optional commit message>"}."""
+    github_service = GithubService(access_token=user.get("access_token"))
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        body = await request.json()
+        updates = body.get("updates") if isinstance(body, dict) else None
+        if not isinstance(updates, dict) or not all(isinstance(data, dict) for data in updates.values()):
+            raise HTTPException(status_code=400, detail="Invalid updates")
+        commit_message = body.get("message") or f"Update {len(updates)} items in collection {collection_id}"
+    else:
+        form_data = await request.form()
+        updates = {item_id: {form_data.get("field"): form_data.get("value")} for item_id in form_data.getlist("item_ids")}
+        commit_message = f"Update {form_data.get('field')} of {len(updates)} items in collection {collection_id}"
+
+    commit = await bulk_update_items(github_service, collection_id, updates, commit_message) if updates else None
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return {"commit": commit.get("sha") if commit else None, "items": list(updates)}
+    return RedirectResponse(url=request.url_for("index", collection_id=collection_id), status_code=303)
+
+
 @router.get("/{collection_id}/{item_id}")
 async def item(
     request: Request,
@@ -118,11 +259,8 @@ async def item(
     collection_id: str = Path(..., description="The ID of the collection to retrieve"),
     item_id: str = Path(..., description="The ID of the item to retrieve")
 ):
-    github_service = GithubService(access_token=user.get("access_token"))
-    collection = get_collection(github_service, collection_id)
-    item = github_service.get_repo_content_for_path(
-        DATA_REPO, f"/data/collections/{collection_id}/{item_id}.yml", format="yaml"
-    )
+    collection = await get_collection(collection_id)
+    item = await get_collection_item(collection_id, item_id)
 
     return views.TemplateResponse(
         request=request,
@@ -138,16 +276,19 @@ async def edit_item(
     collection_id: str = Path(..., description="The ID of the collection to retrieve"),
     item_id: str = Path(..., description="The ID of the item to retrieve")
 ):
-    github_service = GithubService(access_token=user.get("access_token"))
-    collection = get_collection(github_service, collection_id)
-    item = github_service.get_repo_content_for_path(
-        DATA_REPO, f"/data/collections/{collection_id}/{item_id}.yml", format="yaml"
-    )
+    collection = await get_collection(collection_id)
+    entry = await get_collection_item_entry(collection_id, item_id)
 
     return views.TemplateResponse(
         request=request,
         name="collection/edit/edit-collection-item.html",
-        context={"user": user, "item": item, "collection": collection}
+        context={
+            "user": user,
+            "item": entry.content,
+            "collection": collection,
+            "config_version": (await get_data_config()).sha,
+            "item_sha": entry.sha
+        }
     )
 
 
@@ -160,25 +301,20 @@ async def update_item(
 ):
     item_file_path = f"/data/collections/{collection_id}/{item_id}.yml"
     github_service = GithubService(access_token=user.get("access_token"))
-    collection = get_collection(github_service, collection_id)
-    item = github_service.get_repo_content_for_path(
-        DATA_REPO, item_file_path, format="yaml", get_sha=True
-    )
-
-    item_content = item.get("content")
+    collection = await get_collection(collection_id)
     editable_fields = [field.get("id") for field in collection.get("fields", []) if field.get("editable") and field.get("editable") == True]
     form_data = await request.form()
+    changes = {field: form_data.get(field) for field in editable_fields}
 
-    for field in editable_fields:
-        item_content["data"][field] = form_data.get(field)
+    def edit(item_content: Dict) -> None:
+        item_content["data"].update(changes)
 
-    github_service.update_repo_content(
+    await write_queue.submit(
+        github_service,
         DATA_REPO,
         item_file_path,
-        item_content,
-        format="yaml",
-        commit_message=f"Update collection item {collection_id}/{item_id}",
-        sha=item.get("sha")
+        edit,
+        commit_message=f"Update collection item {collection_id}/{item_id}"
     )
 
     return RedirectResponse(url=request.url_for("item", collection_id=collection_id, item_id=item_id), status_code=303)
@@ -192,13 +328,10 @@ async def edit_repeatable_item(
     item_id: str = Path(..., description="The ID of the item to retrieve"),
     field_path: str = Path(..., description="The path of the field to retrieve")
 ):
-    github_service = GithubService(access_token=user.get("access_token"))
-    collection = get_collection(github_service, collection_id)
-    item = github_service.get_repo_content_for_path(
-        DATA_REPO, f"/data/collections/{collection_id}/{item_id}.yml", format="yaml"
-    )
+    collection = await get_collection(collection_id)
+    item = await get_collection_item(collection_id, item_id)
 
-    field, field_parts = get_field_by_path(collection, field_path)
+    field, field_parts = get_field_by_path(await get_data_config(), collection_id, field_path)
     repeatable_field_data = get_field_data(item, field_parts)
 
     return views.TemplateResponse(
@@ -225,36 +358,31 @@ async def update_repeatable_item(
 ):
     item_file_path = f"/data/collections/{collection_id}/{item_id}.yml"
     github_service = GithubService(access_token=user.get("access_token"))
-    collection = get_collection(github_service, collection_id)
-    item = github_service.get_repo_content_for_path(
-        DATA_REPO, item_file_path, format="yaml", get_sha=True
-    )
-
-    item_content = item.get("content")
+    await get_collection(collection_id)
     form_data = await request.form()
-    field, field_parts = get_field_by_path(collection, field_path)
+    field, field_parts = get_field_by_path(await get_data_config(), collection_id, field_path)
 
     # Get editable fields
     editable_fields = [f.get("id") for f in field.get("fields", []) if f.get("editable") and f.get("editable") == True]
+    changes = {field_id: form_data.get(field_id) for field_id in editable_fields}
 
-    # Get current field data
-    repeatable_field_data = get_field_data(item_content, field_parts)
+    def edit(item_content: Dict) -> None:
+        # Get current field data
+        repeatable_field_data = get_field_data(item_content, field_parts)
 
-    # Update field data
-    for field_id in editable_fields:
-        repeatable_field_data[field_id] = form_data.get(field_id)
+        # Update field data
+        repeatable_field_data.update(changes)
 
-    # Update the item content
-    update_field_data(item_content, field_parts, repeatable_field_data)
+        # Update the item content
+        update_field_data(item_content, field_parts, repeatable_field_data)
 
     # Update the item in the repository
-    github_service.update_repo_content(
+    await write_queue.submit(
+        github_service,
         DATA_REPO,
         item_file_path,
-        item_content,
-        format="yaml",
-        commit_message=f"Update collection item {collection_id}/{item_id}",
-        sha=item.get("sha")
+        edit,
+        commit_message=f"Update collection item {collection_id}/{item_id}"
     )
 
     return RedirectResponse(url=request.url_for("edit_repeatable_item", collection_id=collection_id, item_id=item_id, field_path=field_path), status_code=303)
@@ -268,13 +396,11 @@ async def new_repeatable_item(
     item_id: str = Path(..., description="The ID of the item to retrieve"),
     field_id: str = Path(..., description="The ID of the field to retrieve")
 ):
-    github_service = GithubService(access_token=user.get("access_token"))
-    collection = get_collection(github_service, collection_id)
-    item = github_service.get_repo_content_for_path(
-        DATA_REPO, f"/data/collections/{collection_id}/{item_id}.yml", format="yaml"
-    )
+    collection = await get_collection(collection_id)
+    item = await get_collection_item(collection_id, item_id)
 
-    repeatable_field = next((f for f in collection.get("fields", []) if f.get("id") == field_id), None)
+    data_config = await get_data_config()
+    repeatable_field = data_config.get_field(collection_id, field_id)
 
     return views.TemplateResponse(
         request=request,
@@ -298,16 +424,12 @@ async def create_repeatable_item(
 ):
     item_file_path = f"/data/collections/{collection_id}/{item_id}.yml"
     github_service = GithubService(access_token=user.get("access_token"))
-    collection = get_collection(github_service, collection_id)
-    item = github_service.get_repo_content_for_path(
-        DATA_REPO, item_file_path, format="yaml", get_sha=True
-    )
-
-    item_content = item.get("content")
+    await get_collection(collection_id)
     form_data = await request.form()
 
     # Get the repeatable field
-    repeatable_field = next((f for f in collection.get("fields", []) if f.get("id") == field_id), None)
+    data_config = await get_data_config()
+    repeatable_field = data_config.get_field(collection_id, field_id)
 
     # Create a new item
     new_item = {}
@@ -318,17 +440,16 @@ async def create_repeatable_item(
         else:
             new_item[field.get("id")] = form_data.get(field.get("id"))
 
-    # Update the item content
-    item_content["data"][field_id].append(new_item)
+    def edit(item_content: Dict) -> None:
+        item_content["data"][field_id].append(new_item)
 
     # Update the item in the repository
-    github_service.update_repo_content(
+    await write_queue.submit(
+        github_service,
         DATA_REPO,
         item_file_path,
-        item_content,
-        format="yaml",
-        commit_message=f"Create new collection item {collection_id}/{item_id}",
-        sha=item.get("sha")
+        edit,
+        commit_message=f"Create new collection item {collection_id}/{item_id}"
     )
 
     return RedirectResponse(url=request.url_for("item", collection_id=collection_id, item_id=item_id), status_code=303)
@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+import logging
+import os
+from fastapi import APIRouter, Request, HTTPException, status
+from src.services.content_store import content_store, describe_error, DATA_REF
+
+DATA_REPO = os.environ.get("DATA_REPO", "")  # Format: owner/repo
+# The secret set on the DATA_REPO webhook, requests without a valid signature are rejected
+GITHUB_WEBHOOK_SECRET = os.environ.get("GITHUB_WEBHOOK_SECRET", "")
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def verify_signature(body: bytes, signature: str) -> bool:
+    """Check a webhook body against its X-Hub-Signature-256 header.
+
+    Args:
+        body: The raw request body
+        signature: The signature header, "sha256=<hex digest>"
+
+    Returns:
+        Whether the signature was made with GITHUB_WEBHOOK_SECRET
+    """
+    if not GITHUB_WEBHOOK_SECRET or not signature:
+        return False
+    expected = "sha256=" + hmac.new(GITHUB_WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def is_followed_ref(payload: dict) -> bool:
+    """Check whether a push is to DATA_REPO on the branch the content store follows."""
+    repository = payload.get("repository", {})
+    if repository.get("full_name", "").lower() != DATA_REPO.lower():
+        return False
+    branch = repository.get("default_branch") if DATA_REF == "HEAD" else DATA_REF
+    return payload.get("ref") == f"refs/heads/{branch}"
+
+
+@router.post("/github")
+async def github_webhook(request: Request):
+    """Receive push events for DATA_REPO and patch the changed files into the content store"""
+    body = await request.body()
+    if not verify_signature(body, request.headers.get("X-Hub-Signature-256", "")):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid signature"
+        )
+
+    event = request.headers.get("X-GitHub-Event")
+    if event == "ping":
+        return {"message": "pong"}
+    if event != "push":
+        return {"message": f"Ignored {event} event"}
+
+    payload = await request.json()
+    if not is_followed_ref(payload):
+        return {"message": "Ignored push to another repository or branch"}
+
+    try:
+        snapshot = await content_store.refresh(payload.get("after"))
+    except Exception as e:
+        logger.error("Error refreshing content for push %s: %s", payload.get("after"), describe_error(e))
+        content_store.invalidate()
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Failed to refresh content"
+        )
+
+    # Pushes delivered late or replayed are not moved back to
+    if snapshot.commit_sha != payload.get("after"):
+        return {"message": "Ignored push that is not ahead of the content", "commit": snapshot.commit_sha}
+    return {"message": "Content updated", "commit": snapshot.commit_sha}
@@ -0,0 +1,194 @@
+import base64
+import operator
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from src.services.content_store import CollectionSnapshot, ItemEntry
+from src.services.data_config import DataConfig
+
+# Largest page of items the collection API returns at once
+API_MAX_PAGE_SIZE = 1000
+FILTER_OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+}
+FILTER_PARAM = re.compile(r"^filter\[([^\]]+)\](?:\[([a-z]+)\])?$")
+
+
+def encode_cursor(entry: ItemEntry) -> str:
+    """
+    Make the cursor for the page after an item, an opaque encoding of its file name.
+    """
+    return encode_name(entry.name)
+
+
+def encode_name(name: str) -> str:
+    return base64.urlsafe_b64encode(name.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    Get the file name of the last item of the previous page from a cursor.
+
+    Raises:
+        HTTPException: 400 if the cursor was not made by encode_cursor
+    """
+    try:
+        name = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode("utf-8")
+    except ValueError:
+        name = None
+    # Decoding accepts some cursors encode_cursor would not make, e.g. with "+" or "/", which must not start
+    # the first page again
+    if not name or encode_name(name) != cursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return name
+
+
+def get_id_field(data_config: DataConfig, collection_id: str) -> str:
+    """
+    Get the ID of the field that identifies the collection's items, from its field_map.
+    """
+    collection = data_config.get_collection(collection_id) or {}
+    return (collection.get("field_map") or {}).get("id", "id")
+
+
+def check_field(data_config: DataConfig, collection_id: str, field_id: str) -> None:
+    """
+    Reject a field that is not declared in the collection's fields config.
+    """
+    if "/" in field_id or not data_config.get_field(collection_id, field_id):
+        raise HTTPException(status_code=400, detail=f"Unknown field: {field_id}")
+
+
+def parse_fields(data_config: DataConfig, collection_id: str, fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma separated fields projection, always including the collection's ID field.
+
+    Returns:
+        List[str]: The field IDs to return, or None to return every field
+    """
+    if not fields:
+        return None
+    field_ids = [field_id.strip() for field_id in fields.split(",") if field_id.strip()]
+    for field_id in field_ids:
+        check_field(data_config, collection_id, field_id)
+    id_field = get_id_field(data_config, collection_id)
+    return field_ids if id_field in field_ids else [id_field] + field_ids
+
+
+def parse_filters(data_config: DataConfig, collection_id: str, params: Dict[str, str]) -> List[Tuple[str, str, str]]:
+    """
+    Parse filters from query parameters, "filter[field]=value" or "filter[field][op]=value".
+
+    Args:
+        data_config: The data config
+        collection_id: The ID of the collection
+        params: The query parameters
+
+    Returns:
+        List of (field ID, operator, value) tuples, the operator being a key of FILTER_OPERATORS
+    """
+    filters = []
+    for name, value in params.items():
+        match = FILTER_PARAM.match(name)
+        if not match:
+            continue
+        field_id, operator_name = match.group(1), match.group(2) or "eq"
+        if operator_name not in FILTER_OPERATORS:
+            raise HTTPException(status_code=400, detail=f"Unknown filter operator: {operator_name}")
+        check_field(data_config, collection_id, field_id)
+        filters.append((field_id, operator_name, value))
+    return filters
+
+
+def coerce(value: Any, raw: str) -> Any:
+    """
+    Convert a filter value from the query string to the type of the item value it is compared with.
+    """
+    if isinstance(value, bool):
+        return raw.lower() in ("true", "1", "yes")
+    if isinstance(value, (int, float)):
+        return type(value)(raw)
+    if isinstance(value, datetime):
+        return datetime.fromisoformat(raw)
+    if isinstance(value, date):
+        return date.fromisoformat(raw)
+    return raw
+
+
+def get_data(content: Any) -> Dict:
+    """
+    Get an item's data, or an empty dict if the item or its data is not a mapping.
+    """
+    data = content.get("data") if isinstance(content, dict) else None
+    return data if isinstance(data, dict) else {}
+
+
+def matches(data: Dict, filters: List[Tuple[str, str, str]]) -> bool:
+    """
+    Check an item's data against filters. Items without the field, or with a value that cannot be compared, do not match.
+    """
+    for field_id, operator_name, raw in filters:
+        value = data.get(field_id)
+        if value is None or isinstance(value, (dict, list)):
+            return False
+        try:
+            if not FILTER_OPERATORS[operator_name](value, coerce(value, raw)):
+                return False
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+def project(item: Any, field_ids: Optional[List[str]]) -> Any:
+    """
+    Keep only some fields of an item's data.
+    """
+    if field_ids is None or not isinstance(item, dict):
+        return item
+    data = get_data(item)
+    return {**item, "data": {field_id: data[field_id] for field_id in field_ids if field_id in data}}
+
+
+def get_page(
+    collection: CollectionSnapshot,
+    filters: List[Tuple[str, str, str]],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Tuple[List[ItemEntry], Optional[str]]:
+    """
+    Get a page of a collection's items in file name order, starting after the item a cursor points at.
+
+    The cursor holds a file name rather than a position, so pages stay stable when earlier items change.
+    Without filters only the items on the page are visited.
+
+    Args:
+        collection: The collection
+        filters: Filters from parse_filters
+        cursor: The next_cursor of the previous page
+        limit: Maximum number of items, or None for all of them
+
+    Returns:
+        Tuple containing:
+        - The items on the page
+        - The cursor of the next page, or None if this is the last page
+    """
+    entries = collection.entry_list
+    start = collection.position_after(decode_cursor(cursor)) if cursor else 0
+
+    page = []
+    for index in range(start, len(entries)):
+        entry = entries[index]
+        if filters and not matches(get_data(entry.content), filters):
+            continue
+        if limit is not None and len(page) == limit:
+            return page, encode_cursor(page[-1])
+        page.append(entry)
+    return page, None
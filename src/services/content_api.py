@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from src.services.content_store import content_store, describe_error, CollectionSnapshot, ItemEntry
+from src.services.data_config import DataConfig
+from src.services.manifest import manifest_entry
+
+logger = logging.getLogger(__name__)
+
+
+class CustomJSONEncoder(json.JSONEncoder):
+    """Custom JSON encoder to handle date and datetime objects and other non-serializable types."""
+    def default(self, obj: Any) -> Any:
+        if isinstance(obj, date):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+def dumps(data: Any) -> str:
+    """Serialize data to compact JSON, encoding values YAML may load as dates without copying the data first."""
+    return json.dumps(data, cls=CustomJSONEncoder, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+def make_etag(*versions: Any) -> str:
+    """Make a strong ETag from the SHAs of the content a response is built from."""
+    digest = hashlib.sha1("\n".join(str(version) for version in versions).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+async def get_data_config() -> DataConfig:
+    """Get the data config from the content store."""
+    return await content_store.get_config()
+
+
+async def get_collection(collection_id: str) -> Dict:
+    """Get collection configuration by ID."""
+    data_config = await get_data_config()
+    collection = data_config.get_collection(collection_id)
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return collection
+
+
+async def get_collection_snapshot(collection_id: str) -> CollectionSnapshot:
+    """Get the items of a collection, with their blob SHAs, from the content store."""
+    try:
+        return await content_store.get_collection(collection_id)
+    except httpx.HTTPStatusError as e:
+        logger.error("Error listing files in collection %s: %s", collection_id, describe_error(e))
+        raise HTTPException(status_code=502, detail="Failed to list collection items")
+
+
+async def get_collection_version(collection_id: str) -> str:
+    """Get a version of a collection's files from the content store, without loading its items."""
+    return await content_store.get_collection_version(collection_id)
+
+
+async def get_last_modified() -> Optional[datetime]:
+    """Get when the content was committed, for the Last-Modified of responses built from it."""
+    return await content_store.get_committed_at()
+
+
+async def get_collection_item_sha(collection_id: str, item_id: str) -> str:
+    """Get the blob SHA of a collection item from the content store, without reading the item."""
+    sha = await content_store.get_item_sha(collection_id, item_id)
+    if sha is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return sha
+
+
+async def get_collection_summary(collection_id: str) -> Tuple[List[Dict], str]:
+    """Get the ID, label, blob SHA and updated time of a collection's items.
+
+    They are read from the collection's manifest if it has one, otherwise from the items.
+
+    Returns:
+        Tuple containing:
+        - The item summaries
+        - The version of the summaries, a blob SHA or digest
+    """
+    collection = await get_collection(collection_id)
+    manifest = await content_store.get_manifest(collection_id)
+    if manifest is not None:
+        return manifest.content.get("items") or [], manifest.sha
+
+    snapshot = await get_collection_snapshot(collection_id)
+    summaries = [
+        manifest_entry(collection, item_id, entry.content, entry.sha, entry.modified_at.isoformat())
+        for item_id, entry in snapshot.entries.items()
+    ]
+    return summaries, snapshot.version
+
+
+async def get_collection_item_entry(collection_id: str, item_id: str) -> ItemEntry:
+    """Get a collection item, with its blob SHA, from the content store."""
+    item = await content_store.get_item(collection_id, item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
@@ -0,0 +1,1438 @@
+import abc
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+import yaml
+from fastapi import HTTPException
+
+from src.services.data_config import CONFIG_PATH, DataConfig
+from src.services.github_service import GITHUB_BLOB_BATCH_SIZE, GITHUB_TARBALL_THRESHOLD, GithubService, git_blob_sha
+from src.services.rate_limit import content_priority
+from src.services.manifest import MANIFEST_NAME, manifest_path
+from src.services.metrics import timing
+from src.services.markdown_renderer import get_markdown_fields, markdown_renderer, MARKDOWN_PRERENDER
+from src.services.search_index import SearchIndex
+from src.services.shared_cache import SHARED_CACHE_HEAD_CHECK_INTERVAL, shared_cache
+from src.services.yaml_loader import load_yaml_async
+
+DATA_REPO = os.environ.get("DATA_REPO", "")  # Format: owner/repo
+# The branch or tag of DATA_REPO to serve content from
+DATA_REF = os.environ.get("DATA_REF", "HEAD")
+# Where content is read from: "github" (DATA_REPO) or "local" (a checkout of it at CONTENT_DIR)
+CONTENT_BACKEND = os.environ.get("CONTENT_BACKEND", "github")
+CONTENT_DIR = os.environ.get("CONTENT_DIR", "")
+# Seconds a snapshot is served before checking whether the data repository has a new commit
+CONTENT_TTL = float(os.environ.get("CONTENT_TTL", "60"))
+# Optional token for reading DATA_REPO, needed if it is private. Otherwise the app's client credentials are used
+GITHUB_CONTENT_TOKEN = os.environ.get("GITHUB_CONTENT_TOKEN") or None
+# Maximum number of item files fetched from GitHub at once when loading a collection
+COLLECTION_FETCH_CONCURRENCY = int(os.environ.get("COLLECTION_FETCH_CONCURRENCY", "10"))
+# How collection items are listed on GitHub: "tree" (Git Trees API and batched blobs) or "contents" (Contents API)
+COLLECTION_LOAD_MODE = os.environ.get("COLLECTION_LOAD_MODE", "tree")
+# Seconds between background checks for a new commit, 0 to only check on requests and webhooks
+CONTENT_POLL_INTERVAL = float(os.environ.get("CONTENT_POLL_INTERVAL", "0"))
+# Load the data config when the app starts, reporting ready on /status/ready once it has
+CONTENT_WARMUP = os.environ.get("CONTENT_WARMUP", "true").lower() == "true"
+# Collections loaded when the app starts and kept loaded in the background, comma separated or "*" for all of them
+CONTENT_WARMUP_COLLECTIONS = os.environ.get("CONTENT_WARMUP_COLLECTIONS", "")
+# Maximum number of collections loaded at once while warming up
+CONTENT_WARMUP_CONCURRENCY = int(os.environ.get("CONTENT_WARMUP_CONCURRENCY", "4"))
+# Seconds to wait before trying to load the data config again when warming up fails
+CONTENT_WARMUP_RETRY_INTERVAL = 5.0
+GITHUB_COMPARE_FILE_LIMIT = 300
+COLLECTIONS_PATH = "data/collections"
+COMMIT_SHA = re.compile(r"[0-9a-f]{40}\Z")
+ITEM_FILE_SUFFIXES = (".yml", ".yaml")
+
+logger = logging.getLogger(__name__)
+
+
+def is_item_file(name: str) -> bool:
+    """
+    Check whether a file name is a collection item (a YAML file). Names starting with "_", like the manifest, are not items.
+    """
+    return name.endswith(ITEM_FILE_SUFFIXES) and not name.startswith("_")
+
+
+def item_id_for_file(name: str) -> str:
+    """
+    Get the item ID for a collection item file name, e.g. "my-item" for "my-item.yml".
+    """
+    return name.rsplit(".", 1)[0]
+
+
+def parse_item_path(path: str) -> Optional[Tuple[str, str]]:
+    """
+    Get the collection ID and file name of a collection item path, e.g. "data/collections/posts/my-post.yml".
+
+    Returns:
+        Tuple containing the collection ID and file name, or None if the path is not a collection item
+    """
+    parts = path.strip("/").split("/")
+    if len(parts) != 4 or "/".join(parts[:2]) != COLLECTIONS_PATH or not is_item_file(parts[3]):
+        return None
+    return parts[2], parts[3]
+
+
+def index_values(content: Any, field_path: str) -> List[str]:
+    """
+    Get the values of a field path in an item's data, e.g. the "id" of every link for "links/id".
+    """
+    values = [(content or {}).get("data") if isinstance(content, dict) else None]
+    for field_id in field_path.split("/"):
+        found = []
+        for value in values:
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, dict) and item.get(field_id) is not None:
+                    found.append(item[field_id])
+        values = found
+    keys = []
+    for value in values:
+        for item in value if isinstance(value, list) else [value]:
+            if not isinstance(item, dict) and str(item) not in keys:
+                keys.append(str(item))
+    return keys
+
+
+def utc_now() -> datetime:
+    """
+    Get the current time to the second, the resolution of HTTP dates.
+    """
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def parse_manifest_path(path: str) -> Optional[str]:
+    """
+    Get the collection ID of a collection manifest path, e.g. "data/collections/posts/_index.yml".
+
+    Returns:
+        The collection ID, or None if the path is not a collection manifest
+    """
+    parts = path.strip("/").split("/")
+    if len(parts) != 4 or "/".join(parts[:2]) != COLLECTIONS_PATH or parts[3] != MANIFEST_NAME:
+        return None
+    return parts[2]
+
+
+def describe_error(error: Exception) -> str:
+    """
+    Describe a failed fetch without leaking the request URL, which may carry client credentials.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"GitHub returned {error.response.status_code}"
+    if isinstance(error, HTTPException):
+        return error.detail
+    if isinstance(error, yaml.YAMLError):
+        return "Invalid YAML"
+    return type(error).__name__
+
+
+class ContentBackend(abc.ABC):
+    """
+    Where a content store reads the data repository from.
+    """
+
+    @abc.abstractmethod
+    async def get_head(self) -> str:
+        """
+        Get the ID of the current version of the content, e.g. the commit SHA.
+        """
+
+    @abc.abstractmethod
+    async def read_file(self, path: str, ref: str) -> Optional[Tuple[str, str]]:
+        """
+        Read a file at a version of the content.
+
+        Returns:
+            Tuple containing the file text and blob SHA, or None if the file does not exist
+        """
+
+    @abc.abstractmethod
+    async def list_directory(self, path: str, ref: str) -> List[Dict]:
+        """
+        List the files directly inside a directory at a version of the content.
+
+        Returns:
+            List[Dict]: Files in name order, each with "name" and "sha". Empty if the directory does not exist
+        """
+
+    @abc.abstractmethod
+    async def read_files(self, path: str, ref: str, entries: List[Dict]) -> Dict[str, str]:
+        """
+        Read many files listed by list_directory.
+
+        Returns:
+            Dict[str, str]: File text keyed by blob SHA, files that failed to load are left out
+        """
+
+    async def iter_files(self, path: str, ref: str, entries: List[Dict]) -> AsyncIterator[Dict[str, str]]:
+        """
+        Read many files listed by list_directory a batch at a time, so each batch can be used as it arrives.
+
+        Yields:
+            Dict[str, str]: File text keyed by blob SHA, files that failed to load are left out
+        """
+        yield await self.read_files(path, ref, entries)
+
+    async def check_access(self) -> None:
+        """
+        Check the content can be read, so a misconfigured app fails to start rather than serving nothing.
+
+        Raises:
+            RuntimeError: If the content cannot be read
+        """
+
+    async def is_private(self) -> bool:
+        """
+        Check whether the content is private, so it is not published on the public API without being allowed to be.
+        """
+        return False
+
+    async def get_commit_date(self, ref: str) -> Optional[datetime]:
+        """
+        Get when a version of the content was committed, the same for every worker process unlike when each first saw it.
+
+        Returns:
+            datetime: The committer date, or None if it is not known
+        """
+        return None
+
+    async def get_collection_versions(self, ref: str) -> Optional[Dict[str, str]]:
+        """
+        Get a version of each collection's files at a version of the content, without reading them.
+
+        Returns:
+            Dict[str, str]: Versions keyed by collection ID, which change whenever a collection's files do.
+                 None if the backend cannot tell collections apart, when the version of the content is used
+        """
+        return None
+
+    async def compare(self, base: str, head: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """
+        Compare two versions of the content, listing the files changed between them.
+
+        Returns:
+            Tuple containing:
+            - How head relates to base: "ahead", "identical", "behind" or "diverged", None if that is not known
+            - The changed files, each with "filename", "status" and, for renames, "previous_filename".
+              None if the changes cannot be listed and everything must be reloaded
+        """
+        return None, None
+
+    async def get_shared_head(self) -> Optional[Tuple[str, float]]:
+        """
+        Get the head another worker process on the host last moved to, e.g. after committing.
+
+        Returns:
+            Tuple containing the head and the time it was recorded, or None if the backend is not shared
+        """
+        return None
+
+    async def share_head(
+        self,
+        head: str,
+        files: Optional[Dict[str, Tuple[Any, Optional[str]]]] = None,
+        texts: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Tell the other worker processes on the host about a new head and the files that changed in it.
+
+        Args:
+            head (str): The new head
+            files (Dict, optional): The parsed content and blob SHA of changed files keyed by path
+            texts (Dict, optional): The text of changed files keyed by path
+        """
+
+
+class GithubBackend(ContentBackend):
+    def __init__(self, repo: str = DATA_REPO, ref: str = DATA_REF, access_token: Optional[str] = GITHUB_CONTENT_TOKEN):
+        """
+        Read content from a GitHub repository, pinned to the commit the ref pointed at when the snapshot was taken.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            ref (str): The branch or tag to follow
+            access_token (str, optional): Token to read with, the app's client credentials are used without one
+        """
+        self.repo = repo
+        self.ref = ref
+        self.access_token = access_token
+        self.private: Optional[bool] = None
+
+    @property
+    def github_service(self) -> GithubService:
+        return GithubService(access_token=self.access_token, priority=content_priority.get())
+
+    @property
+    def head_key(self) -> str:
+        return f"{self.repo}@{self.ref}"
+
+    def path_key(self, path: str) -> str:
+        return f"{self.repo}:{path.strip('/')}"
+
+    async def get_head(self) -> str:
+        return await self.github_service.get_head_sha(self.repo, self.ref)
+
+    async def read_file(self, path: str, ref: str) -> Optional[Tuple[str, str]]:
+        # Files at a commit never change, so another worker may already have read this one
+        pinned = COMMIT_SHA.match(ref) is not None
+        if pinned:
+            file = await shared_cache.run(self.read_shared_file, path, ref)
+            if file is not None:
+                return file
+
+        try:
+            file = await self.github_service.get_repo_content_for_path(
+                self.repo, path, format="text", get_sha=True, ref=ref
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+        text, sha = file.get("content"), file.get("sha")
+        if pinned and sha:
+            await shared_cache.run(self.share_files, ref, {path: (text, sha)})
+        return text, sha
+
+    def read_shared_file(self, path: str, ref: str) -> Optional[Tuple[str, str]]:
+        """
+        Read the text and blob SHA of a file at a commit from the shared cache, if another worker read it.
+        """
+        sha = shared_cache.get_path(self.path_key(path), ref)
+        text = shared_cache.get_texts([sha]).get(sha) if sha is not None else None
+        return (text, sha) if text is not None else None
+
+    def share_files(self, ref: str, files: Dict[str, Tuple[Optional[str], str]]) -> None:
+        """
+        Add files at a commit to the shared cache, keyed by path with their text, if known, and blob SHA.
+        """
+        shared_cache.put_texts({sha: text for text, sha in files.values() if text is not None})
+        shared_cache.set_paths(ref, {self.path_key(path): sha for path, (_, sha) in files.items()})
+
+    async def list_directory(self, path: str, ref: str) -> List[Dict]:
+        try:
+            if COLLECTION_LOAD_MODE == "contents":
+                files = await self.github_service.list_files_in_directory(self.repo, path, ref=ref)
+                return [{"name": file.get("name"), "sha": file.get("sha")} for file in files if file.get("type") == "file"]
+
+            # Unlike the Contents API the Git Trees API is not limited to 1,000 entries
+            files = await self.github_service.list_tree_files(self.repo, ref, path)
+            return [{"name": entry.get("path"), "sha": entry.get("sha")} for entry in files]
+        except httpx.HTTPStatusError as e:
+            # A directory that does not exist (yet) is empty
+            if e.response.status_code in (404, 422):
+                return []
+            raise
+
+    async def read_files(self, path: str, ref: str, entries: List[Dict]) -> Dict[str, str]:
+        texts = {}
+        async for batch in self.iter_files(path, ref, entries):
+            texts.update(batch)
+        return texts
+
+    async def iter_files(self, path: str, ref: str, entries: List[Dict]) -> AsyncIterator[Dict[str, str]]:
+        texts = await shared_cache.run(shared_cache.get_texts, [entry["sha"] for entry in entries])
+        if texts:
+            yield texts
+        missing = [entry for entry in entries if entry["sha"] not in texts]
+        # Large directories are read from one tarball, which cannot be split into batches
+        batch_size = len(missing) if len(missing) > GITHUB_TARBALL_THRESHOLD else max(1, GITHUB_BLOB_BATCH_SIZE)
+        for start in range(0, len(missing), batch_size):
+            fetched = await self.fetch_files(path, ref, missing[start:start + batch_size])
+            await shared_cache.run(shared_cache.put_texts, fetched)
+            yield fetched
+
+    async def fetch_files(self, path: str, ref: str, entries: List[Dict]) -> Dict[str, str]:
+        github_service = self.github_service
+
+        if COLLECTION_LOAD_MODE == "contents":
+            semaphore = asyncio.Semaphore(max(1, COLLECTION_FETCH_CONCURRENCY))
+            files = {}
+
+            async def fetch_file(entry: Dict) -> None:
+                async with semaphore:
+                    files[entry["sha"]] = await github_service.get_repo_content_for_path(
+                        self.repo, f"{path}/{entry['name']}", format="text", ref=ref
+                    )
+
+            # Failed files are left out and reported by the store
+            await asyncio.gather(*(fetch_file(entry) for entry in entries), return_exceptions=True)
+            return files
+
+        return await github_service.get_file_contents(
+            self.repo,
+            ref,
+            path.strip("/"),
+            [{"path": entry["name"], "sha": entry["sha"]} for entry in entries],
+            max_concurrency=COLLECTION_FETCH_CONCURRENCY
+        )
+
+    async def check_access(self) -> None:
+        # Content is served to every visitor, so it is read with one token rather than each editor's. Without
+        # a content token that is the app's client credentials, which can only read public repositories
+        try:
+            private = await self.is_private()
+        except (httpx.HTTPStatusError, httpx.RequestError) as e:
+            logger.warning("Error checking access to %s: %s", self.repo, describe_error(e))
+            return
+        if private and not self.access_token:
+            raise RuntimeError(
+                f"DATA_REPO {self.repo} is private or does not exist. Set GITHUB_CONTENT_TOKEN to a token that can read it"
+            )
+
+    async def is_private(self) -> bool:
+        if self.private is None:
+            try:
+                self.private = (await self.github_service.get_repository_details(self.repo)).json().get("private", False)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                # A repository the token cannot see is private, or does not exist
+                self.private = True
+        return self.private
+
+    async def get_commit_date(self, ref: str) -> Optional[datetime]:
+        try:
+            commit = await self.github_service.get_commit(self.repo, ref)
+        except httpx.HTTPStatusError as e:
+            logger.warning("Error getting commit %s: %s", ref, describe_error(e))
+            return None
+        date = (commit.get("committer") or {}).get("date")
+        return datetime.fromisoformat(date) if date else None
+
+    async def get_collection_versions(self, ref: str) -> Optional[Dict[str, str]]:
+        # The SHA of a collection's directory tree changes whenever any of its files do
+        try:
+            tree = await self.github_service.get_tree(self.repo, f"{ref}:{COLLECTIONS_PATH}")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (404, 422):
+                return {}
+            logger.warning("Error listing collections at %s: %s", ref, describe_error(e))
+            return None
+        if tree.get("truncated"):
+            return None
+        return {entry.get("path"): entry.get("sha") for entry in tree.get("tree", []) if entry.get("type") == "tree"}
+
+    async def compare(self, base: str, head: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        try:
+            comparison = await self.github_service.compare_commits(self.repo, base, head)
+        except httpx.HTTPStatusError as e:
+            logger.warning("Error comparing %s...%s: %s", base, head, describe_error(e))
+            return None, None
+
+        status = comparison.get("status")
+        files = comparison.get("files", [])
+        # GitHub lists at most 300 files in a comparison, beyond that the changes are incomplete
+        if status not in ("ahead", "identical") or len(files) >= GITHUB_COMPARE_FILE_LIMIT:
+            return status, None
+        return status, files
+
+    async def get_shared_head(self) -> Optional[Tuple[str, float]]:
+        return await shared_cache.run(shared_cache.get_head, self.head_key)
+
+    async def share_head(
+        self,
+        head: str,
+        files: Optional[Dict[str, Tuple[Any, Optional[str]]]] = None,
+        texts: Optional[Dict[str, str]] = None
+    ) -> None:
+        written = {
+            path.strip("/"): (content, sha) for path, (content, sha) in (files or {}).items() if content is not None and sha
+        }
+
+        def share() -> None:
+            self.share_files(head, {path: ((texts or {}).get(path), sha) for path, (_, sha) in written.items()})
+            shared_cache.put_parsed({sha: content for content, sha in written.values()})
+            shared_cache.set_head(self.head_key, head)
+
+        await shared_cache.run(share)
+
+
+class LocalBackend(ContentBackend):
+    def __init__(self, root: str = CONTENT_DIR):
+        """
+        Read content from a local directory, e.g. a checkout of the data repository.
+
+        There are no commits to pin to, so the version of the content is a fingerprint of the
+        names, sizes and modification times of its files.
+
+        Args:
+            root (str): Path to the directory
+        """
+        self.root = root
+
+    def full_path(self, path: str) -> str:
+        return os.path.join(self.root, path.strip("/"))
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha1()
+        paths = [self.full_path(CONFIG_PATH)]
+        for directory, _, files in os.walk(self.full_path(COLLECTIONS_PATH)):
+            paths.extend(os.path.join(directory, name) for name in files)
+        for path in sorted(paths):
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, self.root)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def read_bytes(self, path: str) -> Optional[bytes]:
+        try:
+            with open(self.full_path(path), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def list_files(self, path: str) -> List[Dict]:
+        directory = self.full_path(path)
+        if not os.path.isdir(directory):
+            return []
+        files = []
+        for name in sorted(os.listdir(directory)):
+            data = self.read_bytes(f"{path}/{name}") if os.path.isfile(os.path.join(directory, name)) else None
+            if data is not None:
+                files.append({"name": name, "sha": git_blob_sha(data)})
+        return files
+
+    async def get_head(self) -> str:
+        return await asyncio.to_thread(self.fingerprint)
+
+    async def read_file(self, path: str, ref: str) -> Optional[Tuple[str, str]]:
+        data = await asyncio.to_thread(self.read_bytes, path)
+        if data is None:
+            return None
+        return data.decode("utf-8"), git_blob_sha(data)
+
+    async def list_directory(self, path: str, ref: str) -> List[Dict]:
+        return await asyncio.to_thread(self.list_files, path)
+
+    async def read_files(self, path: str, ref: str, entries: List[Dict]) -> Dict[str, str]:
+        def read_all() -> Dict[str, str]:
+            files = {}
+            for entry in entries:
+                data = self.read_bytes(f"{path}/{entry['name']}")
+                if data is not None:
+                    files[git_blob_sha(data)] = data.decode("utf-8")
+            return files
+
+        return await asyncio.to_thread(read_all)
+
+
+class ItemEntry:
+    def __init__(self, name: str, sha: str, content: Any, modified_at: Optional[datetime] = None):
+        """
+        A collection item in a snapshot.
+
+        Args:
+            name (str): The item file name
+            sha (str): The blob SHA of the item file
+            content: The parsed item, shared between requests so it must not be modified
+            modified_at (datetime, optional): When this version of the item was first seen, defaults to now
+        """
+        self.name = name
+        self.sha = sha
+        self.content = content
+        self.modified_at = modified_at or utc_now()
+        self.html: Optional[Tuple[Tuple[str, ...], Any]] = None
+
+    def rendered(self, field_paths: Tuple[str, ...]) -> Any:
+        """
+        Get the item with the Markdown of some fields rendered to HTML, kept with the entry as its content never changes.
+
+        Args:
+            field_paths (Tuple[str, ...]): Paths of the Markdown fields, from get_markdown_fields
+        """
+        if self.html is None or self.html[0] != field_paths:
+            self.html = (field_paths, markdown_renderer.render_item(self.content, field_paths))
+        return self.html[1]
+
+
+class CollectionSnapshot:
+    def __init__(
+        self,
+        collection_id: str,
+        entries: "OrderedDict[str, ItemEntry]",
+        errors: List[Dict],
+        indexes: Optional[Dict[str, Dict[str, List[str]]]] = None
+    ):
+        """
+        The items of a collection at a version of the content.
+
+        Args:
+            collection_id (str): The ID of the collection
+            entries (OrderedDict[str, ItemEntry]): Items keyed by item ID, in file name order
+            errors (List[Dict]): Items that failed to load, as dicts with "name" and "error"
+            indexes (Dict, optional): Item IDs keyed by field path and value, built on first use if not given
+        """
+        self.collection_id = collection_id
+        self.entries = entries
+        self.errors = errors
+        self.indexes = indexes or {}
+        # Whether the indexes are shared with a copy of the collection, and which item ID lists are not once they are copied
+        self.shared_indexes = False
+        self.owned_index_values: Optional[Set[Tuple[str, str]]] = None
+        self.search_index: Optional[SearchIndex] = None
+        self.search_fields: Tuple[str, ...] = ()
+        self.digest: Optional[str] = None
+        self.sorted_entries: Optional[List[ItemEntry]] = None
+        self.sorted_names: Optional[List[str]] = None
+
+    @property
+    def items(self) -> List[Dict]:
+        return [entry.content for entry in self.entries.values()]
+
+    @property
+    def entry_list(self) -> List[ItemEntry]:
+        """
+        The items in file name order as a list, for paging through them.
+        """
+        if self.sorted_entries is None:
+            self.sorted_entries = list(self.entries.values())
+        return self.sorted_entries
+
+    def position_after(self, name: str) -> int:
+        """
+        Get the position in entry_list of the first item after a file name, whether or not that file exists.
+        """
+        if self.sorted_names is None:
+            self.sorted_names = [entry.name for entry in self.entry_list]
+        return bisect.bisect_right(self.sorted_names, name)
+
+    @property
+    def version(self) -> str:
+        """
+        Digest of the item file names and blob SHAs, which changes whenever any item does.
+        """
+        if self.digest is None:
+            digest = hashlib.sha1()
+            for entry in self.entries.values():
+                digest.update(f"{entry.name}:{entry.sha}\n".encode("utf-8"))
+            for error in self.errors:
+                digest.update(f"{error.get('name')}:error\n".encode("utf-8"))
+            self.digest = digest.hexdigest()
+        return self.digest
+
+    def build_indexes(self, field_paths: List[str]) -> None:
+        """
+        Index the items by their values of some field paths, in one pass over them. Added and removed items
+        then keep the indexes up to date.
+        """
+        indexes: Dict[str, Dict[str, List[str]]] = {field_path: {} for field_path in field_paths if field_path not in self.indexes}
+        if not indexes:
+            return
+        for item_id, entry in self.entries.items():
+            for field_path, index in indexes.items():
+                for value in index_values(entry.content, field_path):
+                    index.setdefault(value, []).append(item_id)
+        self.own_indexes()
+        self.indexes.update(indexes)
+
+    def own_indexes(self) -> None:
+        """
+        Copy the indexes shared with a copy of the collection before changing them. Item ID lists are copied as they change.
+        """
+        if self.shared_indexes:
+            self.indexes = {field_path: dict(index) for field_path, index in self.indexes.items()}
+            self.shared_indexes = False
+            self.owned_index_values = set()
+
+    def writable_item_ids(self, field_path: str, value: str) -> List[str]:
+        """
+        Get the IDs of the items with a value of a field path to change, copying them first if they are shared.
+        """
+        self.own_indexes()
+        index = self.indexes[field_path]
+        if self.owned_index_values is not None and (field_path, value) not in self.owned_index_values:
+            index[value] = list(index.get(value, []))
+            self.owned_index_values.add((field_path, value))
+        return index.setdefault(value, [])
+
+    def get_index(self, field_path: str) -> Dict[str, List[str]]:
+        """
+        Get the IDs of the items keyed by their values of a field path, building the index if it was not built on load.
+        """
+        if field_path not in self.indexes:
+            self.build_indexes([field_path])
+        return self.indexes[field_path]
+
+    def lookup(self, field_path: str, value: str) -> List[ItemEntry]:
+        """
+        Get the items with a value of a field path, in file name order.
+        """
+        entries = [self.entries[item_id] for item_id in self.get_index(field_path).get(value, [])]
+        return sorted(entries, key=lambda entry: entry.name)
+
+    def search_texts(self, entry: ItemEntry) -> List[str]:
+        return [value for field_path in self.search_fields for value in index_values(entry.content, field_path)]
+
+    def search(self, search_fields: Tuple[str, ...], query: str) -> List[Tuple[ItemEntry, float]]:
+        """
+        Search the text of the items, building the search index on first use.
+
+        Args:
+            search_fields (Tuple[str, ...]): Paths of the fields to search, from get_search_fields
+            query (str): The words to search for
+
+        Returns:
+            List of (item, score) tuples, best match first
+        """
+        if self.search_index is None or self.search_fields != search_fields:
+            self.search_fields = search_fields
+            self.search_index = SearchIndex()
+            for item_id, entry in self.entries.items():
+                self.search_index.add(item_id, self.search_texts(entry))
+        return [(self.entries[item_id], score) for item_id, score in self.search_index.search(query)]
+
+    def copy(self) -> "CollectionSnapshot":
+        """
+        Copy the collection so it can be changed without affecting requests reading the original.
+
+        The indexes are shared until either collection changes them, so collections that do not change are not reindexed.
+        """
+        collection = CollectionSnapshot(
+            self.collection_id, OrderedDict(self.entries), list(self.errors), self.indexes
+        )
+        collection.shared_indexes = self.shared_indexes = True
+        if self.search_index is not None:
+            collection.search_index = self.search_index.copy()
+            collection.search_fields = self.search_fields
+        return collection
+
+    def changed(self) -> None:
+        """
+        Record that the items changed.
+        """
+        self.digest = None
+        self.sorted_entries = None
+        self.sorted_names = None
+
+    def remove(self, name: str) -> None:
+        """
+        Remove an item, and any error loading it, by file name.
+        """
+        item_id = item_id_for_file(name)
+        entry = self.entries.pop(item_id, None)
+        if entry is not None:
+            self.unindex(item_id, entry)
+        self.errors = [error for error in self.errors if error.get("name") != name]
+        self.changed()
+
+    def unindex(self, item_id: str, entry: ItemEntry) -> None:
+        """
+        Remove an item from the indexes and the search index.
+        """
+        for field_path in list(self.indexes):
+            for value in index_values(entry.content, field_path):
+                if item_id not in self.indexes[field_path].get(value, []):
+                    continue
+                item_ids = self.writable_item_ids(field_path, value)
+                item_ids.remove(item_id)
+                if not item_ids:
+                    del self.indexes[field_path][value]
+        if self.search_index is not None:
+            self.search_index.remove(item_id)
+
+    def add_error(self, name: str, error: str) -> None:
+        """
+        Record an item that failed to load.
+        """
+        self.errors.append({"name": name, "error": error})
+        self.changed()
+
+    def add(self, entries: Iterable[ItemEntry]) -> None:
+        """
+        Add or replace items, keeping the items in file name order.
+
+        Replaced items keep their place and new ones go at the end, so the items are only sorted, once,
+        if a new one belongs before the last.
+        """
+        in_order = True
+        for entry in entries:
+            item_id = item_id_for_file(entry.name)
+            previous = self.entries.get(item_id)
+            if previous is not None and previous.name == entry.name:
+                self.unindex(item_id, previous)
+            else:
+                if previous is not None:
+                    self.remove(previous.name)
+                last = next(reversed(self.entries.values()), None)
+                in_order = in_order and (last is None or last.name < entry.name)
+            self.entries[item_id] = entry
+            for field_path in list(self.indexes):
+                for value in index_values(entry.content, field_path):
+                    self.writable_item_ids(field_path, value).append(item_id)
+            if self.search_index is not None:
+                self.search_index.add(item_id, self.search_texts(entry))
+            self.errors = [error for error in self.errors if error.get("name") != entry.name]
+        if not in_order:
+            self.entries = OrderedDict(sorted(self.entries.items(), key=lambda item: item[1].name))
+        self.changed()
+
+
+class Snapshot:
+    def __init__(self, commit_sha: str, config: DataConfig):
+        """
+        The content of the data repository at one commit. Collections are loaded into it on first use.
+
+        Args:
+            commit_sha (str): The commit SHA (or local fingerprint) the snapshot is pinned to
+            config (DataConfig): The data config at that commit
+        """
+        self.commit_sha = commit_sha
+        self.config = config
+        self.collections: Dict[str, CollectionSnapshot] = {}
+        self.items: Dict[Tuple[str, str], Optional[ItemEntry]] = {}
+        self.manifests: Dict[str, Optional[ItemEntry]] = {}
+        # Versions of the collections' files keyed by collection ID, read on first use
+        self.collection_versions: Optional[Dict[str, str]] = None
+        # The files in each collection's directory keyed by collection ID, listed on first use
+        self.listings: Dict[str, List[Dict]] = {}
+        # When the commit was made, read on first use
+        self.committed_at: Optional[datetime] = None
+        self.committed_at_read = False
+
+    def derive(self, commit_sha: str, config: DataConfig, changed_paths: List[str]) -> "Snapshot":
+        """
+        Start a snapshot at a later commit from this one, leaving out the items at the changed paths.
+
+        Collections are copied, so requests still reading this snapshot are not affected.
+        """
+        snapshot = Snapshot(commit_sha, config)
+        snapshot.collections = {
+            collection_id: collection.copy() for collection_id, collection in self.collections.items()
+        }
+        changed_items = set(filter(None, map(parse_item_path, changed_paths)))
+        for collection_id, name in changed_items:
+            if collection_id in snapshot.collections:
+                snapshot.collections[collection_id].remove(name)
+        changed_collections = {collection_id for collection_id, _ in changed_items}
+        snapshot.listings = {
+            collection_id: files for collection_id, files in self.listings.items() if collection_id not in changed_collections
+        }
+        changed_keys = {(collection_id, item_id_for_file(name)) for collection_id, name in changed_items}
+        snapshot.items = {key: entry for key, entry in self.items.items() if key not in changed_keys}
+        changed_manifests = set(filter(None, map(parse_manifest_path, changed_paths)))
+        snapshot.manifests = {
+            collection_id: entry for collection_id, entry in self.manifests.items() if collection_id not in changed_manifests
+        }
+        return snapshot
+
+    def add_items(self, collection_id: str, entries: List[ItemEntry]) -> None:
+        """
+        Add or replace items of a collection in the snapshot.
+        """
+        if collection_id in self.collections:
+            self.collections[collection_id].add(entries)
+        for entry in entries:
+            self.items[(collection_id, item_id_for_file(entry.name))] = entry
+
+
+class ContentStore:
+    def __init__(self, backend: ContentBackend, ttl: float = CONTENT_TTL):
+        """
+        An in-memory snapshot of the data repository (config.yml and data/collections/**).
+
+        The snapshot is served for ttl seconds before the backend is asked for its head. A new head
+        starts a new snapshot, which reuses the parsed items whose blob SHAs did not change.
+
+        Args:
+            backend (ContentBackend): Where to read content from
+            ttl (float): Seconds to serve a snapshot before checking for a new head
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.snapshot: Optional[Snapshot] = None
+        self.checked_at = 0.0
+        # When the head was last checked or moved, to tell whether a head shared by another worker is newer
+        self.head_at = 0.0
+        # When the shared cache was last checked for a head another worker moved to
+        self.shared_checked_at = 0.0
+        self.lock = asyncio.Lock()
+        self.collection_locks: Dict[str, asyncio.Lock] = {}
+        self.loading: Set[asyncio.Task] = set()
+        self.previous_entries: Dict[str, ItemEntry] = {}
+
+    def is_fresh(self) -> bool:
+        return self.snapshot is not None and time.monotonic() - self.checked_at < self.ttl
+
+    def invalidate(self) -> None:
+        """
+        Check for a new head on the next read, e.g. after content has been written.
+        """
+        self.checked_at = 0.0
+
+    def is_newer(self, shared: Tuple[str, float]) -> bool:
+        """
+        Check whether a head shared by another worker process was shared since this store last moved.
+        """
+        head, updated_at = shared
+        return self.snapshot is not None and head != self.snapshot.commit_sha and updated_at > self.head_at
+
+    async def get_shared_head(self) -> Optional[Tuple[str, float]]:
+        """
+        Get a head another worker process moved to since this store last checked, e.g. after committing.
+
+        The backend is asked at most every SHARED_CACHE_HEAD_CHECK_INTERVAL seconds, so most calls return None.
+
+        Returns:
+            Tuple containing the head and the time it was shared, or None
+        """
+        now = time.monotonic()
+        if self.snapshot is None or now - self.shared_checked_at < SHARED_CACHE_HEAD_CHECK_INTERVAL:
+            return None
+        self.shared_checked_at = now
+        shared = await self.backend.get_shared_head()
+        return shared if shared is not None and self.is_newer(shared) else None
+
+    async def get_snapshot(self) -> Snapshot:
+        """
+        Get the current snapshot, checking for a new head if the TTL has passed or another worker moved on.
+        """
+        shared = await self.get_shared_head()
+        if self.is_fresh() and shared is None:
+            return self.snapshot
+
+        async with self.lock:
+            # Another request may have refreshed the snapshot while this one waited
+            if shared is not None and self.is_newer(shared) and await self.update_to(shared[0], forward_only=True):
+                return self.snapshot
+            if not self.is_fresh():
+                await self.update_to(await self.backend.get_head())
+            return self.snapshot
+
+    async def refresh(self, head: Optional[str] = None) -> Snapshot:
+        """
+        Bring the snapshot up to date now, regardless of the TTL.
+
+        A head that is given is only moved to if it is ahead of the snapshot's, so a webhook delivered
+        late or replayed cannot move the snapshot back. Otherwise the backend's head is checked on the
+        next read.
+
+        Args:
+            head (str, optional): The new head if it is already known, e.g. from a webhook
+        """
+        async with self.lock:
+            if not head:
+                await self.update_to(await self.backend.get_head())
+            elif await self.update_to(head, forward_only=True):
+                await self.backend.share_head(self.snapshot.commit_sha)
+            else:
+                self.invalidate()
+            return self.snapshot
+
+    async def update_to(self, head: str, forward_only: bool = False) -> bool:
+        """
+        Move the snapshot to a head, patching just the changed files when the backend can list them.
+
+        Must be called with the lock held.
+
+        Args:
+            head (str): The head to move to
+            forward_only (bool): Only move to the head if it is ahead of the snapshot's, for heads that
+                                 were not read from the backend and may be out of date
+
+        Returns:
+            bool: False if the head was ignored as it is not ahead of the snapshot's
+        """
+        if self.snapshot is None:
+            # With no snapshot to compare with, only the backend's own head is known to be current
+            self.snapshot = await self.load_snapshot(await self.backend.get_head() if forward_only else head)
+        elif self.snapshot.commit_sha != head:
+            status, changes = await self.backend.compare(self.snapshot.commit_sha, head)
+            if forward_only and status != "ahead":
+                logger.info("Ignored %s as it is not ahead of %s (%s)", head, self.snapshot.commit_sha, status)
+                # Checked, so a shared head is not compared again until another worker moves on
+                self.head_at = time.time()
+                return False
+            if changes is None:
+                self.snapshot = await self.load_snapshot(head)
+            else:
+                self.snapshot = await self.patch_snapshot(head, changes)
+        self.checked_at = time.monotonic()
+        self.head_at = time.time()
+        return True
+
+    async def patch_snapshot(self, head: str, changes: List[Dict]) -> Snapshot:
+        """
+        Derive a snapshot at a head from the current one by re-reading only the changed files.
+
+        Args:
+            head (str): The new head
+            changes (List[Dict]): The changed files, as returned by the backend's compare
+        """
+        removed = set()
+        updated = set()
+        for change in changes:
+            if change.get("previous_filename"):
+                removed.add(change["previous_filename"])
+            if change.get("status") == "removed":
+                removed.add(change["filename"])
+            else:
+                updated.add(change["filename"])
+
+        config = self.snapshot.config
+        if CONFIG_PATH in updated | removed:
+            config = await self.load_config(head)
+
+        snapshot = self.snapshot.derive(head, config, list(updated | removed))
+
+        # Items of collections that are not loaded are read when they are next needed
+        paths = [
+            path for path in updated
+            if parse_item_path(path) and parse_item_path(path)[0] in snapshot.collections
+        ]
+        files = await asyncio.gather(*(self.backend.read_file(path, head) for path in paths))
+        added: Dict[str, List[ItemEntry]] = {}
+        for path, file in zip(paths, files):
+            collection_id, name = parse_item_path(path)
+            if file is None:
+                continue
+            text, sha = file
+            try:
+                added.setdefault(collection_id, []).append(ItemEntry(name, sha, await load_yaml_async(text, sha)))
+            except yaml.YAMLError as e:
+                logger.warning("Error loading collection item %s/%s: %s", collection_id, name, describe_error(e))
+                snapshot.collections[collection_id].add_error(name, describe_error(e))
+        for collection_id, entries in added.items():
+            snapshot.add_items(collection_id, entries)
+
+        return snapshot
+
+    async def record_commit(
+        self,
+        commit: Dict,
+        files: Dict[str, Tuple[Any, Optional[str]]],
+        texts: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Apply the collection items changed by a commit the app made to the snapshot straight away.
+
+        When the commit follows the snapshot's, the snapshot moves to that commit with no GitHub calls.
+        Otherwise the items are patched in and the head is checked on the next read. The commit is
+        shared with the other worker processes on the host, which move to it on their next read.
+
+        Args:
+            commit (Dict): The commit, with its "sha" and "parents"
+            files (Dict): The content and blob SHA of each changed item or manifest keyed by path,
+                          content None for deleted files
+            texts (Dict, optional): The text written to each file keyed by path, shared with the other workers
+        """
+        self.apply_commit(commit, files)
+        if commit.get("sha"):
+            await self.backend.share_head(commit["sha"], files, texts)
+
+    def apply_commit(self, commit: Dict, files: Dict[str, Tuple[Any, Optional[str]]]) -> None:
+        """
+        Apply the files changed by a commit to the snapshot, as for record_commit.
+        """
+        paths = [path.strip("/") for path in files]
+        if self.snapshot is None or not all(parse_item_path(path) or parse_manifest_path(path) for path in paths):
+            self.invalidate()
+            return
+
+        parents = [parent.get("sha") for parent in commit.get("parents", [])]
+        follows = self.snapshot.commit_sha in parents and commit.get("sha")
+        head = commit.get("sha") if follows else self.snapshot.commit_sha
+
+        snapshot = self.snapshot.derive(head, self.snapshot.config, paths)
+        added: Dict[str, List[ItemEntry]] = {}
+        for path, (content, sha) in files.items():
+            if parse_manifest_path(path):
+                snapshot.manifests[parse_manifest_path(path)] = ItemEntry(MANIFEST_NAME, sha, content) if content is not None else None
+            elif content is not None:
+                collection_id, name = parse_item_path(path)
+                added.setdefault(collection_id, []).append(ItemEntry(name, sha, content))
+        for collection_id, entries in added.items():
+            snapshot.add_items(collection_id, entries)
+        self.snapshot = snapshot
+        if follows:
+            self.head_at = time.time()
+        else:
+            self.invalidate()
+
+    async def load_snapshot(self, head: str) -> Snapshot:
+        """
+        Start a snapshot at a head, keeping the items of the current one for reuse.
+        """
+        if self.snapshot is not None:
+            self.previous_entries = {
+                entry.sha: entry
+                for collection in self.snapshot.collections.values()
+                for entry in collection.entries.values()
+            }
+            self.previous_entries.update({
+                entry.sha: entry for entry in self.snapshot.items.values() if entry is not None
+            })
+
+        return Snapshot(head, await self.load_config(head))
+
+    async def load_config(self, head: str) -> DataConfig:
+        """
+        Load the data config at a head.
+        """
+        config_file = await self.backend.read_file(CONFIG_PATH, head)
+        if config_file is None:
+            logger.error("No %s found in the data repository at %s", CONFIG_PATH, head)
+            return DataConfig({})
+
+        text, sha = config_file
+        return DataConfig(await load_yaml_async(text, sha), sha)
+
+    async def get_config(self) -> DataConfig:
+        """
+        Get the data config.
+        """
+        with timing("config"):
+            return (await self.get_snapshot()).config
+
+    async def get_collection(self, collection_id: str) -> CollectionSnapshot:
+        """
+        Get the items of a collection, loading them into the snapshot on first use.
+        """
+        snapshot = await self.get_snapshot()
+        if collection_id in snapshot.collections:
+            return snapshot.collections[collection_id]
+
+        lock = self.collection_locks.setdefault(collection_id, asyncio.Lock())
+        async with lock:
+            if collection_id not in snapshot.collections:
+                snapshot.collections[collection_id] = await self.load_collection(snapshot, collection_id)
+            return snapshot.collections[collection_id]
+
+    async def has_collection(self, collection_id: str) -> bool:
+        """
+        Check whether a collection's items are loaded, so getting them does not read the backend.
+        """
+        return collection_id in (await self.get_snapshot()).collections
+
+    async def iter_collection(self, collection_id: str, errors: Optional[List[Dict]] = None) -> AsyncIterator[ItemEntry]:
+        """
+        Get the items of a collection as they load, so they can be sent before the whole collection has loaded.
+
+        The collection is loaded into the snapshot as for get_collection, carrying on if the items stop
+        being iterated. A collection that is already loaded is iterated from the snapshot.
+
+        Args:
+            collection_id (str): The ID of the collection
+            errors (List[Dict], optional): Filled with the items that failed to load once every item has been iterated
+        """
+        snapshot = await self.get_snapshot()
+        if collection_id in snapshot.collections:
+            collection = snapshot.collections[collection_id]
+            for entry in collection.entries.values():
+                yield entry
+            if errors is not None:
+                errors.extend(collection.errors)
+            return
+
+        queue: "asyncio.Queue[Optional[ItemEntry]]" = asyncio.Queue()
+
+        async def load() -> CollectionSnapshot:
+            lock = self.collection_locks.setdefault(collection_id, asyncio.Lock())
+            try:
+                async with lock:
+                    if collection_id in snapshot.collections:
+                        # Loaded for another request while this one waited
+                        for entry in snapshot.collections[collection_id].entries.values():
+                            queue.put_nowait(entry)
+                    else:
+                        snapshot.collections[collection_id] = await self.load_collection(
+                            snapshot, collection_id, queue.put_nowait
+                        )
+                    return snapshot.collections[collection_id]
+            finally:
+                queue.put_nowait(None)
+
+        # The load carries on into the snapshot if the items stop being iterated, so it is kept until it is done
+        task = asyncio.create_task(load())
+        self.loading.add(task)
+        task.add_done_callback(self.loading.discard)
+        while (entry := await queue.get()) is not None:
+            yield entry
+        collection = await task
+        if errors is not None:
+            errors.extend(collection.errors)
+
+    async def load_collection(
+        self,
+        snapshot: Snapshot,
+        collection_id: str,
+        on_entry: Optional[Callable[[ItemEntry], None]] = None
+    ) -> CollectionSnapshot:
+        """
+        Load a collection's items at the snapshot's head, only reading the files whose blob SHAs are new.
+
+        Args:
+            snapshot (Snapshot): The snapshot to load the collection at
+            collection_id (str): The ID of the collection
+            on_entry (Callable, optional): Called with each item as soon as it has loaded, in file name order
+        """
+        path = f"{COLLECTIONS_PATH}/{collection_id}"
+        files = [file for file in await self.list_collection(snapshot, collection_id) if is_item_file(file["name"])]
+
+        missing = [file for file in files if file["sha"] not in self.previous_entries]
+        batches = self.backend.iter_files(path, snapshot.commit_sha, missing) if missing else None
+        texts: Dict[str, str] = {}
+
+        entries = OrderedDict()
+        errors = []
+        try:
+            for file in files:
+                previous = self.previous_entries.get(file["sha"])
+                if previous is not None:
+                    entry = ItemEntry(file["name"], file["sha"], previous.content, previous.modified_at)
+                else:
+                    # Files are read in batches in the order they are listed, so an item waits for at most one batch
+                    while file["sha"] not in texts and batches is not None:
+                        try:
+                            texts.update(await anext(batches))
+                        except StopAsyncIteration:
+                            batches = None
+                    try:
+                        if file["sha"] not in texts:
+                            raise HTTPException(status_code=502, detail="Failed to load item")
+                        content = await load_yaml_async(texts[file["sha"]], file["sha"])
+                    except (HTTPException, yaml.YAMLError) as e:
+                        logger.warning("Error loading collection item %s/%s: %s", collection_id, file["name"], describe_error(e))
+                        errors.append({"name": file["name"], "error": describe_error(e)})
+                        continue
+                    entry = ItemEntry(file["name"], file["sha"], content)
+                entries[item_id_for_file(file["name"])] = entry
+                if on_entry is not None:
+                    on_entry(entry)
+        finally:
+            if batches is not None:
+                await batches.aclose()
+
+        if MARKDOWN_PRERENDER:
+            field_paths = get_markdown_fields(snapshot.config.get_collection(collection_id) or {})
+            if field_paths:
+                await asyncio.to_thread(lambda: [entry.rendered(field_paths) for entry in entries.values()])
+
+        collection = CollectionSnapshot(collection_id, entries, errors)
+        collection.build_indexes(snapshot.config.indexes.get(collection_id, []))
+        return collection
+
+    async def list_collection(self, snapshot: Snapshot, collection_id: str) -> List[Dict]:
+        """
+        List the files in a collection's directory at the snapshot's head, once per snapshot.
+        """
+        if collection_id not in snapshot.listings:
+            snapshot.listings[collection_id] = await self.backend.list_directory(
+                f"{COLLECTIONS_PATH}/{collection_id}", snapshot.commit_sha
+            )
+        return snapshot.listings[collection_id]
+
+    async def get_item_sha(self, collection_id: str, item_id: str) -> Optional[str]:
+        """
+        Get the blob SHA of a collection item without reading the item, e.g. to check a request's ETag.
+
+        Returns:
+            str: The blob SHA, or None if the item does not exist
+        """
+        snapshot = await self.get_snapshot()
+        if collection_id in snapshot.collections:
+            entry = snapshot.collections[collection_id].entries.get(item_id)
+        elif (collection_id, item_id) in snapshot.items:
+            entry = snapshot.items[(collection_id, item_id)]
+        else:
+            name = f"{item_id}.yml"
+            if not is_item_file(name):
+                return None
+            return next((file["sha"] for file in await self.list_collection(snapshot, collection_id) if file["name"] == name), None)
+        return entry.sha if entry is not None else None
+
+    async def get_committed_at(self) -> Optional[datetime]:
+        """
+        Get when the snapshot's commit was made, None if the backend cannot tell.
+        """
+        snapshot = await self.get_snapshot()
+        if not snapshot.committed_at_read:
+            snapshot.committed_at = await self.backend.get_commit_date(snapshot.commit_sha)
+            snapshot.committed_at_read = True
+        return snapshot.committed_at
+
+    async def get_collection_version(self, collection_id: str) -> str:
+        """
+        Get a version of a collection's files without loading the collection, e.g. to check a request's ETag.
+
+        Returns:
+            str: A tree SHA or the version of all the content, which changes whenever the collection's files do
+        """
+        snapshot = await self.get_snapshot()
+        if snapshot.collection_versions is None:
+            snapshot.collection_versions = await self.backend.get_collection_versions(snapshot.commit_sha) or {}
+        return snapshot.collection_versions.get(collection_id) or snapshot.commit_sha
+
+    async def get_manifest(self, collection_id: str) -> Optional[ItemEntry]:
+        """
+        Get a collection's manifest, a summary of its items maintained alongside them.
+
+        Returns:
+            ItemEntry: The manifest, its content being a dict with the "items". None if the collection has no manifest
+        """
+        snapshot = await self.get_snapshot()
+        if collection_id not in snapshot.manifests:
+            file = await self.backend.read_file(manifest_path(COLLECTIONS_PATH, collection_id), snapshot.commit_sha)
+            if file is None:
+                snapshot.manifests[collection_id] = None
+            else:
+                text, sha = file
+                snapshot.manifests[collection_id] = ItemEntry(MANIFEST_NAME, sha, await load_yaml_async(text, sha) or {})
+        return snapshot.manifests[collection_id]
+
+    async def get_item(self, collection_id: str, item_id: str) -> Optional[ItemEntry]:
+        """
+        Get a collection item, without loading the whole collection if it is not already loaded.
+
+        Returns:
+            ItemEntry: The item, or None if it does not exist
+        """
+        snapshot = await self.get_snapshot()
+        if collection_id in snapshot.collections:
+            return snapshot.collections[collection_id].entries.get(item_id)
+
+        key = (collection_id, item_id)
+        if key not in snapshot.items:
+            name = f"{item_id}.yml"
+            if not is_item_file(name):
+                return None
+            file = await self.backend.read_file(f"{COLLECTIONS_PATH}/{collection_id}/{name}", snapshot.commit_sha)
+            if file is None:
+                snapshot.items[key] = None
+            else:
+                text, sha = file
+                previous = self.previous_entries.get(sha)
+                if previous is not None:
+                    snapshot.items[key] = ItemEntry(name, sha, previous.content, previous.modified_at)
+                else:
+                    snapshot.items[key] = ItemEntry(name, sha, await load_yaml_async(text, sha))
+        return snapshot.items[key]
+
+
+def create_content_store() -> ContentStore:
+    """
+    Create the content store for the configured CONTENT_BACKEND.
+    """
+    if CONTENT_BACKEND == "local":
+        return ContentStore(LocalBackend(CONTENT_DIR))
+    return ContentStore(GithubBackend(DATA_REPO, DATA_REF, GITHUB_CONTENT_TOKEN))
+
+
+content_store = create_content_store()
+
+
+def get_warmup_collection_ids(data_config: DataConfig, collections: str = CONTENT_WARMUP_COLLECTIONS) -> List[str]:
+    """
+    Get the IDs of the collections to keep loaded, leaving out any that are not in the data config.
+
+    Args:
+        data_config (DataConfig): The data config
+        collections (str): Comma separated collection IDs, or "*" for all of them
+    """
+    if collections.strip() == "*":
+        return list(data_config.collections)
+    collection_ids = [part.strip() for part in collections.split(",") if part.strip()]
+    return [collection_id for collection_id in collection_ids if data_config.get_collection(collection_id) is not None]
+
+
+async def load_collections(
+    store: ContentStore,
+    collections: str = CONTENT_WARMUP_COLLECTIONS,
+    concurrency: int = CONTENT_WARMUP_CONCURRENCY
+) -> List[str]:
+    """
+    Load collections into a content store's snapshot, a few at a time. Collections that fail to load are logged and skipped.
+
+    Args:
+        store (ContentStore): The content store
+        collections (str): Comma separated collection IDs, or "*" for all of them
+        concurrency (int): Maximum number of collections loaded at once
+
+    Returns:
+        List[str]: The IDs of the collections that loaded
+    """
+    collection_ids = get_warmup_collection_ids(await store.get_config(), collections)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def load(collection_id: str) -> bool:
+        async with semaphore:
+            try:
+                await store.get_collection(collection_id)
+                return True
+            except Exception as e:
+                logger.warning("Error loading collection %s: %s", collection_id, describe_error(e))
+                return False
+
+    loaded = await asyncio.gather(*(load(collection_id) for collection_id in collection_ids))
+    return [collection_id for collection_id, ok in zip(collection_ids, loaded) if ok]
+
+
+async def warm_up(
+    store: ContentStore,
+    collections: str = CONTENT_WARMUP_COLLECTIONS,
+    concurrency: int = CONTENT_WARMUP_CONCURRENCY,
+    retry_interval: float = CONTENT_WARMUP_RETRY_INTERVAL
+) -> List[str]:
+    """
+    Load the data config and some collections into a content store, so the first requests do not wait for them.
+
+    The data config is retried until it loads, as the app cannot serve anything without it.
+
+    Args:
+        store (ContentStore): The content store
+        collections (str): Comma separated collection IDs, or "*" for all of them
+        concurrency (int): Maximum number of collections loaded at once
+        retry_interval (float): Seconds to wait before trying to load the data config again
+
+    Returns:
+        List[str]: The IDs of the collections that loaded
+    """
+    started = time.monotonic()
+    while True:
+        try:
+            data_config = await store.get_config()
+            break
+        except Exception as e:
+            logger.warning("Error loading the data config, retrying in %ss: %s", retry_interval, describe_error(e))
+            await asyncio.sleep(retry_interval)
+
+    if collections.strip() != "*":
+        for collection_id in (part.strip() for part in collections.split(",")):
+            if collection_id and data_config.get_collection(collection_id) is None:
+                logger.warning("Not warming up unknown collection %s", collection_id)
+
+    loaded = await load_collections(store, collections, concurrency)
+    logger.info("Warmed up the data config and %d collections in %.1fs", len(loaded), time.monotonic() - started)
+    return loaded
+
+
+async def poll_content(
+    store: ContentStore,
+    interval: float = CONTENT_POLL_INTERVAL,
+    collections: str = ""
+) -> None:
+    """
+    Keep a content store up to date in the background, as a fallback for missed webhooks.
+
+    Args:
+        store (ContentStore): The content store
+        interval (float): Seconds between checks for a new commit
+        collections (str): Collections to load again after a new commit, comma separated or "*" for all of them
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.refresh()
+            if collections:
+                await load_collections(store, collections)
+        except Exception as e:
+            logger.warning("Error refreshing content: %s", describe_error(e))
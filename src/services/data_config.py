@@ -0,0 +1,70 @@
+from typing import Dict, List, Optional
+
+CONFIG_PATH = "config.yml"
+
+
+def index_fields(fields: List[Dict], prefix: str = "") -> Dict[str, Dict]:
+    """
+    Index field configurations by ID, including the fields nested in repeatable fields.
+
+    Nested fields are keyed by their parent IDs and their own ID joined with "/", e.g. "links/url".
+
+    Args:
+        fields (List[Dict]): The field configurations
+        prefix (str): The key prefix of the parent field
+
+    Returns:
+        Dict[str, Dict]: Field configurations keyed by ID path
+    """
+    index = {}
+    for field in fields or []:
+        key = f"{prefix}{field.get('id')}"
+        index[key] = field
+        if field.get("fields"):
+            index.update(index_fields(field.get("fields"), f"{key}/"))
+    return index
+
+
+class DataConfig:
+    def __init__(self, config: Dict, sha: Optional[str] = None):
+        """
+        The data repository config.yml with lookups of collections and fields by ID.
+
+        The config and the collections in it are shared between requests and must not be modified.
+
+        Args:
+            config (Dict): The parsed config.yml
+            sha (str, optional): The blob SHA of config.yml the config was loaded from
+        """
+        self.config = config or {}
+        self.sha = sha
+        self.collections: Dict[str, Dict] = {
+            collection.get("id"): collection for collection in self.config.get("collections", [])
+        }
+        self.fields: Dict[str, Dict[str, Dict]] = {
+            collection_id: index_fields(collection.get("fields", []))
+            for collection_id, collection in self.collections.items()
+        }
+        # Field paths declared under a collection's "indexes", e.g. "title" or "links/id", that items can be looked up by
+        self.indexes: Dict[str, List[str]] = {
+            collection_id: [path for path in collection.get("indexes") or [] if path in self.fields[collection_id]]
+            for collection_id, collection in self.collections.items()
+        }
+
+    def get_collection(self, collection_id: str) -> Optional[Dict]:
+        """
+        Get a collection configuration by ID.
+        """
+        return self.collections.get(collection_id)
+
+    def get_field(self, collection_id: str, *field_ids: str) -> Optional[Dict]:
+        """
+        Get a field configuration by its ID, or the IDs of its parent fields followed by its own ID.
+        """
+        return self.fields.get(collection_id, {}).get("/".join(field_ids))
+
+    def has_index(self, collection_id: str, field_path: str) -> bool:
+        """
+        Check whether a collection declares an index on a field path.
+        """
+        return field_path in self.indexes.get(collection_id, [])
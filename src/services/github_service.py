@@ -1,25 +1,116 @@
-import requests
+import httpx
+import asyncio
 import base64
+import copy
+import hashlib
+import io
 import json
-import yaml
-from typing import Dict, Optional, List
+import random
+import tarfile
+from typing import Any, Awaitable, Callable, Dict, Optional, List, Tuple
 from fastapi import HTTPException, status
+from src.services.metrics import (
+    github_cache_requests, github_operation, github_requests, github_response_bytes, observe_github_call
+)
+from src.services.rate_limit import RateLimitScheduler, PRIORITY_INTERACTIVE
+from src.services.response_cache import CacheEntry, ResponseCache, response_cache
+from src.services.user_cache import repo_access_cache, user_cache
+from src.services.yaml_loader import dump_yaml, load_yaml_async
 import os
 
+# Base URL of the GitHub REST API, e.g. to use GitHub Enterprise or a local stand-in for benchmarking
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+# URL of the GitHub GraphQL API, empty to work it out from GITHUB_API_URL
+GITHUB_GRAPHQL_URL = os.environ.get("GITHUB_GRAPHQL_URL", "").rstrip("/")
+GITHUB_MAX_CONNECTIONS = int(os.environ.get("GITHUB_MAX_CONNECTIONS", "20"))
+GITHUB_TIMEOUT = float(os.environ.get("GITHUB_TIMEOUT", "10"))
+# Number of blobs requested per GraphQL query when bulk loading a directory
+GITHUB_BLOB_BATCH_SIZE = int(os.environ.get("GITHUB_BLOB_BATCH_SIZE", "100"))
+# Directories with more files than this are loaded from the repository tarball instead of blob by blob
+GITHUB_TARBALL_THRESHOLD = int(os.environ.get("GITHUB_TARBALL_THRESHOLD", "500"))
+
+# Times a multi-file commit is rebuilt and retried when the branch moves while it is being made
+GITHUB_COMMIT_ATTEMPTS = int(os.environ.get("GITHUB_COMMIT_ATTEMPTS", "3"))
+
+_http_client: Optional[httpx.AsyncClient] = None
+rate_limiter = RateLimitScheduler(GITHUB_MAX_CONNECTIONS)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create a pooled HTTP client for talking to the GitHub API.
+
+    Connections are kept alive between requests so each GitHub call does not pay for a new TLS handshake.
+    """
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(GITHUB_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=GITHUB_MAX_CONNECTIONS,
+            max_keepalive_connections=GITHUB_MAX_CONNECTIONS
+        )
+    )
+
+
+async def open_http_client() -> httpx.AsyncClient:
+    """
+    Open the shared HTTP client. Called from the application lifespan hook.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """
+    Close the shared HTTP client and release its pooled connections.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client, creating it if the lifespan hook has not run (e.g. in scripts).
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
 class GithubService:
-    def __init__(self, access_token: Optional[str] = None):
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[ResponseCache] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ):
         """
         Initialize the GitHub service.
 
         Args:
             access_token (str, optional): GitHub personal access token
+            client (httpx.AsyncClient, optional): HTTP client to use, defaults to the shared pooled client
+            cache (ResponseCache, optional): Response cache to use, defaults to the shared cache
+            priority (int): PRIORITY_INTERACTIVE for requests made for an editor, PRIORITY_BACKGROUND for
+                            refreshing shared content, which waits behind them and falls back to cached
+                            data sooner when the rate limit runs low
         """
-        self.base_url = "https://api.github.com"
+        self.base_url = GITHUB_API_URL
+        self.graphql_url = GITHUB_GRAPHQL_URL or get_graphql_url(self.base_url)
+        self.client = client or get_http_client()
+        self.cache = cache if cache is not None else response_cache
         self.headers = {
             "Accept": "application/vnd.github.v3+json",
             "X-GitHub-Api-Version": "2022-11-28"
         }
         self.params = None
+        self.access_token = access_token
+        self.priority = priority
 
         if access_token:
             self.headers["Authorization"] = f"Bearer {access_token}"
@@ -29,17 +120,126 @@ class GithubService:
                 "client_secret": os.environ.get("GITHUB_CLIENT_SECRET")
             }
 
+    @property
+    def cache_scope(self) -> str:
+        """
+        The response cache scope for this service's credentials.
+        """
+        return ResponseCache.scope_for_token(self.headers.get("Authorization"))
+
     def transform_url(self, url: str) -> str:
         """
         Transform the URL to include the client ID and client secret.
         This is necessary for unauthenticated requests to the GitHub API, otherwise it will hit a rate limit of 60 requests per hour.
         """
         if self.params:
-            return url + "?" + "&".join([f"{key}={value}" for key, value in self.params.items()])
+            separator = "&" if "?" in url else "?"
+            return url + separator + "&".join([f"{key}={value}" for key, value in self.params.items()])
         else:
             return url
 
-    def get_current_user(self) -> Dict:
+    async def send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through the rate limit scheduler.
+
+        Args:
+            method (str): The HTTP method
+            url (str): The URL
+            **kwargs: Passed on to the HTTP client, the service headers are sent unless headers are given
+
+        Raises:
+            HTTPException: 503 if this service's credentials are rate limited for too long
+        """
+        kwargs.setdefault("headers", self.headers)
+        response = self.check_response(
+            await rate_limiter.send(self.client, self.cache_scope, self.priority, method, url, **kwargs)
+        )
+        operation = github_operation.get() or "other"
+        github_requests.inc(method=operation, status=response.status_code)
+        github_response_bytes.inc(len(response.content), method=operation)
+        return response
+
+    def check_response(self, response: httpx.Response) -> httpx.Response:
+        """
+        Forget the cached user and access of a token GitHub has rejected, so it is verified again on the next request.
+        """
+        if response.status_code == 401 and self.access_token:
+            user_cache.forget(self.access_token)
+            repo_access_cache.forget(self.access_token)
+        return response
+
+    def contents_url(self, repo: str, path: str, ref: Optional[str] = None) -> str:
+        """
+        Build the Contents API URL for a path, optionally at a ref.
+        """
+        url = f"{self.base_url}/repos/{repo}/contents/{path.strip('/')}"
+        if ref:
+            url += f"?ref={ref}"
+        return url
+
+    @staticmethod
+    def cached_response(entry: CacheEntry, request: httpx.Request) -> httpx.Response:
+        """
+        Build a 200 response from a cache entry.
+        """
+        headers = {"ETag": entry.etag}
+        if entry.content_type:
+            headers["Content-Type"] = entry.content_type
+        return httpx.Response(200, content=entry.body, headers=headers, request=request)
+
+    async def cached_get(self, url: str, headers: Optional[Dict] = None) -> Tuple[httpx.Response, Optional[CacheEntry]]:
+        """
+        GET a URL through the response cache.
+
+        A cached copy is revalidated with If-None-Match. When GitHub replies 304 Not Modified the cached
+        body is returned as a 200 response, so callers do not need to know whether the cache was used.
+        While the rate limit is running low the cached copy is returned without revalidating it.
+
+        Args:
+            url (str): The URL to get
+            headers (Dict, optional): Request headers, defaults to the service headers
+
+        Returns:
+            Tuple containing:
+            - The response
+            - The cache entry for the response, or None if it was not cacheable
+        """
+        headers = headers or self.headers
+        key = (self.cache_scope, headers.get("Accept", ""), url)
+        entry = self.cache.get(key)
+
+        if entry is not None and rate_limiter.should_use_cache(self.cache_scope, url, self.priority):
+            # Save what is left of the rate limit, the cached copy may be slightly out of date
+            self.cache.hits += 1
+            rate_limiter.served_from_cache += 1
+            github_cache_requests.inc(method=github_operation.get(), outcome="stale")
+            return self.cached_response(entry, httpx.Request("GET", url, headers=headers)), entry
+
+        if entry is not None:
+            headers = {**headers, "If-None-Match": entry.etag}
+            self.cache.revalidations += 1
+
+        response = await self.send("GET", url, headers=headers)
+
+        if response.status_code == 304 and entry is not None:
+            self.cache.hits += 1
+            github_cache_requests.inc(method=github_operation.get(), outcome="hit")
+            return self.cached_response(entry, response.request), entry
+
+        self.cache.misses += 1
+        etag = response.headers.get("ETag")
+        if response.status_code == 200 and etag:
+            github_cache_requests.inc(method=github_operation.get(), outcome="miss")
+            entry = CacheEntry(etag, response.content, response.headers.get("Content-Type"))
+            self.cache.put(key, entry)
+            return response, entry
+
+        github_cache_requests.inc(method=github_operation.get(), outcome="uncached")
+        self.cache.discard(key)
+        return response, None
+
+    @observe_github_call
+    async def get_current_user(self) -> Dict:
         """
         Get details of the authenticated user.
 
@@ -49,7 +249,8 @@ class GithubService:
         Raises:
             HTTPException: If the API request fails or user is not authenticated
         """
-        response = requests.get(
+        response = await self.send(
+            "GET",
             f"{self.base_url}/user",
             headers=self.headers
         )
@@ -63,41 +264,40 @@ class GithubService:
         response.raise_for_status()
         return response.json()
 
-    def get_repository_details(self, repo: str) -> Dict:
+    @observe_github_call
+    async def get_repository_details(self, repo: str) -> httpx.Response:
         """
         Get details of a specific repository.
 
         Args:
-            owner (str): Repository owner's username
-            repo (str): Repository name
+            repo (str): Repository name in the format "owner/repo"
 
         Returns:
-            Dict: Repository information including name, description, stars, etc.
+            httpx.Response: Repository information including name, description, stars, etc.
 
         Raises:
-            requests.exceptions.RequestException: If the API request fails
+            httpx.HTTPStatusError: If the API request fails
         """
-        response = requests.get(
-            self.transform_url(f"{self.base_url}/repos/{repo}"),
-            headers=self.headers
-        )
+        response, _ = await self.cached_get(self.transform_url(f"{self.base_url}/repos/{repo}"))
         response.raise_for_status()
         return response
 
-    def check_repo_access(self, repo: str) -> Dict:
+    @observe_github_call
+    async def check_repo_access(self, repo: str) -> Dict:
         """
         Check if the authenticated user has read and write access to a specific repository.
 
         Args:
             repo (str): Repository name in the format "owner/repo"
         """
-        response = self.get_repository_details(repo)
-        if response.status_code == 404:
-            return {
-                "has_access": False,
-                "detail": "Repository not found or no access"
-            }
-        elif response.status_code != 200:
+        try:
+            response = await self.get_repository_details(repo)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return {
+                    "has_access": False,
+                    "detail": "Repository not found or no access"
+                }
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to check repository access"
@@ -115,83 +315,553 @@ class GithubService:
             }
         }
 
-    def get_repo_content_for_path(self, repo: str, path: str, format: str = "yaml", get_sha: bool = False) -> Dict:
+    @observe_github_call
+    async def get_repo_content_for_path(
+        self,
+        repo: str,
+        path: str,
+        format: str = "yaml",
+        get_sha: bool = False,
+        ref: Optional[str] = None
+    ) -> Dict:
         """
         Get the contents of a file or directory at a specific path in a repository.
 
         Args:
             repo (str): Repository name in the format "owner/repo"
             path (str): Path to the file or directory within the repository
+            format (str): "yaml" or "json" to parse the file, anything else returns its text
+            get_sha (bool): Return a dict with the "content" and the blob "sha"
+            ref (str, optional): The commit, branch or tag to read at, defaults to the default branch
 
         Returns:
             Dict: Content information including type (file/dir), size, encoding, and content
                  for files or list of contents for directories
 
         Raises:
-            requests.exceptions.RequestException: If the API request fails
+            httpx.HTTPStatusError: If the API request fails
         """
-        response = requests.get(
-            self.transform_url(f"{self.base_url}/repos/{repo}/contents/{path.strip('/')}"),
-            headers=self.headers
+        response, entry = await self.cached_get(
+            self.transform_url(self.contents_url(repo, path, ref))
         )
         response.raise_for_status()
-        response = response.json()
-        base64Content = response.get("content", "")
-        content = base64.b64decode(base64Content).decode("utf-8")
 
-        if format == "yaml":
-            content = yaml.safe_load(content)
-        elif format == "json":
-            content = json.loads(content)
+        # Reuse the content parsed from an unchanged response rather than decoding it again
+        parsed = entry.parsed.get(format) if entry else None
+        if parsed is None:
+            response = response.json()
+            base64Content = response.get("content", "")
+            content = base64.b64decode(base64Content).decode("utf-8")
+            size = len(content)
+
+            if format == "yaml":
+                content = await load_yaml_async(content, response.get("sha"))
+            elif format == "json":
+                content = json.loads(content)
+
+            parsed = {"content": content, "sha": response.get("sha")}
+            if entry:
+                self.cache.set_parsed(entry, format, parsed, size)
+
+        # Callers edit the content they get back, so they must not be handed the cached copy
+        content = copy.deepcopy(parsed["content"])
 
         if get_sha:
             return {
                 "content": content,
-                "sha": response.get("sha")
+                "sha": parsed["sha"]
             }
         else:
             return content
 
 
-    def list_files_in_directory(self, repo: str, path: str) -> List[Dict]:
+    @observe_github_call
+    async def list_files_in_directory(self, repo: str, path: str, ref: Optional[str] = None) -> List[Dict]:
         """
         List all files in a specific directory in a repository.
 
         Args:
             repo (str): Repository name in the format "owner/repo"
+            path (str): Path to the directory within the repository
+            ref (str, optional): The commit, branch or tag to read at, defaults to the default branch
         """
-        response = requests.get(
-            self.transform_url(f"{self.base_url}/repos/{repo}/contents/{path.strip('/')}"),
-            headers=self.headers
+        response, _ = await self.cached_get(
+            self.transform_url(self.contents_url(repo, path, ref))
         )
         response.raise_for_status()
         return response.json()
 
-    def update_repo_content(self, repo: str, path: str, content: dict, format: str = "yaml", commit_message: str = "Update content", sha: str = None) -> None:
+    @observe_github_call
+    async def update_repo_content(
+        self,
+        repo: str,
+        path: str,
+        content: Any,
+        format: str = "yaml",
+        commit_message: str = "Update content",
+        sha: str = None,
+        branch: Optional[str] = None
+    ) -> Dict:
         """
         Update the contents of a file at a specific path in a repository.
 
         Args:
             repo (str): Repository name in the format "owner/repo"
             path (str): Path to the file or directory within the repository
-            content (dict): Content to be updated
+            content: Content to be updated, written as "yaml" or "json", or the file text for any other format
+            sha (str, optional): The blob SHA of the file being replaced. GitHub answers 409 if the file has changed since
+            branch (str, optional): The branch to commit to, defaults to the default branch
+
+        Returns:
+            Dict: The new file "content", with its blob "sha", and the "commit", with its "sha" and "parents"
 
         Raises:
-            requests.exceptions.RequestException: If the API request fails
+            httpx.HTTPStatusError: If the API request fails
         """
         if format == "yaml":
-            content = yaml.dump(content)
+            content = dump_yaml(content)
         elif format == "json":
             content = json.dumps(content)
 
-        response = requests.put(
+        body = {
+            "message": commit_message,
+            "content": base64.b64encode(content.encode("utf-8")).decode("utf-8"),
+            "sha": sha
+        }
+        if branch:
+            body["branch"] = branch
+        response = await self.send(
+            "PUT",
             f"{self.base_url}/repos/{repo}/contents/{path.strip('/')}",
             headers=self.headers,
-            json={
-                "message": commit_message,
-                "content": base64.b64encode(content.encode("utf-8")).decode("utf-8"),
-                "sha": sha
-            }
+            json=body
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @observe_github_call
+    async def get_branch_head(self, repo: str, branch: str) -> str:
+        """
+        Get the commit SHA a branch points at, bypassing the response cache so it is never stale.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            branch (str): The branch name
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        response = await self.send(
+            "GET",
+            self.transform_url(f"{self.base_url}/repos/{repo}/git/ref/heads/{branch}"),
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()["object"]["sha"]
+
+    @observe_github_call
+    async def get_commit(self, repo: str, sha: str) -> Dict:
+        """
+        Get a commit using the Git Commits API.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            sha (str): The commit SHA
+
+        Returns:
+            Dict: The commit, with its "tree" and "parents"
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        response, _ = await self.cached_get(self.transform_url(f"{self.base_url}/repos/{repo}/git/commits/{sha}"))
+        response.raise_for_status()
+        return response.json()
+
+    @observe_github_call
+    async def create_tree(self, repo: str, base_tree: str, files: Dict[str, Optional[str]]) -> Dict:
+        """
+        Create a tree that changes some files of a base tree. File contents are sent inline, so no separate blobs are created.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            base_tree (str): The SHA of the tree to change
+            files (Dict[str, Optional[str]]): New file text keyed by path, None to delete the file
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        tree = [
+            {"path": path.strip("/"), "mode": "100644", "type": "blob", **({"content": text} if text is not None else {"sha": None})}
+            for path, text in files.items()
+        ]
+        response = await self.send(
+            "POST",
+            f"{self.base_url}/repos/{repo}/git/trees",
+            headers=self.headers,
+            json={"base_tree": base_tree, "tree": tree}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @observe_github_call
+    async def create_commit(self, repo: str, message: str, tree: str, parents: List[str]) -> Dict:
+        """
+        Create a commit using the Git Commits API. No branch points at it until update_branch is called.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            message (str): The commit message
+            tree (str): The SHA of the commit's tree
+            parents (List[str]): The SHAs of the parent commits
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        response = await self.send(
+            "POST",
+            f"{self.base_url}/repos/{repo}/git/commits",
+            headers=self.headers,
+            json={"message": message, "tree": tree, "parents": parents}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @observe_github_call
+    async def update_branch(self, repo: str, branch: str, sha: str) -> bool:
+        """
+        Move a branch to a commit, only if that is a fast-forward.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            branch (str): The branch name
+            sha (str): The commit SHA to move the branch to
+
+        Returns:
+            bool: False if the branch has moved on and the update is not a fast-forward
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails for another reason
+        """
+        response = await self.send(
+            "PATCH",
+            f"{self.base_url}/repos/{repo}/git/refs/heads/{branch}",
+            headers=self.headers,
+            json={"sha": sha, "force": False}
+        )
+        if response.status_code in (409, 422):
+            return False
+        response.raise_for_status()
+        return True
+
+    @observe_github_call
+    async def commit_files(
+        self,
+        repo: str,
+        branch: str,
+        build: Callable[[str], Awaitable[Dict[str, Optional[str]]]],
+        commit_message: str = "Update content",
+        attempts: int = GITHUB_COMMIT_ATTEMPTS,
+        backoff: float = 0
+    ) -> Tuple[Optional[Dict], Dict[str, Optional[str]]]:
+        """
+        Change many files in a single commit with the Git Data API.
+
+        The branch is updated with a fast-forward only. If another commit lands first, the files are
+        rebuilt from the new head and the commit is made again, up to attempts times.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            branch (str): The branch to commit to
+            build: Coroutine function taking the head commit SHA and returning new file text keyed by path,
+                   None to delete a file
+            commit_message (str): The commit message
+            attempts (int): Maximum number of times to try
+            backoff (float): Seconds to wait before the first retry, doubled on each further retry
+
+        Returns:
+            Tuple containing:
+            - The commit, with its "sha" and "parents", or None if build returned no files
+            - The files that were committed
+
+        Raises:
+            HTTPException: 409 if the branch kept moving
+            httpx.HTTPStatusError: If an API request fails
+        """
+        for attempt in range(max(1, attempts)):
+            if attempt and backoff:
+                await asyncio.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            head = await self.get_branch_head(repo, branch)
+            files = await build(head)
+            if not files:
+                return None, files
+            commit = await self.get_commit(repo, head)
+            tree = await self.create_tree(repo, commit["tree"]["sha"], files)
+            new_commit = await self.create_commit(repo, commit_message, tree["sha"], [head])
+            if await self.update_branch(repo, branch, new_commit["sha"]):
+                return new_commit, files
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The content changed while it was being saved, try again"
+        )
+
+    @observe_github_call
+    async def get_head_sha(self, repo: str, ref: str = "HEAD") -> str:
+        """
+        Resolve a branch, tag or "HEAD" to a commit SHA.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            ref (str): The ref to resolve
+
+        Returns:
+            str: The commit SHA
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        response, _ = await self.cached_get(
+            self.transform_url(f"{self.base_url}/repos/{repo}/commits/{ref}"),
+            headers={**self.headers, "Accept": "application/vnd.github.sha"}
         )
         response.raise_for_status()
+        return response.text.strip()
+
+    @observe_github_call
+    async def compare_commits(self, repo: str, base: str, head: str) -> Dict:
+        """
+        Compare two commits, listing the files changed between them.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            base (str): The base commit SHA
+            head (str): The head commit SHA
+
+        Returns:
+            Dict: The comparison, with its "status" and the changed "files" (at most 300)
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        response, _ = await self.cached_get(self.transform_url(f"{self.base_url}/repos/{repo}/compare/{base}...{head}"))
+        response.raise_for_status()
+        return response.json()
+
+    @observe_github_call
+    async def get_tree(self, repo: str, tree_ish: str) -> Dict:
+        """
+        Get a tree using the Git Trees API. Unlike the Contents API this is not limited to 1,000 entries.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            tree_ish (str): A tree SHA, or "<commit sha>:<path>" for a directory at a commit
+
+        Returns:
+            Dict: The tree, with its "sha" and a "tree" list of entries (path, type, sha, size)
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        response, _ = await self.cached_get(self.transform_url(f"{self.base_url}/repos/{repo}/git/trees/{tree_ish}"))
+        response.raise_for_status()
         return response.json()
+
+    @observe_github_call
+    async def list_tree_files(self, repo: str, ref: str, path: str) -> List[Dict]:
+        """
+        List the files directly inside a directory at a commit, using the Git Trees API.
+
+        GitHub truncates very large trees, in which case the files are listed from the repository tarball.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            ref (str): The commit SHA or ref
+            path (str): Path to the directory within the repository
+
+        Returns:
+            List[Dict]: Tree entries of the files, each with "path" (the file name) and "sha"
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        tree = await self.get_tree(repo, f"{ref}:{path.strip('/')}")
+        if not tree.get("truncated"):
+            return [entry for entry in tree.get("tree", []) if entry.get("type") == "blob"]
+        files = await self.get_tarball_files(repo, ref, path)
+        return [{"path": name, "type": "blob", "sha": git_blob_sha(text.encode("utf-8"))} for name, text in files.items()]
+
+    @observe_github_call
+    async def get_blob(self, repo: str, sha: str) -> str:
+        """
+        Get the raw text of a single blob.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            sha (str): The blob SHA
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        response, _ = await self.cached_get(
+            self.transform_url(f"{self.base_url}/repos/{repo}/git/blobs/{sha}"),
+            headers={**self.headers, "Accept": "application/vnd.github.raw"}
+        )
+        response.raise_for_status()
+        return response.content.decode("utf-8")
+
+    @observe_github_call
+    async def get_blobs(self, repo: str, shas: List[str], max_concurrency: int = 10) -> Dict[str, str]:
+        """
+        Get the raw text of many blobs.
+
+        With an access token the blobs are fetched in batches of GITHUB_BLOB_BATCH_SIZE per GraphQL query.
+        GraphQL is not available to client credentials, so otherwise each blob is fetched with the REST API,
+        max_concurrency at a time.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            shas (List[str]): The blob SHAs to fetch
+            max_concurrency (int): Maximum number of REST requests in flight at once
+
+        Returns:
+            Dict[str, str]: Blob text keyed by SHA, blobs that failed to load are left out
+        """
+        blobs = {}
+        missing = list(dict.fromkeys(shas))
+
+        if "Authorization" in self.headers:
+            owner, name = repo.split("/", 1)
+            for start in range(0, len(missing), GITHUB_BLOB_BATCH_SIZE):
+                batch = missing[start:start + GITHUB_BLOB_BATCH_SIZE]
+                fields = " ".join(
+                    f'b{index}: object(oid: "{sha}") {{ ... on Blob {{ text isTruncated isBinary }} }}'
+                    for index, sha in enumerate(batch)
+                )
+                response = await self.send(
+                    "POST",
+                    self.graphql_url,
+                    headers=self.headers,
+                    json={
+                        "query": f"query($owner: String!, $name: String!) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}",
+                        "variables": {"owner": owner, "name": name}
+                    }
+                )
+                response.raise_for_status()
+                repository = (response.json().get("data") or {}).get("repository") or {}
+                for index, sha in enumerate(batch):
+                    blob = repository.get(f"b{index}") or {}
+                    # Large or binary blobs have no usable text, those fall through to the REST API
+                    if blob.get("text") is not None and not blob.get("isTruncated"):
+                        blobs[sha] = blob["text"]
+            missing = [sha for sha in missing if sha not in blobs]
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def fetch_blob(sha: str) -> None:
+            async with semaphore:
+                blobs[sha] = await self.get_blob(repo, sha)
+
+        await asyncio.gather(*(fetch_blob(sha) for sha in missing), return_exceptions=True)
+        return blobs
+
+    @observe_github_call
+    async def get_tarball_files(self, repo: str, ref: str, path: str) -> Dict[str, str]:
+        """
+        Download the repository tarball at a ref and extract the files directly inside a directory.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            ref (str): The commit SHA or ref to download
+            path (str): The directory within the repository
+
+        Returns:
+            Dict[str, str]: File text keyed by file name
+        """
+        response = await self.send(
+            "GET",
+            self.transform_url(f"{self.base_url}/repos/{repo}/tarball/{ref}"),
+            headers=self.headers,
+            follow_redirects=True
+        )
+        response.raise_for_status()
+        return await asyncio.to_thread(extract_tarball_directory, response.content, path)
+
+    @observe_github_call
+    async def get_file_contents(
+        self,
+        repo: str,
+        ref: str,
+        path: str,
+        entries: List[Dict],
+        max_concurrency: int = 10
+    ) -> Dict[str, str]:
+        """
+        Get the text of many files in a directory in a few requests.
+
+        The blobs are fetched in batches, or from the tarball when there are more than
+        GITHUB_TARBALL_THRESHOLD of them.
+
+        Args:
+            repo (str): Repository name in the format "owner/repo"
+            ref (str): The commit SHA the entries were listed at
+            path (str): Path to the directory within the repository
+            entries (List[Dict]): Tree entries of the files to get, with "path" (the file name) and "sha"
+            max_concurrency (int): Maximum number of blob requests in flight at once
+
+        Returns:
+            Dict[str, str]: File text keyed by blob SHA, files that failed to load are left out
+
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        if len(entries) > GITHUB_TARBALL_THRESHOLD:
+            files = await self.get_tarball_files(repo, ref, path)
+            return {entry["sha"]: files[entry["path"]] for entry in entries if entry["path"] in files}
+
+        return await self.get_blobs(repo, [entry["sha"] for entry in entries], max_concurrency)
+
+
+def get_graphql_url(api_url: str) -> str:
+    """
+    Get the URL of the GraphQL API from that of the REST API.
+
+    GitHub Enterprise Server serves the REST API under /api/v3 and GraphQL at /api/graphql, while
+    github.com serves GraphQL at api.github.com/graphql.
+    """
+    if api_url.endswith("/api/v3"):
+        return api_url[:-len("/v3")] + "/graphql"
+    return f"{api_url}/graphql"
+
+
+def git_blob_sha(data: bytes) -> str:
+    """
+    Get the git blob SHA of some content, the same SHA GitHub reports for the file.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def extract_tarball_directory(tarball: bytes, path: str) -> Dict[str, str]:
+    """
+    Extract the text of the files directly inside a directory of a GitHub repository tarball.
+
+    GitHub tarballs have a single top level "<owner>-<repo>-<sha>/" directory, which is ignored.
+
+    Args:
+        tarball (bytes): The gzipped tarball
+        path (str): The directory within the repository
+
+    Returns:
+        Dict[str, str]: File text keyed by file name
+    """
+    files = {}
+    prefix = path.strip("/") + "/"
+    with tarfile.open(fileobj=io.BytesIO(tarball), mode="r:gz") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            member_path = member.name.split("/", 1)[-1]
+            if not member_path.startswith(prefix) or "/" in member_path[len(prefix):]:
+                continue
+            files[member_path[len(prefix):]] = archive.extractfile(member).read().decode("utf-8")
+    return files
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from src.services.yaml_loader import dump_yaml
+
+# File in each collection directory listing its items, so they can be listed without reading every item file
+MANIFEST_NAME = "_index.yml"
+
+
+def manifest_path(collections_path: str, collection_id: str) -> str:
+    """
+    Get the path of a collection's manifest, e.g. "data/collections/posts/_index.yml".
+    """
+    return f"{collections_path}/{collection_id}/{MANIFEST_NAME}"
+
+
+def manifest_entry(collection: Dict, item_id: str, content: Any, sha: str, updated_at: Optional[str] = None) -> Dict:
+    """
+    Summarise an item for a collection's manifest.
+
+    Args:
+        collection (Dict): The collection configuration
+        item_id (str): The item ID (its file name without the extension)
+        content: The parsed item
+        sha (str): The blob SHA of the item file
+        updated_at (str, optional): When the item was last changed, defaults to now
+
+    Returns:
+        Dict: The item's "id", "label", "sha" and "updated_at"
+    """
+    label_field = (collection.get("field_map") or {}).get("label")
+    data = content.get("data") or {} if isinstance(content, dict) else {}
+    return {
+        "id": item_id,
+        "label": data.get(label_field),
+        "sha": sha,
+        "updated_at": updated_at or datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    }
+
+
+def build_manifest(entries: List[Dict]) -> Dict:
+    """
+    Build a manifest from item summaries, in item ID order.
+    """
+    return {"items": sorted(entries, key=lambda entry: entry["id"])}
+
+
+def update_manifest(manifest: Dict, entries: Dict[str, Optional[Dict]]) -> Dict:
+    """
+    Replace or remove some items of a manifest.
+
+    Args:
+        manifest (Dict): The current manifest, which is not changed
+        entries (Dict[str, Optional[Dict]]): New summaries keyed by item ID, None to remove the item
+
+    Returns:
+        Dict: The new manifest
+    """
+    items = {entry.get("id"): entry for entry in (manifest or {}).get("items") or []}
+    for item_id, entry in entries.items():
+        if entry is None:
+            items.pop(item_id, None)
+        else:
+            items[item_id] = entry
+    return build_manifest(list(items.values()))
+
+
+def dump_manifest(manifest: Dict) -> str:
+    return dump_yaml(manifest, sort_keys=False, allow_unicode=True)
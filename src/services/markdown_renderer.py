@@ -0,0 +1,129 @@
+import copy
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import markdown
+
+from src.services.data_config import index_fields
+
+# Maximum number of rendered Markdown texts to remember
+MARKDOWN_CACHE_MAX_ENTRIES = int(os.environ.get("MARKDOWN_CACHE_MAX_ENTRIES", "2000"))
+# Render the Markdown fields of every item when a collection is loaded, rather than when they are first shown
+MARKDOWN_PRERENDER = os.environ.get("MARKDOWN_PRERENDER", "false").lower() == "true"
+# Field types whose values are Markdown
+MARKDOWN_FIELD_TYPES = ("govspeak",)
+
+
+def get_markdown_fields(collection: Dict) -> Tuple[str, ...]:
+    """
+    Get the paths of a collection's Markdown fields, including those nested in repeatable fields.
+
+    Args:
+        collection (Dict): The collection configuration
+
+    Returns:
+        Tuple[str, ...]: Field paths, e.g. ("body", "sections/body")
+    """
+    return tuple(
+        path for path, field in index_fields(collection.get("fields", [])).items()
+        if field.get("type") in MARKDOWN_FIELD_TYPES
+    )
+
+
+class MarkdownRenderer:
+    def __init__(
+        self,
+        extensions: Optional[List[str]] = None,
+        output_format: str = "xhtml",
+        max_entries: int = MARKDOWN_CACHE_MAX_ENTRIES
+    ):
+        """
+        Markdown to HTML converter that remembers what it rendered.
+
+        Each thread reuses one Markdown instance rather than building a parser for every text.
+        Rendered HTML is kept keyed by a hash of the renderer settings and the text.
+
+        Args:
+            extensions (List[str], optional): Markdown extensions to enable
+            output_format (str): "xhtml" or "html"
+            max_entries (int): Maximum number of texts to remember, least recently used are dropped first
+        """
+        self.extensions = list(extensions or [])
+        self.output_format = output_format
+        self.max_entries = max_entries
+        self.settings_key = f"{markdown.__version__}|{output_format}|{','.join(self.extensions)}"
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_markdown(self) -> markdown.Markdown:
+        """
+        Get this thread's Markdown instance, as instances keep state while converting and cannot be shared.
+        """
+        md = getattr(self.local, "markdown", None)
+        if md is None:
+            md = markdown.Markdown(extensions=self.extensions, output_format=self.output_format)
+            self.local.markdown = md
+        return md
+
+    def render(self, text: Optional[str]) -> str:
+        """
+        Convert Markdown to HTML.
+
+        Args:
+            text (str): The Markdown text, None is rendered as an empty string
+
+        Returns:
+            str: The HTML string
+        """
+        if not text:
+            return ""
+        text = str(text)
+        key = hashlib.sha256(f"{self.settings_key}\0{text}".encode("utf-8")).hexdigest()
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                return html
+
+        html = self.get_markdown().reset().convert(text)
+
+        with self.lock:
+            self.entries[key] = html
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return html
+
+    def render_item(self, content: Any, field_paths: Tuple[str, ...]) -> Any:
+        """
+        Copy an item with the Markdown of some fields rendered to HTML.
+
+        Args:
+            content: The parsed item, which is not changed
+            field_paths (Tuple[str, ...]): Paths of the Markdown fields, from get_markdown_fields
+
+        Returns:
+            The item with the fields' values replaced by their HTML
+        """
+        if not field_paths or not isinstance(content, dict) or not isinstance(content.get("data"), dict):
+            return content
+        rendered = {**content, "data": copy.deepcopy(content["data"])}
+
+        def render_path(value: Any, field_ids: List[str]) -> None:
+            for item in value if isinstance(value, list) else [value]:
+                if not isinstance(item, dict) or item.get(field_ids[0]) is None:
+                    continue
+                if len(field_ids) == 1:
+                    item[field_ids[0]] = self.render(item[field_ids[0]])
+                else:
+                    render_path(item[field_ids[0]], field_ids[1:])
+
+        for field_path in field_paths:
+            render_path(rendered["data"], field_path.split("/"))
+        return rendered
+
+
+markdown_renderer = MarkdownRenderer()
@@ -0,0 +1,286 @@
+import functools
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+# Phases reported in the Server-Timing header, in order, with their descriptions
+SERVER_TIMING_PHASES = {
+    "auth": "Authentication",
+    "config": "Data config",
+    "github": "GitHub requests",
+    "yaml": "YAML parsing",
+    "render": "Template rendering",
+    "total": "Total",
+}
+
+# Time spent in each phase of the current request, in seconds
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+# The GithubService method being called, so its HTTP requests can be labelled with it
+github_operation: ContextVar[Optional[str]] = ContextVar("github_operation", default=None)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        """
+        A metric in the Prometheus text exposition format.
+
+        Args:
+            name (str): The metric name
+            description (str): The HELP text
+            label_names (Tuple[str, ...]): Names of the labels each sample is recorded with
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        registry.append(self)
+
+    def label_values(self, labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        return tuple((name, str(labels.get(name, ""))) for name in self.label_names)
+
+    def samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        return []
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, description, label_names)
+        self.values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self.label_values(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.values.items()]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, description, label_names)
+        self.values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        self.values[self.label_values(labels)] = value
+
+    def clear(self) -> None:
+        self.values.clear()
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets = buckets
+        # Per label values, the count of observations in each bucket (the last being +Inf) and their sum
+        self.values: Dict[Tuple[Tuple[str, str], ...], List] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self.label_values(labels)
+        entry = self.values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+        counts = entry[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+        entry[1] += value
+
+    def samples(self):
+        samples = []
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", labels + (("le", format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+registry: List[Metric] = []
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time taken to respond to requests", ("method", "route", "status")
+)
+github_calls = Counter("github_calls_total", "GithubService method calls", ("method", "outcome"))
+github_call_duration = Histogram(
+    "github_call_duration_seconds", "Time taken by GithubService method calls", ("method",)
+)
+github_requests = Counter(
+    "github_requests_total", "HTTP requests sent to GitHub by GithubService method and status", ("method", "status")
+)
+github_response_bytes = Counter(
+    "github_response_bytes_total", "Bytes received from GitHub by GithubService method", ("method",)
+)
+github_cache_requests = Counter(
+    "github_cache_requests_total",
+    "Cacheable GitHub requests by outcome: hit (304 Not Modified), miss, stale (served without revalidating) or uncached",
+    ("method", "outcome")
+)
+github_cache_bytes = Gauge("github_cache_bytes", "Bytes held by the GitHub response cache")
+github_cache_entries = Gauge("github_cache_entries", "Responses held by the GitHub response cache")
+github_rate_limit_remaining = Gauge(
+    "github_rate_limit_remaining", "Requests left in each credential's GitHub rate limit", ("scope", "resource")
+)
+github_rate_limit_limit = Gauge(
+    "github_rate_limit_limit", "Size of each credential's GitHub rate limit", ("scope", "resource")
+)
+github_requests_waiting = Gauge("github_requests_waiting", "GitHub requests waiting for a free slot")
+yaml_parse_cache_requests = Counter(
+    "yaml_parse_cache_requests_total",
+    "YAML documents looked up by blob SHA by outcome: hit, shared (parsed by another worker) or miss",
+    ("outcome",)
+)
+
+
+def render_metrics() -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+def add_timing(phase: str, seconds: float) -> None:
+    """
+    Add time spent in a phase to the current request's Server-Timing, if there is a current request.
+    """
+    timings = request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timing(phase: str) -> Iterator[None]:
+    """
+    Time a block of code as part of a phase of the current request.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(phase, time.perf_counter() - start)
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """
+    Format phase timings as a Server-Timing header, e.g. 'github;dur=12.3;desc="GitHub requests"'.
+    """
+    return ", ".join(
+        f'{phase};dur={timings[phase] * 1000:.1f};desc="{description}"'
+        for phase, description in SERVER_TIMING_PHASES.items() if phase in timings
+    )
+
+
+def observe_github_call(func: F) -> F:
+    """
+    Decorate a GithubService method to count and time its calls.
+
+    Only the outermost call is added to the request's Server-Timing, as methods call each other.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        outermost = github_operation.get() is None
+        token = github_operation.set(name)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await func(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            github_operation.reset(token)
+            github_calls.inc(method=name, outcome=outcome)
+            github_call_duration.observe(elapsed, method=name)
+            if outermost:
+                add_timing("github", elapsed)
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        """
+        ASGI middleware timing each request by route and adding a Server-Timing header to the response.
+
+        The header holds the phases timed before the response started, so for streamed
+        responses it leaves out the time spent streaming.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = request_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                header = server_timing_header({**timings, "total": time.perf_counter() - start})
+                if header:
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=status_code
+            )
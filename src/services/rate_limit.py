@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+
+# Share of a credential's rate limit kept for interactive requests, background requests use cached data below it
+GITHUB_RATE_LIMIT_RESERVE = float(os.environ.get("GITHUB_RATE_LIMIT_RESERVE", "0.1"))
+# Times a request is retried after hitting a secondary rate limit
+GITHUB_RATE_LIMIT_RETRIES = int(os.environ.get("GITHUB_RATE_LIMIT_RETRIES", "2"))
+# Longest a request waits for a rate limit to lift, in seconds, before it fails with a 503
+GITHUB_RATE_LIMIT_MAX_WAIT = float(os.environ.get("GITHUB_RATE_LIMIT_MAX_WAIT", "10"))
+# Seconds to back off after a secondary rate limit without a Retry-After, doubled on each further retry
+GITHUB_RATE_LIMIT_BACKOFF = float(os.environ.get("GITHUB_RATE_LIMIT_BACKOFF", "1"))
+# Maximum number of credentials whose budgets are tracked
+GITHUB_RATE_LIMIT_MAX_SCOPES = 1000
+
+# Requests made for an editor, which are sent first
+PRIORITY_INTERACTIVE = 0
+# Requests refreshing shared content, e.g. for the public API
+PRIORITY_BACKGROUND = 1
+# Priority of the content store reads made for the current request or task, editor requests raise it to interactive
+content_priority: ContextVar[int] = ContextVar("content_priority", default=PRIORITY_BACKGROUND)
+
+
+def get_resource(url: str) -> str:
+    """
+    Get the GitHub rate limit resource a request counts against.
+    """
+    return "graphql" if httpx.URL(url).path.endswith("/graphql") else "core"
+
+
+class RateLimitBudget:
+    def __init__(self):
+        """
+        What is left of one credential's rate limit for one resource, as last reported by GitHub.
+        """
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.blocked_until = 0.0
+
+    def update(self, response: httpx.Response) -> None:
+        """
+        Update the budget from the X-RateLimit headers of a response.
+        """
+        try:
+            if "X-RateLimit-Limit" in response.headers:
+                self.limit = int(response.headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in response.headers:
+                self.remaining = int(response.headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset" in response.headers:
+                self.reset_at = float(response.headers["X-RateLimit-Reset"])
+        except ValueError:
+            pass
+
+    def is_exhausted(self) -> bool:
+        """
+        Check whether requests would be rejected until the limit resets or a backoff ends.
+        """
+        now = time.time()
+        if self.blocked_until > now:
+            return True
+        return self.remaining == 0 and self.reset_at is not None and self.reset_at > now
+
+    def is_low(self, reserve: float) -> bool:
+        """
+        Check whether the budget has fallen into the share kept for interactive requests.
+        """
+        if self.is_exhausted():
+            return True
+        if self.limit is None or self.remaining is None or (self.reset_at is not None and self.reset_at <= time.time()):
+            return False
+        return self.remaining <= self.limit * reserve
+
+    def wait_time(self) -> float:
+        """
+        Seconds until requests are accepted again, 0 if they are now.
+        """
+        now = time.time()
+        wait = max(0.0, self.blocked_until - now)
+        if self.remaining == 0 and self.reset_at is not None:
+            wait = max(wait, self.reset_at - now)
+        return wait
+
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    """
+    Check whether GitHub rejected a request because of its primary or secondary rate limits.
+    """
+    if response.status_code not in (403, 429):
+        return False
+    if response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers:
+        return True
+    return "rate limit" in response.text.lower()
+
+
+class RateLimitScheduler:
+    def __init__(
+        self,
+        slots: int,
+        reserve: float = GITHUB_RATE_LIMIT_RESERVE,
+        retries: int = GITHUB_RATE_LIMIT_RETRIES,
+        max_wait: float = GITHUB_RATE_LIMIT_MAX_WAIT,
+        backoff: float = GITHUB_RATE_LIMIT_BACKOFF
+    ):
+        """
+        Schedules GitHub requests by priority and keeps track of each credential's rate limit.
+
+        When all slots are busy, waiting interactive requests are sent before background ones.
+        Requests for a credential that is rate limited wait for the limit to lift, or fail with a
+        503 if that would take longer than max_wait. Secondary rate limits are retried with
+        jittered exponential backoff.
+
+        Args:
+            slots (int): Maximum number of requests in flight at once
+            reserve (float): Share of each budget kept for interactive requests
+            retries (int): Times a request is retried after a secondary rate limit
+            max_wait (float): Longest a request waits for a rate limit to lift, in seconds
+            backoff (float): Seconds to back off after a secondary rate limit without a Retry-After
+        """
+        self.slots = slots
+        self.reserve = reserve
+        self.retries = retries
+        self.max_wait = max_wait
+        self.backoff = backoff
+        self.budgets: "OrderedDict[Tuple[str, str], RateLimitBudget]" = OrderedDict()
+        self.active = 0
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.counter = itertools.count()
+        self.rate_limited = 0
+        self.served_from_cache = 0
+
+    def get_budget(self, scope: str, resource: str) -> RateLimitBudget:
+        """
+        Get the budget of a credential for a resource, tracking it from now on if it is new.
+        """
+        key = (scope, resource)
+        budget = self.budgets.get(key)
+        if budget is None:
+            budget = RateLimitBudget()
+            self.budgets[key] = budget
+            while len(self.budgets) > GITHUB_RATE_LIMIT_MAX_SCOPES:
+                self.budgets.popitem(last=False)
+        else:
+            self.budgets.move_to_end(key)
+        return budget
+
+    def should_use_cache(self, scope: str, url: str, priority: int) -> bool:
+        """
+        Check whether a request should be answered from cached data without asking GitHub.
+
+        That is when the credential is rate limited, or for background requests when its budget is low.
+        """
+        budget = self.get_budget(scope, get_resource(url))
+        return budget.is_exhausted() or (priority == PRIORITY_BACKGROUND and budget.is_low(self.reserve))
+
+    @asynccontextmanager
+    async def slot(self, priority: int) -> AsyncIterator[None]:
+        """
+        Hold one of the request slots, waiting behind requests of a higher priority.
+        """
+        if self.active < self.slots and not self.waiters:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiters, (priority, next(self.counter), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # The slot may have been handed over just before the request was cancelled
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        self.active -= 1
+        while self.waiters and self.active < self.slots:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+    async def wait_for_budget(self, budget: RateLimitBudget) -> None:
+        """
+        Wait until a budget accepts requests again.
+
+        Raises:
+            HTTPException: 503 if that would take longer than max_wait
+        """
+        wait = budget.wait_time()
+        if wait > self.max_wait:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="GitHub rate limit reached, try again later",
+                headers={"Retry-After": str(int(wait) + 1)}
+            )
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def back_off(self, budget: RateLimitBudget, response: httpx.Response, attempt: int) -> None:
+        """
+        Block a budget after a rate limited response, for as long as GitHub asked or with jittered exponential backoff.
+        """
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            wait = float(retry_after)
+        elif budget.remaining == 0 and budget.reset_at is not None:
+            wait = max(0.0, budget.reset_at - time.time())
+        else:
+            wait = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        budget.blocked_until = max(budget.blocked_until, time.time() + wait)
+
+    async def send(
+        self,
+        client: httpx.AsyncClient,
+        scope: str,
+        priority: int,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request once its credential has budget and a slot is free, retrying after secondary rate limits.
+
+        Args:
+            client (httpx.AsyncClient): The HTTP client to send with
+            scope (str): The credential's cache scope, from ResponseCache.scope_for_token
+            priority (int): PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND
+            method (str): The HTTP method
+            url (str): The URL
+            **kwargs: Passed on to client.request
+
+        Returns:
+            httpx.Response: The response, which is still rate limited if the retries ran out
+
+        Raises:
+            HTTPException: 503 if the credential is rate limited for longer than max_wait
+        """
+        budget = self.get_budget(scope, get_resource(url))
+        attempt = 0
+        while True:
+            await self.wait_for_budget(budget)
+            async with self.slot(priority):
+                response = await client.request(method, url, **kwargs)
+            budget.update(response)
+            if not is_rate_limited(response):
+                return response
+
+            self.rate_limited += 1
+            self.back_off(budget, response, attempt)
+            if attempt >= self.retries or budget.wait_time() > self.max_wait:
+                return response
+            attempt += 1
+
+    def stats(self) -> Dict:
+        """
+        Get the scheduler counters and the budget of each credential for monitoring.
+
+        Credentials are identified by the first characters of their cache scope, "app" being the app's client ID.
+        """
+        budgets = []
+        for (scope, resource), budget in self.budgets.items():
+            if budget.limit is None:
+                continue
+            budgets.append({
+                "scope": scope[:12],
+                "resource": resource,
+                "limit": budget.limit,
+                "remaining": budget.remaining,
+                "reset_at": datetime.fromtimestamp(budget.reset_at, timezone.utc).isoformat() if budget.reset_at else None,
+                "exhausted": budget.is_exhausted(),
+                "low": budget.is_low(self.reserve)
+            })
+        return {
+            "active": self.active,
+            "waiting": sum(1 for _, _, future in self.waiters if not future.done()),
+            "rate_limited": self.rate_limited,
+            "served_from_cache": self.served_from_cache,
+            "budgets": budgets
+        }
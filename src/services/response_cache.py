@@ -0,0 +1,133 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Upper bound on the bytes held by the GitHub response cache
+GITHUB_CACHE_MAX_BYTES = int(os.environ.get("GITHUB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class CacheEntry:
+    def __init__(self, etag: str, body: bytes, content_type: Optional[str] = None):
+        """
+        A cached GitHub response.
+
+        Args:
+            etag (str): The ETag GitHub returned with the response
+            body (bytes): The raw response body
+            content_type (str, optional): The response content type
+        """
+        self.etag = etag
+        self.body = body
+        self.content_type = content_type
+        self.parsed: Dict[str, Any] = {}
+        self.size = len(body)
+        self.key: Optional[Tuple[str, str, str]] = None
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = GITHUB_CACHE_MAX_BYTES):
+        """
+        LRU cache of GitHub responses keyed by (token scope, Accept header, URL), bounded by size in bytes.
+
+        Entries are revalidated with If-None-Match, so a hit costs a 304 round-trip that does not count
+        against the GitHub rate limit instead of a full download and parse.
+
+        Args:
+            max_bytes (int): Maximum total size of the cached bodies and parsed content
+        """
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Tuple[str, str, str], CacheEntry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def scope_for_token(authorization: Optional[str]) -> str:
+        """
+        Get the cache scope for an Authorization header, so tokens are never held as keys.
+        """
+        if not authorization:
+            return "app"
+        return hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[CacheEntry]:
+        """
+        Get an entry and mark it as recently used.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple[str, str, str], entry: CacheEntry) -> None:
+        """
+        Add or replace an entry, evicting the least recently used entries to stay within max_bytes.
+        """
+        self.discard(key)
+        if entry.size > self.max_bytes:
+            return
+        entry.key = key
+        self.entries[key] = entry
+        self.bytes += entry.size
+        self.evict()
+
+    def set_parsed(self, entry: CacheEntry, name: str, value: Any, size: int) -> None:
+        """
+        Store a parsed form of an entry's body (e.g. the decoded YAML) alongside it.
+
+        Args:
+            entry (CacheEntry): The entry the value was parsed from
+            name (str): Name of the parsed form, e.g. "yaml"
+            value: The parsed value
+            size (int): Estimated size of the parsed value in bytes
+        """
+        if self.entries.get(entry.key) is not entry or name in entry.parsed:
+            return
+        entry.parsed[name] = value
+        entry.size += size
+        self.bytes += size
+        self.evict()
+
+    def discard(self, key: Tuple[str, str, str]) -> None:
+        """
+        Remove an entry if it is cached.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def evict(self) -> None:
+        """
+        Evict least recently used entries until the cache is within max_bytes.
+        """
+        while self.bytes > self.max_bytes and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.bytes -= entry.size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Remove every entry. Counters are kept.
+        """
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the cache counters for monitoring.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes
+        }
+
+
+response_cache = ResponseCache()
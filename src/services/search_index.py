@@ -0,0 +1,148 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.services.data_config import index_fields
+
+# Field types whose values are searched, along with each collection's field_map label field
+SEARCHABLE_FIELD_TYPES = ("string", "text", "govspeak")
+# BM25 term frequency saturation and document length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lower case word tokens.
+    """
+    return TOKEN.findall(text.lower())
+
+
+def get_search_fields(collection: Dict) -> Tuple[str, ...]:
+    """
+    Get the paths of a collection's searchable fields, including those nested in repeatable fields.
+
+    Args:
+        collection (Dict): The collection configuration
+
+    Returns:
+        Tuple[str, ...]: Field paths, e.g. ("title", "body", "links/name")
+    """
+    label_paths = set()
+
+    def add_labels(fields: List[Dict], config: Dict, prefix: str = "") -> None:
+        label = (config.get("field_map") or {}).get("label")
+        if label:
+            label_paths.add(f"{prefix}{label}")
+        for field in fields or []:
+            if field.get("fields"):
+                add_labels(field.get("fields"), field, f"{prefix}{field.get('id')}/")
+
+    add_labels(collection.get("fields"), collection)
+    return tuple(
+        path for path, field in index_fields(collection.get("fields", [])).items()
+        if field.get("type") in SEARCHABLE_FIELD_TYPES or path in label_paths
+    )
+
+
+class SearchIndex:
+    def __init__(self):
+        """
+        Inverted index of the words in a collection's items, ranked with BM25.
+        """
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.documents: Dict[str, Counter] = {}
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+        # Terms whose postings this index may change, None for all of them. Copies share the rest
+        self.owned_terms: Optional[Set[str]] = None
+        self.shared = False
+
+    def own(self) -> None:
+        """
+        Copy the dicts shared with other copies of the index before changing them. Postings are copied as they change.
+        """
+        if self.shared:
+            self.postings = dict(self.postings)
+            self.documents = dict(self.documents)
+            self.lengths = dict(self.lengths)
+            self.owned_terms = set()
+            self.shared = False
+
+    def writable_postings(self, term: str) -> Dict[str, int]:
+        """
+        Get the postings of a term to change, copying them first if they are shared with another copy of the index.
+        """
+        self.own()
+        if self.owned_terms is not None and term not in self.owned_terms:
+            self.postings[term] = dict(self.postings.get(term, {}))
+            self.owned_terms.add(term)
+        return self.postings.setdefault(term, {})
+
+    def add(self, item_id: str, texts: Iterable[str]) -> None:
+        """
+        Add or replace an item's text.
+        """
+        self.remove(item_id)
+        terms = Counter(token for text in texts for token in tokenize(text))
+        if not terms:
+            return
+        self.own()
+        self.documents[item_id] = terms
+        self.lengths[item_id] = sum(terms.values())
+        self.total_length += self.lengths[item_id]
+        for term, count in terms.items():
+            self.writable_postings(term)[item_id] = count
+
+    def remove(self, item_id: str) -> None:
+        """
+        Remove an item if it is indexed.
+        """
+        if item_id not in self.documents:
+            return
+        self.own()
+        terms = self.documents.pop(item_id)
+        self.total_length -= self.lengths.pop(item_id)
+        for term in terms:
+            postings = self.writable_postings(term)
+            postings.pop(item_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def copy(self) -> "SearchIndex":
+        """
+        Copy the index so it can be changed without affecting requests searching the original.
+
+        The copies share their dicts until one of them changes, so copying does not depend on the size of the index.
+        """
+        index = SearchIndex()
+        index.postings = self.postings
+        index.documents = self.documents
+        index.lengths = self.lengths
+        index.total_length = self.total_length
+        index.shared = self.shared = True
+        return index
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """
+        Find the items containing any word of a query.
+
+        Returns:
+            List of (item ID, score) tuples, best match first
+        """
+        if not self.documents:
+            return []
+        count = len(self.documents)
+        average_length = self.total_length / count
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for item_id, frequency in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[item_id] / average_length)
+                scores[item_id] = scores.get(item_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda result: (-result[1], result[0]))
@@ -0,0 +1,367 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, TypeVar
+
+# SQLite file the worker processes on a host share fetched content through, empty to not share it
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", "")
+# Upper bound on the bytes of content held in the shared cache
+SHARED_CACHE_MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Writes by a worker between checks of the shared cache's size
+SHARED_CACHE_EVICT_EVERY = 200
+# Seconds between updates of when a blob was last used, so reads rarely write
+SHARED_CACHE_TOUCH_INTERVAL = 60.0
+# Seconds a worker waits for another to finish writing before giving up on the shared cache, as a miss costs
+# less than a wait
+SHARED_CACHE_TIMEOUT = 0.1
+# Seconds between checks for a head another worker moved to, e.g. after committing. A commit made by one worker
+# is only served by the others once they next check, 0 checks on every request
+SHARED_CACHE_HEAD_CHECK_INTERVAL = float(os.environ.get("SHARED_CACHE_HEAD_CHECK_INTERVAL", "0.5"))
+
+# Changed when the tables change, so databases written by an earlier version of the app are emptied
+SCHEMA_VERSION = 2
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, text TEXT, parsed TEXT, size INTEGER NOT NULL, used_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS blobs_used_at ON blobs (used_at)",
+    "CREATE TABLE IF NOT EXISTS paths (key TEXT PRIMARY KEY, ref TEXT NOT NULL, sha TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS heads (key TEXT PRIMARY KEY, ref TEXT NOT NULL, updated_at REAL NOT NULL)",
+]
+TABLES = ("blobs", "paths", "heads")
+# Keys of the JSON objects standing for the dates and timestamps YAML loads, which JSON has no types for
+DATE_KEY = "\x00date"
+DATETIME_KEY = "\x00datetime"
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def encode_value(value: Any) -> Any:
+    """
+    Encode a value json.dumps cannot, if it is a date or timestamp.
+    """
+    if isinstance(value, datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    if isinstance(value, date):
+        return {DATE_KEY: value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not shared")
+
+
+def decode_object(value: Dict) -> Any:
+    """
+    Decode a JSON object, turning those made by encode_value back into dates and timestamps.
+    """
+    if len(value) == 1 and DATETIME_KEY in value:
+        return datetime.fromisoformat(value[DATETIME_KEY])
+    if len(value) == 1 and DATE_KEY in value:
+        return date.fromisoformat(value[DATE_KEY])
+    return value
+
+
+class SharedCache:
+    def __init__(self, path: str = SHARED_CACHE_PATH, max_bytes: int = SHARED_CACHE_MAX_BYTES):
+        """
+        Content shared by the worker processes on a host, in an SQLite database in WAL mode.
+
+        It holds the text and parsed content of files keyed by blob SHA, the blob SHA of each path
+        at the commit it was last seen at, and the head commit each worker last moved a ref to.
+        Blobs are evicted least recently used first once they take more than max_bytes.
+
+        Parsed content is stored as JSON, so reading the database never runs code. The methods block
+        on SQLite, so async code calls them through run. The cache is only ever an optimisation: if
+        the database cannot be used, reads miss and writes are dropped.
+
+        Args:
+            path (str): Path to the database file, empty to disable the cache
+            max_bytes (int): Maximum total size of the blobs' text and parsed content
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+        self.pid: Optional[int] = None
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    async def run(self, function: Callable[..., T], *args: Any) -> T:
+        """
+        Call a function that uses the cache in a thread, so waiting on SQLite does not block the event loop.
+
+        The cache's methods return straight away when it is disabled, so they are then called directly.
+        """
+        if not self.enabled:
+            return function(*args)
+        return await asyncio.to_thread(function, *args)
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Get this process's connection, opening it on first use and again after a fork.
+        """
+        if self.db is None or self.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=SHARED_CACHE_TIMEOUT, isolation_level=None, check_same_thread=False)
+            try:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.execute("BEGIN IMMEDIATE")
+                if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    for table in TABLES:
+                        db.execute(f"DROP TABLE IF EXISTS {table}")
+                    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                for statement in SCHEMA:
+                    db.execute(statement)
+                db.execute("COMMIT")
+            except BaseException:
+                # Closing the connection also rolls back the migration if it was started
+                db.close()
+                raise
+            self.db = db
+            self.pid = os.getpid()
+        return self.db
+
+    def execute(self, sql: str, parameters: Iterable = ()) -> list:
+        with self.lock:
+            return self.connect().execute(sql, tuple(parameters)).fetchall()
+
+    def execute_many(self, sql: str, rows: list) -> None:
+        with self.lock:
+            db = self.connect()
+            db.execute("BEGIN")
+            try:
+                db.executemany(sql, rows)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def failed(self, error: sqlite3.Error) -> None:
+        self.errors += 1
+        logger.warning("Shared cache error: %s", error)
+
+    def get_texts(self, shas: Iterable[str]) -> Dict[str, str]:
+        """
+        Get the text of blobs.
+
+        Returns:
+            Dict[str, str]: Text keyed by blob SHA, leaving out blobs that are not cached
+        """
+        shas = list(shas)
+        if not self.enabled or not shas:
+            return {}
+        texts = {}
+        try:
+            # Looked up in batches within SQLite's limit on query parameters
+            for start in range(0, len(shas), 500):
+                batch = shas[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.execute(
+                    f"SELECT sha, text, used_at FROM blobs WHERE sha IN ({placeholders}) AND text IS NOT NULL", batch
+                )
+                texts.update({sha: text for sha, text, _ in rows})
+                self.touch(sha for sha, _, used_at in rows if used_at < time.time() - SHARED_CACHE_TOUCH_INTERVAL)
+        except sqlite3.Error as e:
+            self.failed(e)
+            return {}
+        self.hits += len(texts)
+        self.misses += len(shas) - len(texts)
+        return texts
+
+    def put_texts(self, texts: Dict[str, str]) -> None:
+        """
+        Add the text of blobs, keyed by blob SHA.
+        """
+        if not self.enabled or not texts:
+            return
+        now = time.time()
+        try:
+            self.execute_many(
+                "INSERT INTO blobs (sha, text, size, used_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (sha) DO UPDATE SET text = excluded.text, size = blobs.size + excluded.size, "
+                "used_at = excluded.used_at WHERE blobs.text IS NULL",
+                [(sha, text, len(text.encode("utf-8")), now) for sha, text in texts.items()]
+            )
+        except sqlite3.Error as e:
+            self.failed(e)
+            return
+        self.wrote(len(texts))
+
+    def get_parsed(self, sha: str) -> Tuple[bool, Any]:
+        """
+        Get the parsed content of a blob.
+
+        Returns:
+            Tuple containing whether the blob's parsed content is cached, and the content
+        """
+        if not self.enabled:
+            return False, None
+        try:
+            rows = self.execute("SELECT parsed, used_at FROM blobs WHERE sha = ? AND parsed IS NOT NULL", [sha])
+            if rows and rows[0][1] < time.time() - SHARED_CACHE_TOUCH_INTERVAL:
+                self.touch([sha])
+        except sqlite3.Error as e:
+            self.failed(e)
+            return False, None
+        try:
+            content = json.loads(rows[0][0], object_hook=decode_object) if rows else None
+        except ValueError:
+            rows = []
+        if not rows:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, content
+
+    def put_parsed(self, parsed: Dict[str, Any]) -> None:
+        """
+        Add the parsed content of blobs, keyed by blob SHA.
+
+        Content JSON cannot hold exactly, e.g. with keys that are not strings, is left out.
+        """
+        if not self.enabled or not parsed:
+            return
+        now = time.time()
+        rows = []
+        for sha, content in parsed.items():
+            try:
+                data = json.dumps(content, default=encode_value, ensure_ascii=False, separators=(",", ":"))
+                if json.loads(data, object_hook=decode_object) != content:
+                    continue
+            except (TypeError, ValueError):
+                continue
+            rows.append((sha, data, len(data.encode("utf-8")), now))
+        if not rows:
+            return
+        try:
+            self.execute_many(
+                "INSERT INTO blobs (sha, parsed, size, used_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (sha) DO UPDATE SET parsed = excluded.parsed, size = blobs.size + excluded.size, "
+                "used_at = excluded.used_at WHERE blobs.parsed IS NULL",
+                rows
+            )
+        except sqlite3.Error as e:
+            self.failed(e)
+            return
+        self.wrote(len(rows))
+
+    def get_path(self, key: str, ref: str) -> Optional[str]:
+        """
+        Get the blob SHA of a path at a commit, if that is the commit it was last seen at.
+
+        Args:
+            key (str): The repository and path, e.g. "owner/repo:data/collections/posts/a.yml"
+            ref (str): The commit SHA
+        """
+        if not self.enabled:
+            return None
+        try:
+            rows = self.execute("SELECT sha FROM paths WHERE key = ? AND ref = ?", [key, ref])
+        except sqlite3.Error as e:
+            self.failed(e)
+            return None
+        return rows[0][0] if rows else None
+
+    def set_paths(self, ref: str, shas: Dict[str, str]) -> None:
+        """
+        Record the blob SHAs of paths at a commit, keyed by repository and path as for get_path.
+        """
+        if not self.enabled or not shas:
+            return
+        try:
+            self.execute_many(
+                "INSERT OR REPLACE INTO paths (key, ref, sha) VALUES (?, ?, ?)",
+                [(key, ref, sha) for key, sha in shas.items()]
+            )
+        except sqlite3.Error as e:
+            self.failed(e)
+
+    def get_head(self, key: str) -> Optional[Tuple[str, float]]:
+        """
+        Get the commit a worker last moved a ref to, e.g. after committing to it.
+
+        Args:
+            key (str): The repository and ref, e.g. "owner/repo@main"
+
+        Returns:
+            Tuple containing the commit SHA and the time it was recorded, or None if none was
+        """
+        if not self.enabled:
+            return None
+        try:
+            rows = self.execute("SELECT ref, updated_at FROM heads WHERE key = ?", [key])
+        except sqlite3.Error as e:
+            self.failed(e)
+            return None
+        return (rows[0][0], rows[0][1]) if rows else None
+
+    def set_head(self, key: str, ref: str) -> None:
+        """
+        Record the commit a ref moved to, for the other workers to move to as well.
+        """
+        if not self.enabled:
+            return
+        try:
+            self.execute("INSERT OR REPLACE INTO heads (key, ref, updated_at) VALUES (?, ?, ?)", [key, ref, time.time()])
+        except sqlite3.Error as e:
+            self.failed(e)
+
+    def touch(self, shas: Iterable[str]) -> None:
+        """
+        Mark blobs as used now, so they are evicted later.
+        """
+        rows = [(time.time(), sha) for sha in shas]
+        if rows:
+            self.execute_many("UPDATE blobs SET used_at = ? WHERE sha = ?", rows)
+
+    def wrote(self, count: int) -> None:
+        """
+        Count writes, checking the size of the cache every SHARED_CACHE_EVICT_EVERY of them.
+        """
+        self.writes += count
+        if self.writes >= SHARED_CACHE_EVICT_EVERY:
+            self.writes = 0
+            try:
+                self.evict()
+            except sqlite3.Error as e:
+                self.failed(e)
+
+    def evict(self) -> None:
+        """
+        Evict least recently used blobs until the cache is within max_bytes.
+        """
+        total = self.execute("SELECT COALESCE(SUM(size), 0) FROM blobs")[0][0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        evicted = []
+        for sha, size in self.execute("SELECT sha, size FROM blobs ORDER BY used_at"):
+            if excess <= 0:
+                break
+            evicted.append((sha,))
+            excess -= size
+        self.execute_many("DELETE FROM blobs WHERE sha = ?", evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the shared cache counters and size for monitoring.
+        """
+        stats = {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+        if self.enabled:
+            try:
+                entries, size = self.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs")[0]
+                stats.update({"entries": entries, "bytes": size, "max_bytes": self.max_bytes})
+            except sqlite3.Error as e:
+                self.failed(e)
+        return stats
+
+
+shared_cache = SharedCache()
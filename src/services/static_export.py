@@ -0,0 +1,220 @@
+import functools
+import gzip
+import json
+import os
+import posixpath
+import tarfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.services.collection_query import get_page
+from src.services.content_api import dumps, get_collection_snapshot, get_collection_summary, get_data_config, make_etag
+from src.services.content_store import CollectionSnapshot, ItemEntry
+from src.services.data_config import CONFIG_PATH
+
+# Changed when the exported documents change shape, so the next export rebuilds every file
+EXPORT_FORMAT_VERSION = 1
+# Items on each exported page of a collection
+EXPORT_PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "100"))
+# File in the export directory recording what each exported file was built from
+EXPORT_STATE_NAME = ".export-state.json"
+# Directory of the exported collections, so the export can be served with the same paths as the API
+EXPORT_PREFIX = "api/v1/collections"
+
+
+def extract_tarball(path: str, directory: str) -> str:
+    """
+    Extract a tarball of the data repository, e.g. one downloaded from GitHub.
+
+    Only regular files are extracted, and none outside the directory.
+
+    Args:
+        path (str): Path to the tarball, optionally gzipped
+        directory (str): Directory to extract it into
+
+    Returns:
+        str: The root of the repository, the tarball's single top level directory if it has one
+    """
+    with tarfile.open(path, mode="r:*") as archive:
+        for member in archive:
+            name = posixpath.normpath(member.name)
+            if not member.isfile() or name.startswith(("/", "..")):
+                continue
+            target = os.path.join(directory, *name.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.extractfile(member) as source, open(target, "wb") as file:
+                file.write(source.read())
+
+    names = os.listdir(directory)
+    if len(names) == 1 and not os.path.exists(os.path.join(directory, CONFIG_PATH)):
+        return os.path.join(directory, names[0])
+    return directory
+
+
+def collection_document(collection: Dict, snapshot: CollectionSnapshot) -> Dict:
+    document = {"collection": {**collection, "items": snapshot.items}}
+    if snapshot.errors:
+        document["errors"] = snapshot.errors
+    return document
+
+
+def summary_document(collection: Dict, summaries: List[Dict]) -> Dict:
+    return {"collection": {**collection, "items": summaries}}
+
+
+def item_document(collection: Dict, entry: ItemEntry) -> Dict:
+    return {"data": entry.content.get("data", {}), "metadata": {"collection": collection}}
+
+
+def page_document(
+    collection: Dict,
+    snapshot: CollectionSnapshot,
+    entries: List[ItemEntry],
+    next_cursor: Optional[str],
+    next_page: Optional[str]
+) -> Dict:
+    document = {
+        "collection": {**collection, "items": [entry.content for entry in entries]},
+        "next_cursor": next_cursor,
+        "next_page": next_page
+    }
+    if snapshot.errors:
+        document["errors"] = snapshot.errors
+    return document
+
+
+async def plan_collection(
+    collection_id: str,
+    page_size: int = EXPORT_PAGE_SIZE
+) -> Dict[str, Tuple[str, Callable[[], Any]]]:
+    """
+    Plan the files exported for a collection, each with a key of the sources it is built from.
+
+    The documents are those the API returns for the collection, its _index, each item and each
+    page of page_size items. Pages also link to the next page's file with "next_page".
+
+    Args:
+        collection_id (str): The ID of the collection
+        page_size (int): Items on each page
+
+    Returns:
+        Dict[str, Tuple[str, Callable]]: The source key and a function building the document, keyed by file path
+    """
+    data_config = await get_data_config()
+    collection = data_config.get_collection(collection_id)
+    snapshot = await get_collection_snapshot(collection_id)
+    summaries, summary_version = await get_collection_summary(collection_id)
+    base = f"{EXPORT_PREFIX}/{collection_id}"
+
+    def key(*versions: Any) -> str:
+        return make_etag(EXPORT_FORMAT_VERSION, data_config.sha, *versions).strip('"')
+
+    files = {
+        f"{base}.json": (key(snapshot.version), functools.partial(collection_document, collection, snapshot)),
+        f"{base}/_index.json": (key(summary_version), functools.partial(summary_document, collection, summaries)),
+    }
+    for item_id, entry in snapshot.entries.items():
+        files[f"{base}/{item_id}.json"] = (key(entry.sha), functools.partial(item_document, collection, entry))
+
+    errors = dumps(snapshot.errors)
+    cursor = None
+    number = 1
+    while True:
+        entries, next_cursor = get_page(snapshot, [], cursor, page_size)
+        next_page = f"/{base}/pages/{number + 1}.json" if next_cursor else None
+        files[f"{base}/pages/{number}.json"] = (
+            key(page_size, *(f"{entry.name}:{entry.sha}" for entry in entries), next_cursor, errors),
+            functools.partial(page_document, collection, snapshot, entries, next_cursor, next_page)
+        )
+        if next_cursor is None:
+            return files
+        cursor = next_cursor
+        number += 1
+
+
+def write_file(directory: str, path: str, data: bytes) -> None:
+    """
+    Write a file and a gzipped copy of it next to it, replacing any earlier versions whole.
+    """
+    target = os.path.join(directory, *path.split("/"))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    for file_path, file_data in ((target, data), (f"{target}.gz", gzip.compress(data, 9, mtime=0))):
+        with open(f"{file_path}.tmp", "wb") as file:
+            file.write(file_data)
+        os.replace(f"{file_path}.tmp", file_path)
+
+
+def remove_file(directory: str, path: str) -> None:
+    target = os.path.join(directory, *path.split("/"))
+    for file_path in (target, f"{target}.gz"):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+async def export_api(
+    directory: str,
+    collection_ids: List[str],
+    page_size: int = EXPORT_PAGE_SIZE,
+    prune: bool = True
+) -> Tuple[int, int, int]:
+    """
+    Export the API documents of collections as static JSON files, with gzipped copies.
+
+    Files are only rebuilt when the sources they are built from changed since the last export,
+    which is recorded in EXPORT_STATE_NAME in the directory.
+
+    Args:
+        directory (str): The export directory
+        collection_ids (List[str]): The collections to export
+        page_size (int): Items on each page
+        prune (bool): Remove files of collections that are no longer exported, rather than only
+                      those of the exported collections that no longer exist
+
+    Returns:
+        Tuple containing:
+        - The number of files written
+        - The number of files that were up to date
+        - The number of files removed
+    """
+    state_path = os.path.join(directory, EXPORT_STATE_NAME)
+    try:
+        with open(state_path, encoding="utf-8") as file:
+            state = json.load(file)
+        if state.get("version") != EXPORT_FORMAT_VERSION:
+            state = {}
+    except (FileNotFoundError, ValueError):
+        state = {}
+    previous: Dict[str, str] = state.get("files") or {}
+
+    planned: Dict[str, Tuple[str, Callable[[], Any]]] = {}
+    for collection_id in collection_ids:
+        planned.update(await plan_collection(collection_id, page_size))
+
+    written = unchanged = removed = 0
+    files = {}
+    for path, (key, build) in planned.items():
+        if previous.get(path) == key and os.path.exists(os.path.join(directory, *path.split("/"))):
+            unchanged += 1
+        else:
+            write_file(directory, path, dumps(build()).encode("utf-8"))
+            written += 1
+        files[path] = key
+
+    scopes = tuple(
+        scope
+        for collection_id in collection_ids
+        for scope in (f"{EXPORT_PREFIX}/{collection_id}.json", f"{EXPORT_PREFIX}/{collection_id}/")
+    )
+    for path, key in previous.items():
+        if path in files:
+            continue
+        if prune or path.startswith(scopes):
+            remove_file(directory, path)
+            removed += 1
+        else:
+            files[path] = key
+
+    os.makedirs(directory, exist_ok=True)
+    with open(f"{state_path}.tmp", "w", encoding="utf-8") as file:
+        json.dump({"version": EXPORT_FORMAT_VERSION, "files": files}, file, indent=0, sort_keys=True)
+    os.replace(f"{state_path}.tmp", state_path)
+    return written, unchanged, removed
@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# Seconds a verified access token is trusted before it is checked with GitHub again
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "60"))
+# Maximum number of verified access tokens to remember
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", "1000"))
+
+
+class UserCache:
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        """
+        Short lived cache of what GitHub reports for each access token, such as the user it belongs to.
+
+        Tokens are only held as SHA-256 hashes. Concurrent lookups of the same token share one GitHub call.
+
+        Args:
+            ttl (float): Seconds to trust a verified token
+            max_entries (int): Maximum number of tokens to remember, least recently used are dropped first
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self.pending: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def key_for_token(access_token: str) -> str:
+        return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+    def lookup(self, access_token: str) -> Optional[Dict]:
+        """
+        Get the cached details of a token, if they were fetched within the TTL.
+        """
+        key = self.key_for_token(access_token)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return user
+
+    async def get(self, access_token: str, fetch: Callable[[], Awaitable[Dict]]) -> Dict:
+        """
+        Get the details of a token, calling fetch to get them from GitHub if they are not cached.
+
+        Args:
+            access_token (str): The GitHub access token
+            fetch: Coroutine function that gets the details from GitHub, raising if the token is not valid
+
+        Returns:
+            Dict: The details, e.g. the GitHub user
+        """
+        user = self.lookup(access_token)
+        if user is not None:
+            return user
+
+        key = self.key_for_token(access_token)
+        if key in self.pending:
+            return await asyncio.shield(self.pending[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            user = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when no other request was waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(user)
+            self.entries[key] = (time.monotonic() + self.ttl, user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return user
+        finally:
+            del self.pending[key]
+
+    def forget(self, access_token: str) -> None:
+        """
+        Drop a token, e.g. because GitHub rejected it, so it is verified again on next use.
+        """
+        self.entries.pop(self.key_for_token(access_token), None)
+
+
+user_cache = UserCache()
+# Whether each access token can read DATA_REPO, checked with GitHub again as often as its user is
+repo_access_cache = UserCache()
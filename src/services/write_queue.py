@@ -0,0 +1,366 @@
+import asyncio
+import copy
+import os
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from fastapi import HTTPException, status
+
+from src.services.content_store import (
+    content_store, git_blob_sha, item_id_for_file, parse_item_path, COLLECTIONS_PATH, DATA_REF, DATA_REPO
+)
+from src.services.github_service import GithubService
+from src.services.manifest import dump_manifest, manifest_entry, manifest_path, update_manifest
+from src.services.yaml_loader import dump_yaml
+
+# Seconds to wait for more edits to a file before committing it. Edits that arrive while the file is being
+# committed are always gathered into the next commit, so this is only needed to also gather edits made just apart
+WRITE_COALESCE_WINDOW = float(os.environ.get("WRITE_COALESCE_WINDOW", "0"))
+# Times a write is re-read, re-applied and retried when the item or branch changed since it was read
+WRITE_ATTEMPTS = int(os.environ.get("WRITE_ATTEMPTS", "6"))
+# Seconds to wait before the first retry, doubled on each further retry
+WRITE_RETRY_BACKOFF = float(os.environ.get("WRITE_RETRY_BACKOFF", "0.1"))
+
+# Changes an item's content in place, e.g. setting some fields. Must be safe to apply again to a newer version
+Edit = Callable[[Any], None]
+
+# Default branch of each repository, which is looked up once rather than on every write
+default_branches: Dict[str, str] = {}
+# Locks making this worker's Git Data API commits to a branch one at a time, so they do not fail each other's
+# fast-forward check. Commits from elsewhere are still retried
+branch_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+
+async def get_write_branch(github_service: GithubService, repo: str = DATA_REPO) -> str:
+    """
+    Get the branch of the data repository that edits are committed to.
+    """
+    if DATA_REF != "HEAD":
+        return DATA_REF
+    if repo not in default_branches:
+        default_branches[repo] = (await github_service.get_repository_details(repo)).json().get("default_branch")
+    return default_branches[repo]
+
+
+def retry_delay(backoff: float, attempt: int) -> float:
+    """
+    Get the seconds to wait before retrying a write, doubling with each attempt and jittered so retries spread out.
+    """
+    return backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+async def commit_items(
+    github_service: GithubService,
+    repo: str,
+    collection_id: str,
+    edit_items: Callable[[str], Awaitable[Dict[str, Any]]],
+    commit_message: str,
+    attempts: int = WRITE_ATTEMPTS,
+    backoff: float = WRITE_RETRY_BACKOFF
+) -> Tuple[Optional[Dict], Dict[str, Any]]:
+    """
+    Commit changes to a collection's items, and to its manifest if it has one, in a single commit.
+
+    This worker's commits to the branch are made one at a time. If the branch moves on while the commit
+    is made, e.g. by another worker, the changes are made again from the new head.
+
+    Args:
+        github_service (GithubService): GitHub service with the editor's access token
+        repo (str): Repository name in the format "owner/repo"
+        collection_id (str): The ID of the collection
+        edit_items: Coroutine function taking the head commit SHA and returning the new content of the
+                    changed items keyed by path, read and changed at that commit
+        commit_message (str): The commit message
+        attempts (int): Maximum number of times to try
+        backoff (float): Seconds to wait before the first retry
+
+    Returns:
+        Tuple containing:
+        - The commit, or None if no item changed
+        - The committed content keyed by path, including the manifest
+
+    Raises:
+        HTTPException: 409 if the branch kept moving
+        httpx.HTTPStatusError: If a GitHub request fails
+    """
+    collection = (await content_store.get_config()).get_collection(collection_id) or {}
+    index_path = manifest_path(COLLECTIONS_PATH, collection_id)
+    committed: Dict[str, Any] = {}
+
+    async def build(head: str) -> Dict[str, str]:
+        committed.clear()
+        committed.update({path.strip("/"): content for path, content in (await edit_items(head)).items()})
+        files = {path: dump_yaml(content) for path, content in committed.items()}
+        if not files:
+            return files
+
+        try:
+            manifest = await github_service.get_repo_content_for_path(repo, index_path, format="yaml", ref=head)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise
+            # Collections without a manifest are listed from their items
+            return files
+
+        entries = {}
+        for path, text in files.items():
+            item_id = item_id_for_file(parse_item_path(path)[1])
+            entries[item_id] = manifest_entry(collection, item_id, committed[path], git_blob_sha(text.encode("utf-8")))
+        committed[index_path] = update_manifest(manifest, entries)
+        files[index_path] = dump_manifest(committed[index_path])
+        return files
+
+    branch = await get_write_branch(github_service, repo)
+    async with branch_locks.setdefault((repo, branch), asyncio.Lock()):
+        commit, files = await github_service.commit_files(repo, branch, build, commit_message, attempts, backoff)
+        if commit is not None:
+            await content_store.record_commit(commit, {
+                path: (committed[path], git_blob_sha(text.encode("utf-8"))) for path, text in files.items()
+            }, files)
+    return commit, committed
+
+
+class PendingWrite:
+    def __init__(self, github_service: GithubService, repo: str, path: str):
+        """
+        Edits to one file waiting to be committed together.
+
+        Args:
+            github_service (GithubService): GitHub service with the editor's access token
+            repo (str): Repository name in the format "owner/repo"
+            path (str): Path of the file within the repository
+        """
+        self.github_service = github_service
+        self.repo = repo
+        self.path = path
+        self.edits: List[Tuple[Edit, str, asyncio.Future]] = []
+        self.applied: List[asyncio.Future] = []
+
+    @property
+    def commit_message(self) -> str:
+        """
+        The commit message of the edits, the first one's followed by the others'.
+        """
+        messages = list(dict.fromkeys(commit_message for _, commit_message, _ in self.edits))
+        if len(messages) > 1:
+            messages = [messages[0], "\n".join(messages[1:])]
+        return "\n\n".join(messages)
+
+    def apply(self, content: Any, reject: bool = True) -> Optional[Any]:
+        """
+        Apply the edits to a copy of a version of the file's content. Edits that fail are rejected on their own.
+
+        Args:
+            content: The version of the file's content
+            reject (bool): Whether to reject edits that fail, otherwise the first failure is raised, e.g. to try
+                           the edits again on a version that may be newer
+
+        Returns:
+            The edited content, or None if no edit applied
+        """
+        self.applied = []
+        for edit, _, future in self.edits:
+            if future.done():
+                continue
+            try:
+                edited = copy.deepcopy(content)
+                edit(edited)
+            except Exception as e:
+                if not reject:
+                    raise
+                future.set_exception(e)
+                continue
+            content = edited
+            self.applied.append(future)
+        return content if self.applied else None
+
+    def committed(self, content: Any) -> None:
+        """
+        Resolve the edits that were applied with the content that was committed.
+        """
+        for future in self.applied:
+            if not future.done():
+                future.set_result(content)
+
+
+class WriteQueue:
+    def __init__(
+        self,
+        window: float = WRITE_COALESCE_WINDOW,
+        attempts: int = WRITE_ATTEMPTS,
+        backoff: float = WRITE_RETRY_BACKOFF
+    ):
+        """
+        Per-file queue of edits to collection items in a repository.
+
+        An edit to an item is committed straight away. Edits made to the same item by the same editor
+        while it is being committed, or within window seconds, are applied together in the next
+        read-modify-write and commit. If the item changed since it was read, it is read again and the
+        edits re-applied, with exponential backoff.
+
+        Args:
+            window (float): Seconds to wait for more edits before committing, 0 to commit straight away
+            attempts (int): Maximum number of times to try a write
+            backoff (float): Seconds to wait before the first retry
+        """
+        self.window = window
+        self.attempts = attempts
+        self.backoff = backoff
+        self.pending: Dict[Tuple[str, str, str], PendingWrite] = {}
+        self.locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, github_service: GithubService, repo: str, path: str, edit: Edit, commit_message: str) -> Any:
+        """
+        Queue an edit to a file and wait until it is committed.
+
+        Args:
+            github_service (GithubService): GitHub service with the editor's access token
+            repo (str): Repository name in the format "owner/repo"
+            path (str): Path of the item file within the repository
+            edit (Edit): Function that changes the file's parsed content in place
+            commit_message (str): The commit message
+
+        Returns:
+            The content that was committed
+
+        Raises:
+            HTTPException: 409 if the branch kept moving, or whatever the edit raised
+            httpx.HTTPStatusError: If a GitHub request fails
+        """
+        # Edits are only gathered per editor, so every commit is made with the token of the person who made it
+        key = (repo, path.strip("/"), github_service.cache_scope)
+        future = asyncio.get_running_loop().create_future()
+
+        write = self.pending.get(key)
+        if write is None:
+            write = PendingWrite(github_service, repo, path)
+            self.pending[key] = write
+            task = asyncio.create_task(self.flush(key, write))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        write.edits.append((edit, commit_message, future))
+
+        return await future
+
+    async def flush(self, key: Tuple[str, str, str], write: PendingWrite) -> None:
+        """
+        Commit a file's pending edits once the window has passed and any earlier commit of the file is done.
+        """
+        if self.window > 0:
+            await asyncio.sleep(self.window)
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Edits that arrive from now on wait for the next write
+            if self.pending.get(key) is write:
+                del self.pending[key]
+            try:
+                await self.commit(write)
+            except Exception as e:
+                for _, _, future in write.edits:
+                    if not future.done():
+                        future.set_exception(e)
+        if not lock.locked() and key not in self.pending:
+            self.locks.pop(key, None)
+
+    async def commit(self, write: PendingWrite) -> None:
+        """
+        Read a file, apply its pending edits and commit it.
+
+        Items of collections without a manifest are written on their own with the Contents API, whose check
+        of the file's blob SHA only fails when the same item changed. Otherwise the item is committed with
+        the collection's manifest. Either way, the edits are re-applied to the latest version if it changes
+        while they are committed.
+        """
+        collection_id, _ = parse_item_path(write.path)
+        if await content_store.get_manifest(collection_id) is None:
+            content = await self.put_item(write)
+        else:
+            content = await self.commit_item(write)
+        write.committed(content)
+
+    async def put_item(self, write: PendingWrite) -> Any:
+        """
+        Write an item with the Contents API, first applying the edits to the version in the content store
+        and, if that is out of date, to the latest version on the branch.
+
+        The content store's version is only committed if its blob SHA is still the branch's, which the
+        Contents API checks. An edit that fails on it is applied to the branch's version before it is
+        rejected, as the content store's version may be missing what the edit needs, e.g. a repeatable
+        entry added by another worker.
+
+        Returns:
+            The content that was committed, or None if no edit applied
+
+        Raises:
+            HTTPException: 409 if the item kept changing
+        """
+        github_service = write.github_service
+        path = write.path.strip("/")
+        collection_id, name = parse_item_path(path)
+        branch = await get_write_branch(github_service, write.repo)
+        entry = await content_store.get_item(collection_id, item_id_for_file(name))
+
+        async def read_branch() -> Tuple[Any, str]:
+            file = await github_service.get_repo_content_for_path(write.repo, path, format="yaml", get_sha=True, ref=branch)
+            return file["content"], file["sha"]
+
+        for attempt in range(max(1, self.attempts)):
+            if attempt:
+                await asyncio.sleep(retry_delay(self.backoff, attempt))
+            if attempt or entry is None:
+                content, sha = await read_branch()
+                content = write.apply(content)
+            else:
+                try:
+                    content, sha = write.apply(entry.content, reject=False), entry.sha
+                except Exception:
+                    content, sha = await read_branch()
+                    content = write.apply(content)
+            if content is None:
+                return None
+            text = dump_yaml(content)
+            try:
+                response = await github_service.update_repo_content(
+                    write.repo, path, text, format="text", commit_message=write.commit_message, sha=sha, branch=branch
+                )
+            except httpx.HTTPStatusError as e:
+                # The item changed since the version the edits were applied to
+                if e.response.status_code == 409:
+                    continue
+                raise
+
+            await content_store.record_commit(response.get("commit") or {}, {
+                path: (content, (response.get("content") or {}).get("sha") or git_blob_sha(text.encode("utf-8")))
+            }, {path: text})
+            return content
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The content changed while it was being saved, try again"
+        )
+
+    async def commit_item(self, write: PendingWrite) -> Any:
+        """
+        Commit an item with its collection's manifest using the Git Data API.
+
+        Returns:
+            The content that was committed, or None if no edit applied
+        """
+        github_service = write.github_service
+        collection_id, _ = parse_item_path(write.path)
+
+        async def edit_item(head: str) -> Dict[str, Any]:
+            content = await github_service.get_repo_content_for_path(write.repo, write.path, format="yaml", ref=head)
+            content = write.apply(content)
+            return {write.path: content} if content is not None else {}
+
+        _, committed = await commit_items(
+            github_service, write.repo, collection_id, edit_item, write.commit_message, self.attempts, self.backoff
+        )
+        return committed.get(write.path.strip("/"))
+
+
+write_queue = WriteQueue()
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+import yaml
+
+from src.services.metrics import timing, yaml_parse_cache_requests
+from src.services.shared_cache import shared_cache
+
+# Maximum number of parsed documents to remember by blob SHA
+YAML_PARSE_CACHE_MAX_ENTRIES = int(os.environ.get("YAML_PARSE_CACHE_MAX_ENTRIES", "5000"))
+
+# The LibYAML loader and dumper, falling back to the pure Python ones when PyYAML was built without it
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+CDumper = getattr(yaml, "CDumper", None)
+
+# Strings the LibYAML emitter writes exactly as the Python one does: single lines of printable characters
+# without quotes or backslashes. The emitters differ in how they fold and escape multi-line strings, which
+# they write double quoted, and in how they escape characters outside the Basic Multilingual Plane, so
+# documents with other strings are dumped by the Python emitter.
+PLAIN_ASCII = re.compile(r"[\x20\x21\x23-\x26\x28-\x5b\x5d-\x7e]*\Z")
+PLAIN_UNICODE = re.compile(
+    r"[\x20\x21\x23-\x26\x28-\x5b\x5d-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd]*\Z"
+)
+# Longest mapping key in bytes both emitters write as a simple key, rather than an explicit "? " key
+SIMPLE_KEY_MAX_BYTES = 64
+
+parse_cache: "OrderedDict[str, Any]" = OrderedDict()
+parse_cache_lock = threading.Lock()
+
+
+def load_yaml(text: str, sha: Optional[str] = None) -> Any:
+    """
+    Parse YAML text, timing it as part of the current request.
+
+    Documents parsed with a blob SHA are remembered, so the same blob is parsed once and
+    the result shared. Shared results must not be changed; copy them before editing. They are
+    also kept in the shared cache, for the other worker processes on the host.
+
+    Args:
+        text (str): The YAML text
+        sha (str, optional): The git blob SHA of the text
+
+    Returns:
+        The parsed document
+    """
+    if sha is None:
+        with timing("yaml"):
+            return yaml.load(text, Loader=SafeLoader)
+
+    found, content = get_cached_yaml(sha)
+    if found:
+        return content
+
+    found, content = shared_cache.get_parsed(sha)
+    if found:
+        yaml_parse_cache_requests.inc(outcome="shared")
+    else:
+        yaml_parse_cache_requests.inc(outcome="miss")
+        with timing("yaml"):
+            content = yaml.load(text, Loader=SafeLoader)
+        shared_cache.put_parsed({sha: content})
+
+    with parse_cache_lock:
+        parse_cache[sha] = content
+        while len(parse_cache) > YAML_PARSE_CACHE_MAX_ENTRIES:
+            parse_cache.popitem(last=False)
+    return content
+
+
+async def load_yaml_async(text: str, sha: Optional[str] = None) -> Any:
+    """
+    Parse YAML text as load_yaml does, in a thread if it may be read from the shared cache.
+    """
+    if sha is None or not shared_cache.enabled:
+        return load_yaml(text, sha)
+    found, content = get_cached_yaml(sha)
+    if found:
+        return content
+    return await asyncio.to_thread(load_yaml, text, sha)
+
+
+def get_cached_yaml(sha: str) -> Tuple[bool, Any]:
+    """
+    Get a document this process already parsed, by blob SHA.
+
+    Returns:
+        Tuple containing whether the document was found, and the document
+    """
+    with parse_cache_lock:
+        if sha not in parse_cache:
+            return False, None
+        parse_cache.move_to_end(sha)
+        yaml_parse_cache_requests.inc(outcome="hit")
+        return True, parse_cache[sha]
+
+
+def emits_identically(value: Any, plain: re.Pattern) -> bool:
+    """
+    Check whether every string in a document, keys included, is written the same by both emitters.
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            if not plain.match(value):
+                return False
+        elif isinstance(value, dict):
+            for key in value:
+                if isinstance(key, str) and (not key or len(key.encode("utf-8")) > SIMPLE_KEY_MAX_BYTES):
+                    return False
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return True
+
+
+def dump_yaml(content: Any, **kwargs) -> str:
+    """
+    Write a document as YAML, as yaml.dump does, using LibYAML when its output would be the same.
+
+    Args:
+        content: The document
+        **kwargs: Passed on to yaml.dump, e.g. sort_keys or allow_unicode
+
+    Returns:
+        str: The YAML text
+    """
+    plain = PLAIN_UNICODE if kwargs.get("allow_unicode") else PLAIN_ASCII
+    with timing("yaml"):
+        if CDumper is not None and emits_identically(content, plain):
+            return yaml.dump(content, Dumper=CDumper, **kwargs)
+        return yaml.dump(content, **kwargs)
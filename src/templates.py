@@ -1,12 +1,88 @@
 from dotenv import load_dotenv
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
+from jinja2 import FileSystemBytecodeCache, is_undefined, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from collections import OrderedDict
+from typing import Any, Callable, List
+import hashlib
 import os
-import markdown
+from src.services.markdown_renderer import markdown_renderer
+from src.services.metrics import timing
 
 load_dotenv()
 APP_HOST = os.environ["APP_HOST"]
-views = Jinja2Templates(directory="src/views")
+# Directory compiled templates are kept in between runs, defaults to one in the system temporary directory
+TEMPLATE_CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR") or None
+# Maximum number of rendered template fragments to remember
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get("FRAGMENT_CACHE_MAX_ENTRIES", "500"))
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja extension adding a cache tag, which renders its body once per key.
+
+    The key is made of expressions that change whenever the body would, such as a config or item SHA:
+
+        {% cache "item-form", collection.id, config_version, item_sha %} ... {% endcache %}
+
+    If any part of the key is missing or None, the body is rendered every time.
+    """
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=OrderedDict(), fragment_cache_max_entries=FRAGMENT_CACHE_MAX_ENTRIES)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render_cached", [nodes.List(key_parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key_parts: List[Any], caller: Callable[[], str]) -> str:
+        if any(part is None or is_undefined(part) for part in key_parts):
+            return caller()
+
+        cache = self.environment.fragment_cache
+        key = hashlib.sha256(repr(key_parts).encode("utf-8")).hexdigest()
+        fragment = cache.get(key)
+        if fragment is not None:
+            cache.move_to_end(key)
+            return fragment
+
+        fragment = Markup(caller())
+        cache[key] = fragment
+        while len(cache) > self.environment.fragment_cache_max_entries:
+            cache.popitem(last=False)
+        return fragment
+
+
+class TimedTemplates(Jinja2Templates):
+    """Jinja2Templates that times rendering as part of the current request."""
+    def TemplateResponse(self, *args, **kwargs):
+        with timing("render"):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+views = TimedTemplates(directory="src/views")
+views.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+views.env.add_extension(FragmentCacheExtension)
+
+def precompile_views() -> int:
+    """Compile every view up front, from the bytecode cache if it was compiled before, so no request waits for it.
+
+    Returns:
+        The number of views compiled
+    """
+    names = views.env.list_templates(extensions=["html"])
+    for name in names:
+        views.env.get_template(name)
+    return len(names)
 
 def secure_url_for(request: Request, name: str, **path_params: str) -> str:
     """Generate a secure URL for a given route name.
@@ -43,14 +119,14 @@ def get_session_data(request: Request) -> dict:
 views.env.globals["get_session_data"] = get_session_data
 
 def markdown_to_html(text: str) -> str:
-    """Convert Markdown to HTML.
+    """Convert Markdown to HTML, reusing the HTML of text that was rendered before.
 
     Args:
-        text: The Markdown text to convert
+        text: The Markdown text to convert, which may be missing
 
     Returns:
         The HTML string
     """
-    return markdown.markdown(text)
+    return markdown_renderer.render(text)
 
 views.env.filters["markdown_to_html"] = markdown_to_html
@@ -0,0 +1,76 @@
+"""
+The app is tested against the local GitHub stand-in from the benchmarks, so the tests need no network access.
+"""
+import os
+
+# The app reads its settings when it is imported, so they are set first
+os.environ.setdefault("APP_HOST", "http://localhost:8000")
+os.environ.setdefault("APP_KEY", "test-app-key")
+os.environ.setdefault("GITHUB_CLIENT_ID", "test")
+os.environ.setdefault("GITHUB_CLIENT_SECRET", "test")
+os.environ.setdefault("GITHUB_API_URL", "http://fake-github.local")
+os.environ.setdefault("GITHUB_WEBHOOK_SECRET", "test-webhook-secret")
+os.environ.setdefault("CONTENT_BACKEND", "github")
+os.environ.setdefault("CONTENT_WARMUP", "false")
+os.environ.setdefault("DATA_REPO", "bench/data")
+# Each test starts with an empty cache, which a cache file shared between tests would not give
+os.environ["SHARED_CACHE_PATH"] = ""
+
+import httpx
+import pytest
+
+from benchmarks.fake_github import FakeRepository, create_app, generate_repository
+from benchmarks.run import session_cookie
+import src.services.github_service as github_service
+import src.services.write_queue as write_queue
+from src.services.content_store import content_store
+from src.services.response_cache import response_cache
+from src.services.user_cache import repo_access_cache, user_cache
+
+
+@pytest.fixture
+def repository() -> FakeRepository:
+    """
+    A data repository with one collection, "items-3", of three items.
+    """
+    return generate_repository([3], repeatables=1)
+
+
+@pytest.fixture
+def github(repository: FakeRepository) -> FakeRepository:
+    """
+    Point the app at a GitHub stand-in serving the repository, with nothing cached from earlier tests.
+    """
+    github_service._http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(repository)))
+    content_store.backend.__init__()
+    content_store.__init__(content_store.backend)
+    response_cache.clear()
+    user_cache.__init__()
+    repo_access_cache.__init__()
+    write_queue.default_branches.clear()
+    write_queue.branch_locks.clear()
+    write_queue.write_queue.__init__()
+    yield repository
+    github_service._http_client = None
+
+
+@pytest.fixture
+def client(github: FakeRepository) -> httpx.AsyncClient:
+    """
+    A client for the app, used within one asyncio.run. The app's lifespan is not run.
+    """
+    from src.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.fixture
+def editor(github: FakeRepository) -> httpx.AsyncClient:
+    """
+    A client for the app signed in as an editor, used within one asyncio.run.
+    """
+    from src.main import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test", cookies={"session": session_cookie("test-token")}
+    )
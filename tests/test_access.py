@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from src.routes import api
+from src.services.content_store import ContentBackend
+from src.services.github_service import GithubService
+
+COLLECTION_URL = "/collections/items-3"
+API_COLLECTION_URL = "/api/v1/collections/items-3"
+
+
+def get(client, *urls):
+    async def run():
+        return [await client.get(url) for url in urls]
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def access_checks(monkeypatch):
+    checks = []
+    check_repo_access = GithubService.check_repo_access
+
+    async def spy(self, repo):
+        checks.append(repo)
+        return await check_repo_access(self, repo)
+
+    monkeypatch.setattr(GithubService, "check_repo_access", spy)
+    return checks
+
+
+def test_editors_access_is_checked_once_per_token(editor, access_checks):
+    responses = get(editor, COLLECTION_URL, f"{COLLECTION_URL}/item-00000", "/")
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert access_checks == ["bench/data"]
+
+
+def test_editors_who_cannot_read_the_data_repository_are_refused(editor, monkeypatch):
+    async def no_access(self, repo):
+        return {"has_access": False, "detail": "Repository not found or no access"}
+
+    monkeypatch.setattr(GithubService, "check_repo_access", no_access)
+
+    responses = get(editor, COLLECTION_URL, "/")
+
+    assert [response.status_code for response in responses] == [403, 403]
+    assert responses[0].json()["detail"] == "No access to the data repository"
+
+
+def test_repositories_that_are_not_found_cannot_be_accessed(github):
+    async def run():
+        return await GithubService(access_token="test-token").check_repo_access("other/repo")
+
+    assert asyncio.run(run())["has_access"] is False
+
+
+def test_private_content_is_not_published_on_the_api(client, github):
+    github.private = True
+
+    response, = get(client, API_COLLECTION_URL)
+
+    assert response.status_code == 403
+
+
+def test_private_content_is_published_on_the_api_when_allowed(client, github, monkeypatch):
+    github.private = True
+    monkeypatch.setattr(api, "API_PUBLISH_PRIVATE_REPO", True)
+
+    response, = get(client, API_COLLECTION_URL)
+
+    assert response.status_code == 200
+
+
+def test_content_backends_implement_reading():
+    class Incomplete(ContentBackend):
+        async def get_head(self) -> str:
+            return "head"
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,252 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+
+import pytest
+
+import src.routes.api as api
+from src.services import content_store as content_store_module
+from src.services.content_store import GithubBackend, content_store
+
+COLLECTION_ID = "items-3"
+COLLECTION_URL = f"/api/v1/collections/{COLLECTION_ID}"
+ITEM_PATH = f"data/collections/{COLLECTION_ID}/item-00000.yml"
+
+
+async def not_loaded(collection_id):
+    raise AssertionError(f"{collection_id} was loaded")
+
+
+def last_modified(repository):
+    date = datetime.fromisoformat(repository.commits[repository.head()]["date"])
+    return format_datetime(date, usegmt=True)
+
+
+def restart():
+    """
+    Forget the loaded content, as a new worker process would have.
+    """
+    content_store.__init__(content_store.backend)
+
+
+@pytest.mark.parametrize("url", [
+    COLLECTION_URL,
+    f"{COLLECTION_URL}?limit=2",
+    f"{COLLECTION_URL}/_index",
+    f"{COLLECTION_URL}/by/links.id/link-0-0",
+    f"/api/v1/search?q=item&collection={COLLECTION_ID}",
+])
+def test_unchanged_collections_are_not_loaded_again(client, github, url, monkeypatch):
+    async def run():
+        async with client:
+            response = await client.get(url)
+            restart()
+            monkeypatch.setattr(api, "get_collection_snapshot", not_loaded)
+            not_modified = await client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+            weak = await client.get(url, headers={"If-None-Match": f'W/{response.headers["ETag"]}, "other"'})
+            not_modified_since = await client.get(url, headers={"If-Modified-Since": response.headers["Last-Modified"]})
+            return response, not_modified, weak, not_modified_since
+
+    response, not_modified, weak, not_modified_since = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == api.API_CACHE_CONTROL
+    assert response.headers["Last-Modified"] == last_modified(github)
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == response.headers["ETag"]
+    assert not_modified.headers["Last-Modified"] == response.headers["Last-Modified"]
+    assert weak.status_code == 304
+    assert not_modified_since.status_code == 304
+
+
+def test_collection_etag_changes_with_its_items(client, github):
+    async def run():
+        async with client:
+            response = await client.get(COLLECTION_URL)
+            etag = response.headers["ETag"]
+
+            github.commit_changes({"README.md": b"Not content\n"}, "Change something else")
+            content_store.invalidate()
+            unchanged = await client.get(COLLECTION_URL, headers={"If-None-Match": etag})
+
+            github.commit_changes({ITEM_PATH: github.blobs[github.files_at("HEAD")[ITEM_PATH]] + b"extra: 1\n"}, "Change an item")
+            content_store.invalidate()
+            changed = await client.get(COLLECTION_URL, headers={"If-None-Match": etag})
+            return etag, unchanged, changed
+
+    etag, unchanged, changed = asyncio.run(run())
+
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_item_etag_changes_with_the_item(client, github):
+    url = f"{COLLECTION_URL}/item-00000"
+
+    async def run():
+        async with client:
+            response = await client.get(url)
+            etag = response.headers["ETag"]
+            unchanged = await client.get(url, headers={"If-None-Match": etag})
+
+            github.commit_changes({ITEM_PATH: github.blobs[github.files_at("HEAD")[ITEM_PATH]] + b"extra: 1\n"}, "Change the item")
+            content_store.invalidate()
+            changed = await client.get(url, headers={"If-None-Match": etag})
+            return response, unchanged, changed
+
+    response, unchanged, changed = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert response.headers["Last-Modified"] == last_modified(github)
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != response.headers["ETag"]
+
+
+def test_items_are_not_read_to_check_their_etag(client, github, monkeypatch):
+    url = f"{COLLECTION_URL}/item-00000"
+
+    async def run():
+        response = await client.get(url)
+        restart()
+        monkeypatch.setattr(api, "get_collection_item_entry", not_loaded)
+        not_modified = await client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        missing = await client.get(f"{COLLECTION_URL}/missing", headers={"If-None-Match": response.headers["ETag"]})
+        return response, not_modified, missing
+
+    response, not_modified, missing = asyncio.run(run())
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == response.headers["ETag"]
+    assert missing.status_code == 404
+
+
+def test_content_modified_since_is_sent(client, github):
+    date = datetime.fromisoformat(github.commits[github.head()]["date"])
+
+    async def run():
+        return [
+            await client.get(COLLECTION_URL, headers={"If-Modified-Since": format_datetime(since, usegmt=True)})
+            for since in (date - timedelta(seconds=1), date + timedelta(days=1))
+        ] + [await client.get(COLLECTION_URL, headers={"If-Modified-Since": "not a date"})]
+
+    earlier, later, invalid = asyncio.run(run())
+
+    assert earlier.status_code == 200
+    assert later.status_code == 304
+    assert invalid.status_code == 200
+
+
+def test_collections_with_errors_are_revalidated(client, github):
+    github.commit_changes({f"data/collections/{COLLECTION_ID}/broken.yml": b"data: [unclosed\n"}, "Add a broken item")
+
+    async def run():
+        async with client:
+            response = await client.get(COLLECTION_URL)
+            not_modified = await client.get(COLLECTION_URL, headers={"If-None-Match": response.headers["ETag"]})
+            return response, not_modified
+
+    response, not_modified = asyncio.run(run())
+
+    assert [error["name"] for error in response.json()["errors"]] == ["broken.yml"]
+    assert response.headers["Cache-Control"] == api.API_CACHE_CONTROL_ERRORS
+    assert "Last-Modified" not in response.headers
+    assert not_modified.status_code == 304
+    assert not_modified.headers["Cache-Control"] == api.API_CACHE_CONTROL_ERRORS
+
+
+def test_errors_etag():
+    etag = '"abc"'
+
+    assert api.errors_etag(etag, []) == etag
+    assert api.errors_etag(etag, [{"name": "broken.yml"}]) != etag
+    assert api.errors_etag(etag, [{"name": "broken.yml"}]) != api.errors_etag(etag, [{"name": "other.yml"}])
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("loaded", [False, True])
+def test_streams_match_the_collection(client, github, loaded):
+    github.commit_changes({f"data/collections/{COLLECTION_ID}/broken.yml": b"data: [unclosed\n"}, "Add a broken item")
+
+    async def run():
+        if loaded:
+            await content_store.get_collection(COLLECTION_ID)
+        json_stream = await client.get(f"{COLLECTION_URL}?stream=json")
+        restart()
+        if loaded:
+            await content_store.get_collection(COLLECTION_ID)
+        ndjson_stream = await client.get(f"{COLLECTION_URL}?stream=ndjson&fields=title&filter[title][ne]=Item 1")
+        return json_stream, ndjson_stream, await client.get(COLLECTION_URL)
+
+    json_stream, ndjson_stream, document = asyncio.run(run())
+
+    assert json_stream.json() == document.json()
+    assert [error["name"] for error in json_stream.json()["errors"]] == ["broken.yml"]
+    assert [item["data"] for item in ndjson(ndjson_stream)] == [
+        {"id": "item-00000", "title": "Item 0"}, {"id": "item-00002", "title": "Item 2"}
+    ]
+    assert ndjson_stream.headers["Content-Type"] == "application/x-ndjson"
+    assert json_stream.headers["Cache-Control"] == api.API_CACHE_CONTROL_ERRORS
+    # Items that fail to load are only known up front once the collection has loaded
+    assert ("ETag" in ndjson_stream.headers) is loaded
+    assert ndjson_stream.headers.get("X-Item-Errors") == ("1" if loaded else None)
+
+
+def test_ndjson_pages_are_linked_by_a_header(client):
+    async def run():
+        first = await client.get(f"{COLLECTION_URL}?stream=ndjson&limit=2")
+        second = await client.get(f"{COLLECTION_URL}?stream=ndjson&limit=2&cursor={first.headers['X-Next-Cursor']}")
+        page = await client.get(f"{COLLECTION_URL}?stream=json&limit=2")
+        return first, second, page
+
+    first, second, page = asyncio.run(run())
+
+    assert [item["data"]["id"] for item in ndjson(first)] == ["item-00000", "item-00001"]
+    assert [item["data"]["id"] for item in ndjson(second)] == ["item-00002"]
+    assert first.headers["X-Item-Errors"] == "0"
+    assert "X-Next-Cursor" not in second.headers
+    assert page.json()["next_cursor"] == first.headers["X-Next-Cursor"]
+
+
+def test_collections_are_streamed_as_they_load(github, monkeypatch):
+    monkeypatch.setattr(content_store_module, "GITHUB_BLOB_BATCH_SIZE", 1)
+    fetch_files = GithubBackend.fetch_files
+    fetched = asyncio.Event()
+
+    async def fetch_first_file(self, path, ref, entries):
+        if fetched.is_set():
+            await asyncio.sleep(3600)
+        fetched.set()
+        return await fetch_files(self, path, ref, entries)
+
+    monkeypatch.setattr(GithubBackend, "fetch_files", fetch_first_file)
+
+    async def run():
+        items = content_store.iter_collection(COLLECTION_ID)
+        first = await anext(items)
+        loaded = await content_store.has_collection(COLLECTION_ID)
+        await items.aclose()
+        for task in content_store.loading:
+            task.cancel()
+        return first, loaded
+
+    first, loaded = asyncio.run(run())
+
+    assert first.content["data"]["id"] == "item-00000"
+    assert not loaded
+
+
+def test_collections_carry_on_loading_when_a_stream_stops(github):
+    async def run():
+        async for entry in content_store.iter_collection(COLLECTION_ID):
+            break
+        await asyncio.gather(*content_store.loading)
+        return await content_store.has_collection(COLLECTION_ID)
+
+    assert asyncio.run(run())
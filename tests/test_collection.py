@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+import yaml
+
+COLLECTION_ID = "items-3"
+COLLECTION_PATH = f"data/collections/{COLLECTION_ID}"
+BULK_UPDATE_URL = f"/collections/{COLLECTION_ID}/bulk-update"
+
+
+def read_file(repository, path):
+    return yaml.safe_load(repository.blobs[repository.files_at("HEAD")[path]])
+
+
+def post(editor, url, **kwargs):
+    async def run():
+        return await editor.post(url, **kwargs)
+
+    return asyncio.run(run())
+
+
+def test_bulk_json_edits_are_made_in_one_commit(editor, github):
+    commits = len(github.commits)
+
+    response = post(editor, BULK_UPDATE_URL, json={
+        "updates": {"item-00000": {"title": "First"}, "item-00002": {"title": "Third", "summary": "Edited"}},
+        "message": "Edit two items",
+    })
+
+    assert response.status_code == 200
+    assert response.json() == {"commit": github.head(), "items": ["item-00000", "item-00002"]}
+    assert len(github.commits) == commits + 1
+    assert github.commits[github.head()]["message"] == "Edit two items"
+    assert read_file(github, f"{COLLECTION_PATH}/item-00000.yml")["data"]["title"] == "First"
+    assert read_file(github, f"{COLLECTION_PATH}/item-00002.yml")["data"]["summary"] == "Edited"
+    assert read_file(github, f"{COLLECTION_PATH}/item-00001.yml")["data"]["title"] == "Item 1"
+
+
+def test_bulk_form_edits_are_made_in_one_commit(editor, github):
+    commits = len(github.commits)
+
+    response = post(editor, BULK_UPDATE_URL, data={"field": "title", "value": "Same", "item_ids": ["item-00000", "item-00001"]})
+
+    assert response.status_code == 303
+    assert response.headers["Location"].endswith(f"/collections/{COLLECTION_ID}")
+    assert len(github.commits) == commits + 1
+    assert [read_file(github, f"{COLLECTION_PATH}/item-0000{index}.yml")["data"]["title"] for index in range(3)] == [
+        "Same", "Same", "Item 2"
+    ]
+
+
+def test_bulk_edits_that_change_nothing_are_not_committed(editor, github):
+    commits = len(github.commits)
+
+    response = post(editor, BULK_UPDATE_URL, json={"updates": {"item-00000": {"title": "Item 0"}}})
+
+    assert response.json()["commit"] is None
+    assert len(github.commits) == commits
+
+
+def test_bulk_edits_add_data_to_items_without_it(editor, github):
+    github.commit_changes({f"{COLLECTION_PATH}/empty.yml": b"other: 1\n"}, "Add an item without data")
+
+    response = post(editor, BULK_UPDATE_URL, json={"updates": {"empty": {"title": "Now has data"}}})
+
+    assert response.status_code == 200
+    assert read_file(github, f"{COLLECTION_PATH}/empty.yml") == {"other": 1, "data": {"title": "Now has data"}}
+
+
+def test_bulk_edits_of_unknown_items_are_not_found(editor, github):
+    commits = len(github.commits)
+
+    response = post(editor, BULK_UPDATE_URL, json={"updates": {"item-00000": {"title": "First"}, "missing": {"title": "?"}}})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Items not found: missing"
+    assert len(github.commits) == commits
+
+
+@pytest.mark.parametrize("field_id", ["id", "unknown", "links"])
+def test_bulk_edits_of_fields_that_are_not_editable_are_rejected(editor, github, field_id):
+    # Repeatable fields are edited an entry at a time even when they are editable
+    config = read_file(github, "config.yml")
+    for field in config["collections"][0]["fields"]:
+        if field["id"] == "links":
+            field["editable"] = True
+    github.commit_changes({"config.yml": yaml.dump(config).encode("utf-8")}, "Make links editable")
+
+    response = post(editor, BULK_UPDATE_URL, json={"updates": {"item-00000": {field_id: "value"}}})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Field is not editable: {field_id}"
+
+
+@pytest.mark.parametrize("body", [[], {"updates": []}, {"updates": {"item-00000": "value"}}])
+def test_invalid_bulk_json_edits_are_rejected(editor, body):
+    response = post(editor, BULK_UPDATE_URL, json=body)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid updates"
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+COLLECTION_ID = "items-3"
+COLLECTION_URL = f"/api/v1/collections/{COLLECTION_ID}"
+
+
+def get(client, *urls):
+    async def run():
+        return [await client.get(url) for url in urls]
+
+    return asyncio.run(run())
+
+
+def item_ids(response):
+    return [item["data"]["id"] for item in response.json()["collection"]["items"]]
+
+
+def test_pages_follow_the_cursor(client):
+    first, = get(client, f"{COLLECTION_URL}?limit=2")
+    second, = get(client, f"{COLLECTION_URL}?limit=2&cursor={first.json()['next_cursor']}")
+
+    assert item_ids(first) == ["item-00000", "item-00001"]
+    assert item_ids(second) == ["item-00002"]
+    assert second.json()["next_cursor"] is None
+
+
+def test_fields_are_projected_with_the_id(client):
+    response, = get(client, f"{COLLECTION_URL}?fields=title,summary")
+
+    assert response.json()["collection"]["items"][0]["data"] == {
+        "id": "item-00000", "title": "Item 0", "summary": "Summary of item 0, a synthetic item for benchmarking."
+    }
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("filter[title]=Item 1", ["item-00001"]),
+    ("filter[title][ne]=Item 1", ["item-00000", "item-00002"]),
+    ("filter[published][gte]=2024-01-02", ["item-00001", "item-00002"]),
+    ("filter[published][lt]=2024-01-02&filter[title]=Item 0", ["item-00000"]),
+    ("filter[links]=anything", []),
+    ("filter[published][gte]=2024-01-02&limit=1", ["item-00001"]),
+])
+def test_filters(client, query, expected):
+    response, = get(client, f"{COLLECTION_URL}?{query}")
+
+    assert response.status_code == 200
+    assert item_ids(response) == expected
+
+
+def test_items_that_are_not_mappings_do_not_match_filters(client, github):
+    github.commit_changes({f"data/collections/{COLLECTION_ID}/list.yml": b"- not\n- a mapping\n"}, "Add a list")
+
+    response, projected = get(client, f"{COLLECTION_URL}?filter[title]=Item 1", f"{COLLECTION_URL}?fields=title&limit=10")
+
+    assert response.status_code == 200
+    assert item_ids(response) == ["item-00001"]
+    assert projected.status_code == 200
+
+
+@pytest.mark.parametrize("query, detail", [
+    ("cursor=%25%25%25", "Invalid cursor"),
+    ("cursor=aXRlbS0wMDAwMS55bWw=", "Invalid cursor"),
+    ("cursor=a+b/", "Invalid cursor"),
+    ("cursor=%C3%A9", "Invalid cursor"),
+    ("fields=title,unknown", "Unknown field: unknown"),
+    ("fields=links/name", "Unknown field: links/name"),
+    ("filter[unknown]=1", "Unknown field: unknown"),
+    ("filter[title][like]=Item", "Unknown filter operator: like"),
+])
+def test_invalid_queries_are_rejected(client, query, detail):
+    response, = get(client, f"{COLLECTION_URL}?{query}")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == detail
+
+
+@pytest.mark.parametrize("limit", ["0", str(1001), "many"])
+def test_invalid_limits_are_rejected(client, limit):
+    response, = get(client, f"{COLLECTION_URL}?limit={limit}")
+
+    assert response.status_code == 422
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from src.services.content_store import content_store
+from src.services.github_service import GithubService, get_graphql_url
+
+COLLECTION_PATH = "data/collections/items-3"
+
+
+@pytest.mark.parametrize("api_url, graphql_url", [
+    ("https://api.github.com", "https://api.github.com/graphql"),
+    ("https://github.example.com/api/v3", "https://github.example.com/api/graphql"),
+    ("http://fake-github.local", "http://fake-github.local/graphql"),
+])
+def test_graphql_url(api_url, graphql_url):
+    assert get_graphql_url(api_url) == graphql_url
+
+
+def test_blobs_are_fetched_with_graphql(github):
+    service = GithubService(access_token="test-token")
+    shas = [sha for path, sha in github.files_at("HEAD").items() if path.startswith(COLLECTION_PATH)]
+
+    async def run():
+        blobs = await service.get_blobs(github.name, shas)
+        return blobs, (await service.client.get(f"{service.base_url}/_stats")).json()
+
+    blobs, stats = asyncio.run(run())
+
+    assert service.graphql_url == f"{service.base_url}/graphql"
+    assert set(blobs) == set(shas)
+    assert stats["by_route"] == {"/graphql": 1, "/_stats": 1}
+
+
+def test_truncated_trees_are_listed_from_the_tarball(github, monkeypatch):
+    get_tree = GithubService.get_tree
+
+    async def truncated(self, repo, tree_ish):
+        return {**await get_tree(self, repo, tree_ish), "tree": [], "truncated": True}
+
+    monkeypatch.setattr(GithubService, "get_tree", truncated)
+
+    async def run():
+        files = await GithubService().list_tree_files(github.name, github.head(), COLLECTION_PATH)
+        snapshot = await content_store.get_collection("items-3")
+        return files, snapshot
+
+    files, snapshot = asyncio.run(run())
+
+    expected = {path.rsplit("/", 1)[-1]: sha for path, sha in github.files_at("HEAD").items() if path.startswith(COLLECTION_PATH)}
+    assert {entry["path"]: entry["sha"] for entry in files} == expected
+    assert [entry.content["data"]["id"] for entry in snapshot.entries.values()] == ["item-00000", "item-00001", "item-00002"]
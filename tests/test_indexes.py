@@ -0,0 +1,94 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from src.services.content_store import CollectionSnapshot, ItemEntry
+from src.services.github_service import GithubService
+from src.services.write_queue import write_queue
+
+COLLECTION_ID = "items-3"
+BY_URL = f"/api/v1/collections/{COLLECTION_ID}/by"
+
+
+def get(client, *urls):
+    async def run():
+        return [await client.get(url) for url in urls]
+
+    return asyncio.run(run())
+
+
+def item_ids(response):
+    return [item["data"]["id"] for item in response.json()["collection"]["items"]]
+
+
+def make_entry(item_id, *link_ids):
+    return ItemEntry(f"{item_id}.yml", item_id, {"data": {"id": item_id, "links": [{"id": link_id} for link_id in link_ids]}})
+
+
+@pytest.mark.parametrize("url, expected", [
+    (f"{BY_URL}/links.id/link-1-0", ["item-00001"]),
+    (f"{BY_URL}/links.id/link-2-0", ["item-00002"]),
+    (f"{BY_URL}/links.id/missing", []),
+])
+def test_items_are_looked_up_by_an_indexed_field(client, url, expected):
+    response, = get(client, url)
+
+    assert response.status_code == 200
+    assert item_ids(response) == expected
+
+
+@pytest.mark.parametrize("field", ["title", "links.name", "unknown"])
+def test_fields_without_a_declared_index_are_not_found(client, field):
+    response, = get(client, f"{BY_URL}/{field}/Item 1")
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Index not found"
+
+
+def test_indexes_are_updated_after_a_write(client, github):
+    def edit(content):
+        content["data"]["links"] = [{"id": "link-new", "name": "New"}]
+
+    async def run():
+        before = await client.get(f"{BY_URL}/links.id/link-0-0")
+        await write_queue.submit(
+            GithubService(access_token="test-token"), github.name,
+            f"data/collections/{COLLECTION_ID}/item-00000.yml", edit, "Replace the links"
+        )
+        return before, await client.get(f"{BY_URL}/links.id/link-0-0"), await client.get(f"{BY_URL}/links.id/link-new")
+
+    before, removed, added = asyncio.run(run())
+
+    assert item_ids(before) == ["item-00000"]
+    assert item_ids(removed) == []
+    assert item_ids(added) == ["item-00000"]
+
+
+def test_copies_share_indexes_until_they_change():
+    original = CollectionSnapshot("links", OrderedDict((item_id, make_entry(item_id, f"{item_id}-link")) for item_id in "abc"), [])
+    original.build_indexes(["links/id"])
+
+    copy = original.copy()
+    assert copy.indexes is original.indexes
+
+    copy.add([make_entry("a", "a-new")])
+    copy.add([make_entry("d", "c-link")])
+
+    assert [entry.name for entry in original.lookup("links/id", "a-link")] == ["a.yml"]
+    assert original.lookup("links/id", "a-new") == []
+    assert [entry.name for entry in original.lookup("links/id", "c-link")] == ["c.yml"]
+    assert copy.lookup("links/id", "a-link") == []
+    assert [entry.name for entry in copy.lookup("links/id", "a-new")] == ["a.yml"]
+    assert [entry.name for entry in copy.lookup("links/id", "c-link")] == ["c.yml", "d.yml"]
+    # Only the item ID lists that changed were copied
+    assert copy.indexes["links/id"]["b-link"] is original.indexes["links/id"]["b-link"]
+
+
+def test_indexes_built_after_a_copy_are_not_shared():
+    original = CollectionSnapshot("links", OrderedDict([("a", make_entry("a", "a-link"))]), [])
+    copy = original.copy()
+    copy.add([make_entry("b", "b-link")])
+
+    assert [entry.name for entry in copy.lookup("links/id", "b-link")] == ["b.yml"]
+    assert original.lookup("links/id", "b-link") == []
@@ -0,0 +1,89 @@
+import asyncio
+
+from src.services.markdown_renderer import MarkdownRenderer, get_markdown_fields
+
+ITEM_URL = "/api/v1/collections/items-3/item-00001"
+
+
+def count_conversions(renderer, monkeypatch):
+    conversions = []
+    markdown = renderer.get_markdown()
+    convert = markdown.convert
+
+    def spy(text):
+        conversions.append(text)
+        return convert(text)
+
+    monkeypatch.setattr(markdown, "convert", spy)
+    return conversions
+
+
+def test_texts_are_rendered_once(monkeypatch):
+    renderer = MarkdownRenderer()
+    conversions = count_conversions(renderer, monkeypatch)
+
+    first = renderer.render("Some **Markdown**")
+    second = renderer.render("Some **Markdown**")
+
+    assert first == second == "<p>Some <strong>Markdown</strong></p>"
+    assert conversions == ["Some **Markdown**"]
+
+
+def test_least_recently_used_texts_are_forgotten(monkeypatch):
+    renderer = MarkdownRenderer(max_entries=2)
+    conversions = count_conversions(renderer, monkeypatch)
+
+    for text in ["a", "b", "a", "c", "a", "b"]:
+        renderer.render(text)
+
+    assert conversions == ["a", "b", "c", "b"]
+    assert len(renderer.entries) == 2
+
+
+def test_renderer_settings_are_part_of_the_key():
+    html = MarkdownRenderer(output_format="html")
+    xhtml = MarkdownRenderer(output_format="xhtml")
+
+    assert html.settings_key != xhtml.settings_key
+    assert html.render("a  \nb") == "<p>a<br>\nb</p>"
+    assert xhtml.render("a  \nb") == "<p>a<br />\nb</p>"
+
+
+def test_missing_text_is_rendered_empty():
+    renderer = MarkdownRenderer()
+
+    assert renderer.render(None) == ""
+    assert renderer.render("") == ""
+    assert renderer.entries == {}
+
+
+def test_nested_markdown_fields_are_rendered_in_a_copy():
+    collection = {"fields": [
+        {"id": "title", "type": "string"},
+        {"id": "body", "type": "govspeak"},
+        {"id": "sections", "type": "repeatable", "fields": [{"id": "body", "type": "govspeak"}]},
+    ]}
+    content = {"data": {"title": "*Title*", "body": "*Body*", "sections": [{"body": "*One*"}, {"body": None}]}}
+
+    field_paths = get_markdown_fields(collection)
+    rendered = MarkdownRenderer().render_item(content, field_paths)
+
+    assert field_paths == ("body", "sections/body")
+    assert rendered == {"data": {
+        "title": "*Title*",
+        "body": "<p><em>Body</em></p>",
+        "sections": [{"body": "<p><em>One</em></p>"}, {"body": None}]
+    }}
+    assert content["data"]["sections"][0]["body"] == "*One*"
+
+
+def test_items_are_served_as_html_on_request(client):
+    async def run():
+        return await client.get(ITEM_URL), await client.get(f"{ITEM_URL}?format=html")
+
+    markdown, html = asyncio.run(run())
+
+    assert markdown.json()["data"]["body"].startswith("# Item 1\n")
+    assert html.json()["data"]["body"].startswith('<h1>Item 1</h1>\n<p>Some <strong>Markdown</strong> text.</p>')
+    assert html.json()["data"]["title"] == "Item 1"
+    assert markdown.headers["ETag"] != html.headers["ETag"]
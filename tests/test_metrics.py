@@ -0,0 +1,122 @@
+import asyncio
+import re
+
+import pytest
+
+from src.services import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = []
+    monkeypatch.setattr(metrics, "registry", registry)
+    return registry
+
+
+def phases(response):
+    return re.findall(r"(\w+);dur=[\d.]+", response.headers["Server-Timing"])
+
+
+def test_histograms_are_rendered_with_cumulative_buckets(registry):
+    histogram = metrics.Histogram("duration_seconds", "Time taken", ("route",), buckets=(0.1, 1.0))
+    for value in [0.05, 0.5, 0.5, 5]:
+        histogram.observe(value, route='/"quoted"')
+
+    assert metrics.render_metrics() == "\n".join([
+        "# HELP duration_seconds Time taken",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{route="/\\"quoted\\"",le="0.1"} 1',
+        'duration_seconds_bucket{route="/\\"quoted\\"",le="1"} 3',
+        'duration_seconds_bucket{route="/\\"quoted\\"",le="+Inf"} 4',
+        'duration_seconds_sum{route="/\\"quoted\\""} 6.05',
+        'duration_seconds_count{route="/\\"quoted\\""} 4',
+    ]) + "\n"
+
+
+def test_counters_and_gauges_are_rendered_by_label(registry):
+    counter = metrics.Counter("calls_total", "Calls", ("outcome",))
+    gauge = metrics.Gauge("entries", "Entries")
+    counter.inc(outcome="ok")
+    counter.inc(2, outcome="ok")
+    counter.inc(outcome="error")
+    gauge.set(7)
+
+    assert metrics.render_metrics().splitlines() == [
+        "# HELP calls_total Calls",
+        "# TYPE calls_total counter",
+        'calls_total{outcome="ok"} 3',
+        'calls_total{outcome="error"} 1',
+        "# HELP entries Entries",
+        "# TYPE entries gauge",
+        "entries 7",
+    ]
+
+
+def test_server_timing_lists_phases_in_order():
+    header = metrics.server_timing_header({"total": 0.02, "yaml": 0.0012, "github": 0.01})
+
+    assert header == (
+        'github;dur=10.0;desc="GitHub requests", yaml;dur=1.2;desc="YAML parsing", total;dur=20.0;desc="Total"'
+    )
+
+
+def test_only_the_outermost_github_call_is_timed(monkeypatch):
+    calls = []
+    monkeypatch.setattr(metrics.github_calls, "inc", lambda amount=1, **labels: calls.append(labels))
+
+    @metrics.observe_github_call
+    async def inner():
+        await asyncio.sleep(0.01)
+        raise ValueError()
+
+    @metrics.observe_github_call
+    async def outer():
+        try:
+            await inner()
+        except ValueError:
+            pass
+
+    async def run():
+        timings = {}
+        metrics.request_timings.set(timings)
+        await outer()
+        return timings
+
+    timings = asyncio.run(run())
+
+    assert calls == [{"method": "inner", "outcome": "error"}, {"method": "outer", "outcome": "ok"}]
+    assert list(timings) == ["github"]
+    assert timings["github"] >= 0.01
+
+
+def test_responses_carry_server_timing(client, editor):
+    async def run():
+        return await client.get("/api/v1/collections/items-3"), await editor.get("/collections/items-3")
+
+    api, view = asyncio.run(run())
+
+    assert {"github", "total"} <= set(phases(api))
+    assert {"auth", "render", "total"} <= set(phases(view))
+    # Phases are listed in a fixed order, ending with the total
+    order = list(metrics.SERVER_TIMING_PHASES)
+    assert phases(view) == sorted(phases(view), key=order.index)
+
+
+def test_requests_are_counted_by_route(client):
+    async def run():
+        await client.get("/api/v1/collections/items-3")
+        await client.get("/api/v1/collections/items-3/missing")
+        return await client.get("/metrics")
+
+    response = asyncio.run(run())
+    samples = dict(re.findall(r"^(\S+) (\S+)$", response.text, re.MULTILINE))
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert float(samples[
+        'http_request_duration_seconds_count{method="GET",route="/api/v1/collections/{collection_id}",status="200"}'
+    ]) >= 1
+    assert float(samples[
+        'http_request_duration_seconds_count{method="GET",route="/api/v1/collections/{collection_id}/{item_id}",status="404"}'
+    ]) >= 1
+    assert float(samples['github_calls_total{method="get_tree",outcome="ok"}']) >= 1
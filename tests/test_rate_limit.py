@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from src.services import github_service as github_service_module
+from src.services.content_store import content_store
+from src.services.rate_limit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, RateLimitBudget, RateLimitScheduler
+
+
+def rate_limit_response(limit: int, remaining: int, reset_in: float = 3600, status_code: int = 200, **headers):
+    return httpx.Response(status_code, headers={
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(time.time() + reset_in)),
+        **headers
+    })
+
+
+def test_interactive_requests_are_sent_before_background_ones():
+    scheduler = RateLimitScheduler(slots=1)
+    order = []
+
+    async def request(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+
+    async def run():
+        async with scheduler.slot(PRIORITY_BACKGROUND):
+            tasks = [
+                asyncio.create_task(request("background", PRIORITY_BACKGROUND)),
+                asyncio.create_task(request("interactive", PRIORITY_INTERACTIVE)),
+            ]
+            await asyncio.sleep(0)
+            assert scheduler.stats()["waiting"] == 2
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert order == ["interactive", "background"]
+    assert scheduler.active == 0
+
+
+def test_background_requests_use_the_cache_when_the_budget_is_low():
+    scheduler = RateLimitScheduler(slots=1, reserve=0.1)
+    url = "https://api.github.com/repos/bench/data"
+
+    scheduler.get_budget("token", "core").update(rate_limit_response(5000, 600))
+    assert not scheduler.should_use_cache("token", url, PRIORITY_BACKGROUND)
+
+    scheduler.get_budget("token", "core").update(rate_limit_response(5000, 500))
+    assert scheduler.should_use_cache("token", url, PRIORITY_BACKGROUND)
+    assert not scheduler.should_use_cache("token", url, PRIORITY_INTERACTIVE)
+    # Budgets are kept per credential and per resource
+    assert not scheduler.should_use_cache("other", url, PRIORITY_BACKGROUND)
+    assert not scheduler.should_use_cache("token", "https://api.github.com/graphql", PRIORITY_BACKGROUND)
+
+
+def test_all_requests_use_the_cache_when_the_budget_is_exhausted():
+    scheduler = RateLimitScheduler(slots=1)
+    scheduler.get_budget("token", "core").update(rate_limit_response(5000, 0))
+
+    assert scheduler.should_use_cache("token", "https://api.github.com/user", PRIORITY_INTERACTIVE)
+
+
+def test_budgets_that_have_reset_are_not_low():
+    budget = RateLimitBudget()
+    budget.update(rate_limit_response(5000, 0, reset_in=-1))
+
+    assert not budget.is_exhausted()
+    assert not budget.is_low(0.1)
+
+
+def test_requests_fail_when_the_limit_lifts_too_late():
+    scheduler = RateLimitScheduler(slots=1, max_wait=10)
+    budget = RateLimitBudget()
+    budget.update(rate_limit_response(5000, 0, reset_in=60))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scheduler.wait_for_budget(budget))
+
+    assert error.value.status_code == 503
+    assert 60 <= int(error.value.headers["Retry-After"]) <= 61
+
+
+def test_secondary_rate_limits_are_retried():
+    scheduler = RateLimitScheduler(slots=1, retries=2, backoff=0)
+    responses = [httpx.Response(403, headers={"Retry-After": "0"}, text="secondary rate limit"), httpx.Response(200)]
+
+    async def run():
+        transport = httpx.MockTransport(lambda request: responses.pop(0))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await scheduler.send(client, "token", PRIORITY_INTERACTIVE, "GET", "https://api.github.com/user")
+
+    assert asyncio.run(run()).status_code == 200
+    assert scheduler.rate_limited == 1
+    assert responses == []
+
+
+def test_rate_limited_responses_are_returned_when_the_retries_run_out():
+    scheduler = RateLimitScheduler(slots=1, retries=1, backoff=0)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(429, headers={"Retry-After": "0"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await scheduler.send(client, "token", PRIORITY_BACKGROUND, "GET", "https://api.github.com/user")
+
+    assert asyncio.run(run()).status_code == 429
+    assert len(requests) == 2
+
+
+def test_editor_content_loads_are_interactive(editor, client, monkeypatch):
+    priorities = {}
+    send = github_service_module.rate_limiter.send
+
+    async def spy(http_client, scope, priority, method, url, **kwargs):
+        priorities.setdefault(url, priority)
+        return await send(http_client, scope, priority, method, url, **kwargs)
+
+    monkeypatch.setattr(github_service_module.rate_limiter, "send", spy)
+
+    async def run():
+        await client.get("/api/v1/collections/items-3")
+        public_priorities = set(priorities.values())
+        priorities.clear()
+        content_store.__init__(content_store.backend)
+        github_service_module.response_cache.clear()
+        await editor.get("/collections/items-3")
+        return public_priorities, set(priorities.values())
+
+    public_priorities, editor_priorities = asyncio.run(run())
+
+    assert public_priorities == {PRIORITY_BACKGROUND}
+    assert editor_priorities == {PRIORITY_INTERACTIVE}
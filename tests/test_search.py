@@ -0,0 +1,89 @@
+import asyncio
+
+import yaml
+
+from src.services.github_service import GithubService
+from src.services.search_index import SearchIndex
+from src.services.write_queue import write_queue
+
+COLLECTION_ID = "items-3"
+COLLECTION_PATH = f"data/collections/{COLLECTION_ID}"
+SEARCH_URL = f"/api/v1/search?collection={COLLECTION_ID}"
+
+
+def add_item(repository, item_id, **data):
+    item = {"data": {"id": item_id, **data}}
+    repository.commit_changes({f"{COLLECTION_PATH}/{item_id}.yml": yaml.dump(item).encode("utf-8")}, f"Add {item_id}")
+
+
+def search(client, *queries):
+    async def run():
+        return [(await client.get(f"{SEARCH_URL}&q={query}")).json()["results"] for query in queries]
+
+    return asyncio.run(run())
+
+
+def test_results_are_ranked_best_match_first(client, github):
+    add_item(github, "mention", title="Other", summary="A zebra among many other words in a much longer summary")
+    add_item(github, "zebra", title="Zebra", summary="Zebra zebra")
+
+    results, = search(client, "zebra")
+
+    assert [result["id"] for result in results] == ["zebra", "mention"]
+    assert results[0]["score"] > results[1]["score"]
+    assert results[0] == {
+        "collection": COLLECTION_ID,
+        "id": "zebra",
+        "label": "Zebra",
+        "score": results[0]["score"],
+        "url": f"/api/v1/collections/{COLLECTION_ID}/zebra"
+    }
+
+
+def test_nested_and_govspeak_fields_are_searched(client):
+    links, body = search(client, "link&limit=1", "markdown")
+
+    assert len(links) == 1
+    assert [result["id"] for result in body] == ["item-00000", "item-00001", "item-00002"]
+
+
+def test_search_is_updated_after_a_write(client, github):
+    def edit(content):
+        content["data"]["title"] = "Aardvark"
+
+    async def run():
+        before = (await client.get(f"{SEARCH_URL}&q=aardvark")).json()["results"]
+        await write_queue.submit(
+            GithubService(access_token="test-token"), github.name, f"{COLLECTION_PATH}/item-00001.yml", edit, "Rename"
+        )
+        after = (await client.get(f"{SEARCH_URL}&q=aardvark")).json()["results"]
+        renamed = (await client.get(f"{SEARCH_URL}&q=item 1")).json()["results"]
+        return before, after, renamed
+
+    before, after, renamed = asyncio.run(run())
+
+    assert before == []
+    assert [result["id"] for result in after] == ["item-00001"]
+    assert [result["label"] for result in after] == ["Aardvark"]
+    assert "Item 1" not in [result["label"] for result in renamed]
+
+
+def test_copies_share_the_index_until_they_change():
+    original = SearchIndex()
+    original.add("a", ["apple banana"])
+    original.add("b", ["banana cherry"])
+    original.add("c", ["elderberry"])
+
+    copy = original.copy()
+    assert copy.postings is original.postings
+
+    copy.add("a", ["apple damson"])
+    copy.remove("b")
+
+    assert [item_id for item_id, _ in original.search("banana")] == ["a", "b"]
+    assert original.search("damson") == []
+    assert copy.search("banana") == []
+    assert [item_id for item_id, _ in copy.search("damson")] == ["a"]
+    # Only the postings that changed were copied
+    assert copy.postings["elderberry"] is original.postings["elderberry"]
+    assert "cherry" not in copy.postings and "cherry" in original.postings
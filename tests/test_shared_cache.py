@@ -0,0 +1,183 @@
+import asyncio
+import sqlite3
+import threading
+from datetime import date, datetime, timezone
+
+import pytest
+import yaml
+
+from src.services import content_store as content_store_module
+from src.services import shared_cache as shared_cache_module
+from src.services import yaml_loader
+from src.services.content_store import ContentStore, GithubBackend
+from src.services.shared_cache import SharedCache
+
+CONTENT = {
+    "data": {
+        "id": "item-1",
+        "title": "Café \U0001f600",
+        "published": date(2024, 1, 2),
+        "updated_at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        "count": 3,
+        "ratio": 0.5,
+        "draft": False,
+        "empty": None,
+        "links": [{"id": "link-1", "tags": []}],
+    }
+}
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / "cache.db")
+
+
+def test_parsed_content_is_shared_between_workers(path):
+    SharedCache(path).put_parsed({"a" * 40: CONTENT})
+
+    found, content = SharedCache(path).get_parsed("a" * 40)
+
+    assert found
+    assert content == CONTENT
+    assert isinstance(content["data"]["published"], date)
+    assert not isinstance(content["data"]["published"], datetime)
+    assert content["data"]["updated_at"].tzinfo is not None
+
+
+@pytest.mark.parametrize("content", [
+    {1: "keys that are not strings"},
+    {"data": {"tags": {"a", "set"}}},
+    {"data": {"pair": ("a", "tuple")}},
+    {"data": {"looks_like_a_date": {"\x00date": "2024-01-02"}}},
+])
+def test_content_json_cannot_hold_is_not_shared(path, content):
+    cache = SharedCache(path)
+
+    cache.put_parsed({"a" * 40: content})
+
+    assert cache.get_parsed("a" * 40) == (False, None)
+
+
+def test_unreadable_content_is_a_miss(path):
+    cache = SharedCache(path)
+    cache.execute("INSERT INTO blobs (sha, parsed, size, used_at) VALUES (?, ?, ?, ?)", ["a" * 40, "{not json", 9, 0])
+
+    assert cache.get_parsed("a" * 40) == (False, None)
+    assert cache.misses == 1
+
+
+def test_texts_paths_and_heads_are_shared_between_workers(path):
+    cache = SharedCache(path)
+    cache.put_texts({"a" * 40: "data:\n  id: a\n"})
+    cache.set_paths("c" * 40, {"bench/data:data/a.yml": "a" * 40})
+    cache.set_head("bench/data@main", "c" * 40)
+
+    other = SharedCache(path)
+
+    assert other.get_texts(["a" * 40, "b" * 40]) == {"a" * 40: "data:\n  id: a\n"}
+    assert other.get_path("bench/data:data/a.yml", "c" * 40) == "a" * 40
+    assert other.get_path("bench/data:data/a.yml", "d" * 40) is None
+    assert other.get_head("bench/data@main")[0] == "c" * 40
+    assert (other.hits, other.misses) == (1, 1)
+
+
+def test_databases_of_an_earlier_version_are_emptied(path):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE blobs (sha TEXT PRIMARY KEY, text TEXT, parsed BLOB, size INTEGER, used_at REAL)")
+    db.execute("INSERT INTO blobs VALUES (?, ?, ?, ?, ?)", ["a" * 40, "old", b"\x80\x04pickled", 10, 0])
+    db.execute("PRAGMA user_version = 1")
+    db.commit()
+    db.close()
+
+    cache = SharedCache(path)
+
+    assert cache.get_parsed("a" * 40) == (False, None)
+    assert cache.get_texts(["a" * 40]) == {}
+    assert cache.execute("PRAGMA user_version")[0][0] == shared_cache_module.SCHEMA_VERSION
+    cache.put_parsed({"a" * 40: CONTENT})
+    assert cache.get_parsed("a" * 40) == (True, CONTENT)
+
+
+def test_least_recently_used_blobs_are_evicted(path):
+    cache = SharedCache(path, max_bytes=250)
+    for index, sha in enumerate(["a" * 40, "b" * 40, "c" * 40]):
+        cache.put_texts({sha: "x" * 100})
+        cache.execute("UPDATE blobs SET used_at = ? WHERE sha = ?", [index, sha])
+    cache.execute("UPDATE blobs SET used_at = ? WHERE sha = ?", [10, "a" * 40])
+
+    cache.evict()
+
+    assert set(cache.get_texts(["a" * 40, "b" * 40, "c" * 40])) == {"a" * 40, "c" * 40}
+    assert cache.stats()["bytes"] == 200
+
+
+def test_errors_are_misses(tmp_path):
+    cache = SharedCache(str(tmp_path / "missing" / "cache.db"))
+
+    cache.put_parsed({"a" * 40: CONTENT})
+
+    assert cache.get_parsed("a" * 40) == (False, None)
+    assert cache.get_head("bench/data@main") is None
+    assert cache.errors == 3
+
+
+def test_run_uses_a_thread_only_when_enabled(path):
+    async def run(cache):
+        return await cache.run(threading.get_ident)
+
+    assert asyncio.run(run(SharedCache(""))) == threading.get_ident()
+    assert asyncio.run(run(SharedCache(path))) != threading.get_ident()
+
+
+def test_documents_parsed_by_one_worker_are_not_parsed_by_another(path, monkeypatch):
+    text = "data:\n  id: shared\n  published: 2024-01-02\n"
+    monkeypatch.setattr(yaml_loader, "shared_cache", SharedCache(path))
+    yaml_loader.load_yaml(text, "e" * 40)
+
+    # Another worker, which has not parsed the document itself
+    monkeypatch.setattr(yaml_loader, "shared_cache", SharedCache(path))
+    monkeypatch.setattr(yaml_loader, "parse_cache", type(yaml_loader.parse_cache)())
+    monkeypatch.setattr(yaml_loader.yaml, "load", lambda *args, **kwargs: pytest.fail("The document was parsed again"))
+
+    assert yaml_loader.load_yaml(text, "e" * 40) == {"data": {"id": "shared", "published": date(2024, 1, 2)}}
+
+
+def test_connections_that_cannot_be_set_up_are_closed(path, monkeypatch):
+    connections = []
+    connect = sqlite3.connect
+
+    def spy(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    # Another worker is writing to the cache for longer than the timeout
+    writer = connect(path, isolation_level=None)
+    writer.execute("BEGIN EXCLUSIVE")
+    monkeypatch.setattr(shared_cache_module.sqlite3, "connect", spy)
+    cache = SharedCache(path)
+
+    assert cache.get_head("bench/data@main") is None
+    assert cache.db is None
+    assert cache.errors == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute("SELECT 1")
+    writer.execute("ROLLBACK")
+
+
+def test_heads_moved_by_another_worker_are_served_on_the_next_request(github, path, monkeypatch):
+    monkeypatch.setattr(content_store_module, "shared_cache", SharedCache(path))
+    monkeypatch.setattr(content_store_module, "SHARED_CACHE_HEAD_CHECK_INTERVAL", 0)
+    worker, other = (ContentStore(GithubBackend(github.name, "HEAD")) for _ in range(2))
+    item_path = "data/collections/items-3/item-00000.yml"
+
+    async def run():
+        await worker.get_item("items-3", "item-00000")
+        for _ in range(2):
+            await other.get_item("items-3", "item-00000")
+        item = yaml.safe_load(github.blobs[github.files_at("HEAD")[item_path]])
+        item["data"]["title"] = "Pushed"
+        head = github.commit_changes({item_path: yaml.dump(item).encode("utf-8")}, "Push")
+        await worker.refresh(head)
+        return (await other.get_item("items-3", "item-00000")).content
+
+    assert asyncio.run(run())["data"]["title"] == "Pushed"
@@ -0,0 +1,103 @@
+import gzip
+import json
+import os
+import tarfile
+
+import pytest
+
+from src import cli
+from src.services.content_store import content_store
+from src.services.static_export import EXPORT_STATE_NAME
+
+COLLECTION_PATH = "data/collections/items-3"
+EXPORT_PATH = "api/v1/collections/items-3"
+
+
+@pytest.fixture
+def checkout(repository, tmp_path, monkeypatch):
+    """
+    A checkout of the data repository, with the content store reset so it is read from the checkout.
+    """
+    monkeypatch.setattr(content_store, "backend", content_store.backend)
+    content_store.__init__(content_store.backend)
+    root = tmp_path / "data"
+    for path, sha in repository.files_at("HEAD").items():
+        write(root, path, repository.blobs[sha])
+    return root
+
+
+def write(root, path, data):
+    os.makedirs(os.path.dirname(root / path), exist_ok=True)
+    (root / path).write_bytes(data)
+
+
+def export(directory, source, *args):
+    cli.main(["export", str(directory), *args, "--source", str(source), "--page-size", "2"])
+    content_store.__init__(content_store.backend)
+
+
+def read(directory, path):
+    with open(directory / path, "rb") as file, gzip.open(directory / f"{path}.gz") as gzipped:
+        data = file.read()
+        assert gzipped.read() == data
+    return json.loads(data)
+
+
+def test_the_api_is_exported_as_json_files(checkout, tmp_path, capsys):
+    directory = tmp_path / "export"
+
+    export(directory, checkout)
+
+    collection = read(directory, f"{EXPORT_PATH}.json")["collection"]
+    assert [item["data"]["id"] for item in collection["items"]] == ["item-00000", "item-00001", "item-00002"]
+    assert [item["id"] for item in read(directory, f"{EXPORT_PATH}/_index.json")["collection"]["items"]] == [
+        "item-00000", "item-00001", "item-00002"
+    ]
+    assert read(directory, f"{EXPORT_PATH}/item-00001.json")["data"]["title"] == "Item 1"
+    first, second = read(directory, f"{EXPORT_PATH}/pages/1.json"), read(directory, f"{EXPORT_PATH}/pages/2.json")
+    assert len(first["collection"]["items"]) == 2 and len(second["collection"]["items"]) == 1
+    assert first["next_page"] == f"/{EXPORT_PATH}/pages/2.json"
+    assert second["next_page"] is None and second["next_cursor"] is None
+    assert capsys.readouterr().out.strip() == f"Exported to {directory}: 7 written, 0 unchanged, 0 removed"
+
+
+def test_only_files_whose_sources_changed_are_exported_again(checkout, tmp_path, capsys):
+    directory = tmp_path / "export"
+    export(directory, checkout)
+    export(directory, checkout)
+    unchanged = capsys.readouterr().out.splitlines()[-1]
+
+    item = read(directory, f"{EXPORT_PATH}/item-00002.json")
+    write(checkout, f"{COLLECTION_PATH}/item-00002.yml", f"data:\n  id: item-00002\n  title: {item['data']['title']}!\n".encode())
+    os.remove(checkout / COLLECTION_PATH / "item-00000.yml")
+    export(directory, checkout)
+
+    assert unchanged.endswith("0 written, 7 unchanged, 0 removed")
+    # The collection, its _index, the changed item and the first page are written, and the removed item and the
+    # second page, which is no longer needed, are deleted
+    assert capsys.readouterr().out.strip().endswith("4 written, 1 unchanged, 2 removed")
+    assert not os.path.exists(directory / f"{EXPORT_PATH}/item-00000.json")
+    assert not os.path.exists(directory / f"{EXPORT_PATH}/item-00000.json.gz")
+    assert read(directory, f"{EXPORT_PATH}/item-00002.json")["data"]["title"] == "Item 2!"
+    assert set(json.loads((directory / EXPORT_STATE_NAME).read_text())["files"]) == {
+        f"{EXPORT_PATH}.json", f"{EXPORT_PATH}/_index.json", f"{EXPORT_PATH}/item-00001.json",
+        f"{EXPORT_PATH}/item-00002.json", f"{EXPORT_PATH}/pages/1.json"
+    }
+    assert read(directory, f"{EXPORT_PATH}/pages/1.json")["next_page"] is None
+
+
+def test_tarballs_of_the_repository_are_exported(checkout, tmp_path):
+    tarball = tmp_path / "data.tar.gz"
+    with tarfile.open(tarball, "w:gz") as archive:
+        archive.add(checkout, arcname="bench-data-abc1234")
+
+    export(tmp_path / "export", tarball)
+
+    assert read(tmp_path / "export", f"{EXPORT_PATH}/item-00000.json")["data"]["id"] == "item-00000"
+
+
+def test_unknown_collections_are_not_exported(checkout, tmp_path):
+    with pytest.raises(SystemExit, match="Unknown collection: missing"):
+        export(tmp_path / "export", checkout, "missing")
+
+    assert not os.path.exists(tmp_path / "export")
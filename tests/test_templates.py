@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from jinja2 import DictLoader, Environment
+
+from src.services.github_service import GithubService
+from src.services.write_queue import write_queue
+from src.templates import FragmentCacheExtension, precompile_views, views
+
+COLLECTION_URL = "/collections/items-3"
+TEMPLATE = '{% cache "list", version %}{{ renders.append(1) or renders|length }}{% endcache %}'
+
+
+@pytest.fixture
+def environment():
+    return Environment(loader=DictLoader({"list.html": TEMPLATE}), extensions=[FragmentCacheExtension])
+
+
+def render(environment, renders, version):
+    return environment.get_template("list.html").render(renders=renders, version=version)
+
+
+def test_fragments_are_rendered_once_per_key(environment):
+    renders = []
+
+    assert [render(environment, renders, version) for version in ["a", "a", "b", "a"]] == ["1", "1", "2", "1"]
+    assert len(renders) == 2
+
+
+def test_fragments_with_a_missing_key_are_not_cached(environment):
+    renders = []
+
+    assert [render(environment, renders, None) for _ in range(2)] == ["1", "2"]
+    assert environment.get_template("list.html").render(renders=renders) == "3"
+    assert len(environment.fragment_cache) == 0
+
+
+def test_least_recently_used_fragments_are_forgotten(environment):
+    environment.fragment_cache_max_entries = 2
+    renders = []
+
+    for version in ["a", "b", "a", "c", "b"]:
+        render(environment, renders, version)
+
+    assert len(renders) == 4
+    assert len(environment.fragment_cache) == 2
+
+
+def test_every_view_is_precompiled():
+    assert precompile_views() == len(views.env.list_templates(extensions=["html"])) > 0
+
+
+def test_collection_lists_are_rendered_again_after_a_write(editor, github):
+    def edit(content):
+        content["data"]["title"] = "Aardvark"
+
+    async def run():
+        before = await editor.get(COLLECTION_URL)
+        cached = await editor.get(COLLECTION_URL)
+        await write_queue.submit(
+            GithubService(access_token="test-token"), github.name, "data/collections/items-3/item-00001.yml", edit, "Rename"
+        )
+        return before, cached, await editor.get(COLLECTION_URL)
+
+    views.env.fragment_cache.clear()
+    before, cached, after = asyncio.run(run())
+
+    assert before.text == cached.text
+    assert "Item 1<" in before.text and "Aardvark" not in before.text
+    assert "Aardvark" in after.text and "Item 1<" not in after.text
+    assert len(views.env.fragment_cache) == 2
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+
+import pytest
+
+from src import main
+from src.services.content_store import content_store, get_warmup_collection_ids, warm_up
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    """
+    Restore the app's warm-up task after a test sets it.
+    """
+    monkeypatch.setattr(main.app.state, "warmup", None, raising=False)
+
+
+async def no_http_client():
+    pass
+
+
+def test_warmup_collections_are_read_from_the_setting(github):
+    data_config = asyncio.run(content_store.get_config())
+
+    assert get_warmup_collection_ids(data_config, "*") == ["items-3"]
+    assert get_warmup_collection_ids(data_config, " items-3, missing ,") == ["items-3"]
+    assert get_warmup_collection_ids(data_config, "") == []
+
+
+def test_warmup_loads_the_config_and_collections(github, caplog):
+    async def run():
+        loaded = await warm_up(content_store, "items-3,missing")
+        return loaded, await content_store.has_collection("items-3")
+
+    with caplog.at_level(logging.WARNING):
+        loaded, has_collection = asyncio.run(run())
+
+    assert loaded == ["items-3"]
+    assert has_collection
+    assert "Not warming up unknown collection missing" in caplog.text
+
+
+def test_warmup_retries_the_config_until_it_loads(github, monkeypatch):
+    attempts = []
+    get_config = content_store.get_config
+
+    async def flaky():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise RuntimeError("GitHub is down")
+        return await get_config()
+
+    monkeypatch.setattr(content_store, "get_config", flaky)
+
+    assert asyncio.run(warm_up(content_store, "", retry_interval=0)) == []
+    # Failed, loaded, then read again when loading the collections
+    assert len(attempts) == 3
+
+
+def test_collections_that_fail_to_warm_up_are_skipped(github, monkeypatch):
+    async def broken(collection_id):
+        raise RuntimeError("Broken")
+
+    monkeypatch.setattr(content_store, "get_collection", broken)
+
+    assert asyncio.run(warm_up(content_store, "*")) == []
+
+
+def test_the_app_is_ready_once_warmed_up(client, readiness):
+    started = asyncio.Event()
+
+    async def run():
+        responses = [await client.get("/status/ready")]
+
+        async def warming_up():
+            await started.wait()
+            return ["items-3"]
+
+        main.app.state.warmup = asyncio.create_task(warming_up())
+        responses.append(await client.get("/status/ready"))
+        started.set()
+        await main.app.state.warmup
+        responses.append(await client.get("/status/ready"))
+
+        async def failed():
+            raise RuntimeError("Broken")
+
+        main.app.state.warmup = asyncio.create_task(failed())
+        await asyncio.gather(main.app.state.warmup, return_exceptions=True)
+        responses.append(await client.get("/status/ready"))
+        return responses
+
+    disabled, warming_up, warmed_up, failed = asyncio.run(run())
+
+    assert disabled.json() == {"ready": True, "collections": []}
+    assert warming_up.status_code == 503
+    assert warming_up.json() == {"ready": False}
+    assert warmed_up.json() == {"ready": True, "collections": ["items-3"]}
+    assert failed.status_code == 503
+
+
+def test_the_app_warms_up_when_it_starts(github, client, readiness, monkeypatch):
+    monkeypatch.setattr(main, "CONTENT_WARMUP", True)
+    monkeypatch.setattr(main, "open_http_client", no_http_client)
+    monkeypatch.setattr(main, "close_http_client", no_http_client)
+
+    async def run():
+        async with main.lifespan(main.app):
+            await main.app.state.warmup
+            return await client.get("/status/ready"), content_store.snapshot is not None
+
+    response, has_snapshot = asyncio.run(run())
+
+    assert response.json() == {"ready": True, "collections": []}
+    assert has_snapshot
@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+import yaml
+
+from src.routes.webhooks import GITHUB_WEBHOOK_SECRET
+
+ITEM_PATH = "data/collections/items-3/item-00000.yml"
+ITEM_URL = "/api/v1/collections/items-3/item-00000"
+
+
+def push(client, github, before, after, secret=GITHUB_WEBHOOK_SECRET):
+    body = json.dumps({
+        "ref": f"refs/heads/{github.branch}",
+        "before": before,
+        "after": after,
+        "repository": {"full_name": github.name, "default_branch": github.branch},
+    }).encode("utf-8")
+    signature = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return client.post(
+        "/api/webhooks/github",
+        content=body,
+        headers={"X-GitHub-Event": "push", "X-Hub-Signature-256": signature, "Content-Type": "application/json"}
+    )
+
+
+def commit_title(github, title):
+    item = yaml.safe_load(github.blobs[github.files_at("HEAD")[ITEM_PATH]])
+    item["data"]["title"] = title
+    before = github.head()
+    return before, github.commit_changes({ITEM_PATH: yaml.dump(item).encode("utf-8")}, f"Set title to {title}")
+
+
+def test_pushes_update_the_content(client, github):
+    async def run():
+        async with client:
+            await client.get(ITEM_URL)
+            before, after = commit_title(github, "Pushed")
+            response = await push(client, github, before, after)
+            return response, await client.get(ITEM_URL)
+
+    response, item = asyncio.run(run())
+
+    assert response.json()["message"] == "Content updated"
+    assert item.json()["data"]["title"] == "Pushed"
+
+
+def test_replayed_pushes_do_not_move_the_content_back(client, github):
+    async def run():
+        async with client:
+            await client.get(ITEM_URL)
+            first = commit_title(github, "First")
+            second = commit_title(github, "Second")
+            await push(client, github, *second)
+            # The push of the first commit is delivered late
+            response = await push(client, github, *first)
+            return response, await client.get(ITEM_URL)
+
+    response, item = asyncio.run(run())
+
+    assert response.json()["message"] == "Ignored push that is not ahead of the content"
+    assert response.json()["commit"] == github.head()
+    assert item.json()["data"]["title"] == "Second"
+
+
+def test_pushes_without_a_valid_signature_are_rejected(client, github):
+    async def run():
+        async with client:
+            return await push(client, github, github.head(), github.head(), secret="wrong")
+
+    assert asyncio.run(run()).status_code == 403
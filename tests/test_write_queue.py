@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+import yaml
+from fastapi import HTTPException
+
+from benchmarks.fake_github import FakeRepository
+from src.services.content_store import content_store
+from src.services.github_service import GithubService
+from src.services.manifest import build_manifest, dump_manifest, manifest_entry
+from src.services.write_queue import WriteQueue, write_queue
+
+COLLECTION_ID = "items-3"
+COLLECTION_PATH = f"data/collections/{COLLECTION_ID}"
+
+
+def item_path(item_id: str) -> str:
+    return f"{COLLECTION_PATH}/{item_id}.yml"
+
+
+def read_file(repository: FakeRepository, path: str):
+    return yaml.safe_load(repository.blobs[repository.files_at("HEAD")[path]])
+
+
+def set_fields(**fields):
+    def edit(content):
+        content["data"].update(fields)
+    return edit
+
+
+def submit(queue: WriteQueue, item_id: str, **fields):
+    return queue.submit(
+        GithubService(access_token="test-token"), "bench/data", f"/{item_path(item_id)}", set_fields(**fields),
+        commit_message=f"Update {item_id}"
+    )
+
+
+def add_manifest(repository: FakeRepository) -> None:
+    collection = {"field_map": {"id": "id", "label": "title"}}
+    files = repository.files_at("HEAD")
+    entries = [
+        manifest_entry(collection, path.rsplit("/", 1)[-1][:-4], yaml.safe_load(repository.blobs[sha]), sha)
+        for path, sha in files.items() if path.startswith(f"{COLLECTION_PATH}/")
+    ]
+    repository.commit_changes(
+        {f"{COLLECTION_PATH}/_index.yml": dump_manifest(build_manifest(entries)).encode("utf-8")}, "Add manifest"
+    )
+
+
+def test_edits_to_different_items_are_committed_separately(github):
+    async def run():
+        await asyncio.gather(submit(write_queue, "item-00000", title="First"), submit(write_queue, "item-00001", title="Second"))
+        entry = await content_store.get_item(COLLECTION_ID, "item-00000")
+        return entry.content
+
+    content = asyncio.run(run())
+
+    assert read_file(github, item_path("item-00000"))["data"]["title"] == "First"
+    assert read_file(github, item_path("item-00001"))["data"]["title"] == "Second"
+    assert content["data"]["title"] == "First"
+    assert len(github.commits) == 3
+
+
+def test_edits_to_the_same_item_are_gathered_into_one_commit(github):
+    async def run():
+        return await asyncio.gather(
+            submit(write_queue, "item-00000", title="Edited"),
+            submit(write_queue, "item-00000", summary="Also edited"),
+            submit(write_queue, "item-00000", published="2025-01-01"),
+        )
+
+    results = asyncio.run(run())
+
+    data = read_file(github, item_path("item-00000"))["data"]
+    assert (data["title"], data["summary"], data["published"]) == ("Edited", "Also edited", "2025-01-01")
+    assert all(result["data"] == data for result in results)
+    assert len(github.commits) == 2
+
+
+def test_edits_are_applied_again_when_the_item_changed_since_it_was_read(github):
+    queue = WriteQueue(backoff=0)
+
+    async def run():
+        await content_store.get_item(COLLECTION_ID, "item-00000")
+        item = read_file(github, item_path("item-00000"))
+        item["data"]["summary"] = "Changed elsewhere"
+        github.commit_changes({item_path("item-00000"): yaml.dump(item).encode("utf-8")}, "Change elsewhere")
+        await submit(queue, "item-00000", title="Edited")
+
+    asyncio.run(run())
+
+    data = read_file(github, item_path("item-00000"))["data"]
+    assert (data["title"], data["summary"]) == ("Edited", "Changed elsewhere")
+
+
+def test_an_item_that_keeps_changing_is_not_saved(github):
+    queue = WriteQueue(attempts=2, backoff=0)
+
+    def edit(content):
+        content["data"]["title"] = "Edited"
+        # Something else changes the item every time the edit is applied
+        item = read_file(github, item_path("item-00000"))
+        item["data"]["summary"] = f"Changed elsewhere {len(github.commits)}"
+        github.commit_changes({item_path("item-00000"): yaml.dump(item).encode("utf-8")}, "Change elsewhere")
+
+    async def run():
+        await queue.submit(GithubService(access_token="test-token"), "bench/data", item_path("item-00000"), edit, "Update")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+
+    assert error.value.status_code == 409
+    assert read_file(github, item_path("item-00000"))["data"]["title"] == "Item 0"
+
+
+def test_edits_are_committed_with_the_manifest(github):
+    add_manifest(github)
+
+    async def run():
+        await asyncio.gather(submit(write_queue, "item-00000", title="First"), submit(write_queue, "item-00001", title="Second"))
+
+    asyncio.run(run())
+
+    files = github.files_at("HEAD")
+    manifest = {entry["id"]: entry for entry in read_file(github, f"{COLLECTION_PATH}/_index.yml")["items"]}
+    assert manifest["item-00000"]["label"] == "First"
+    assert manifest["item-00001"]["label"] == "Second"
+    assert manifest["item-00000"]["sha"] == files[item_path("item-00000")]
+    assert manifest["item-00001"]["sha"] == files[item_path("item-00001")]
+    assert manifest["item-00002"]["label"] == "Item 2"
+
+
+def test_edits_that_fail_on_the_content_store_version_are_applied_to_the_branch(github):
+    def edit(content):
+        links = [link for link in content["data"]["links"] if link["id"] == "link-new"]
+        if not links:
+            raise HTTPException(status_code=404, detail="Nested field not found")
+        links[0]["name"] = "Edited"
+
+    async def run():
+        await content_store.get_item(COLLECTION_ID, "item-00000")
+        # Another worker adds the entry after this worker's content store read the item
+        item = read_file(github, item_path("item-00000"))
+        item["data"]["links"].append({"id": "link-new", "name": "New"})
+        github.commit_changes({item_path("item-00000"): yaml.dump(item).encode("utf-8")}, "Add a link")
+        await write_queue.submit(GithubService(access_token="test-token"), "bench/data", item_path("item-00000"), edit, "Update")
+
+    asyncio.run(run())
+
+    assert read_file(github, item_path("item-00000"))["data"]["links"][-1] == {"id": "link-new", "name": "Edited"}
+
+
+def test_edits_that_fail_on_the_branch_are_rejected(github):
+    def edit(content):
+        raise HTTPException(status_code=404, detail="Nested field not found")
+
+    async def run():
+        await content_store.get_item(COLLECTION_ID, "item-00000")
+        await write_queue.submit(GithubService(access_token="test-token"), "bench/data", item_path("item-00000"), edit, "Update")
+
+    commits = len(github.commits)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+
+    assert error.value.status_code == 404
+    assert len(github.commits) == commits
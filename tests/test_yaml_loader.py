@@ -0,0 +1,121 @@
+import datetime
+import random
+
+import pytest
+import yaml
+
+from src.services import yaml_loader
+from src.services.yaml_loader import dump_yaml, load_yaml
+
+STRINGS = [
+    "Plain text",
+    "",
+    " leading and trailing spaces ",
+    "Two\nlines",
+    "Trailing newline\n",
+    "Markdown\n\n- a list\n- of points\n",
+    "It's quoted",
+    'Double "quoted"',
+    "back\\slash",
+    "tab\tseparated",
+    "yes",
+    "null",
+    "123",
+    "2024-01-01",
+    "# not a comment",
+    "key: value",
+    "- not a list",
+    "Caf\u00e9 cr\u00e8me",
+    "\u201cCurly quotes\u201d",
+    "Line\u2028separator",
+    "Emoji \U0001f600",
+    "Non-breaking\u00a0space",
+    "\ufeffByte order mark",
+    "Control \x07 character",
+    "a" * 200,
+    " ".join(["word"] * 40),
+]
+
+KEYS = ["id", "", "long key " * 10, "\u00e9t\u00e9", "1", "with: colon", "k" * 64, "k" * 65, "\u00e9" * 32, "\u00e9" * 33]
+
+
+def make_document(value, key="title"):
+    return {"data": {"id": "item-1", key: value, "links": [{"id": "link-1", "name": value}]}}
+
+
+@pytest.mark.parametrize("allow_unicode", [False, True])
+@pytest.mark.parametrize("value", STRINGS)
+def test_strings_are_dumped_as_yaml_dump_does(value, allow_unicode):
+    document = make_document(value)
+
+    text = dump_yaml(document, allow_unicode=allow_unicode)
+
+    assert text == yaml.dump(document, allow_unicode=allow_unicode)
+    assert yaml.safe_load(text) == document
+
+
+@pytest.mark.parametrize("allow_unicode", [False, True])
+@pytest.mark.parametrize("key", KEYS)
+def test_keys_are_dumped_as_yaml_dump_does(key, allow_unicode):
+    document = make_document("value", key)
+
+    text = dump_yaml(document, sort_keys=False, allow_unicode=allow_unicode)
+
+    assert text == yaml.dump(document, sort_keys=False, allow_unicode=allow_unicode)
+    assert yaml.safe_load(text) == document
+
+
+def test_other_values_are_dumped_as_yaml_dump_does():
+    document = {
+        "data": {
+            "published": datetime.date(2024, 1, 2),
+            "updated_at": datetime.datetime(2024, 1, 2, 3, 4, 5),
+            "count": 3,
+            "ratio": 0.5,
+            "draft": False,
+            "empty": None,
+            "tags": [],
+            "meta": {},
+        }
+    }
+
+    assert dump_yaml(document) == yaml.dump(document)
+    assert yaml.safe_load(dump_yaml(document)) == document
+
+
+def test_random_strings_are_dumped_as_yaml_dump_does():
+    characters = "ab \n\t'\"\\:#-\u00e9\u00a0\u2028\u201c\ufeff\U0001f600\x07"
+    generator = random.Random(0)
+    for _ in range(500):
+        value = "".join(generator.choice(characters) for _ in range(generator.randint(0, 12)))
+        document = make_document(value, value or "key")
+        for allow_unicode in (False, True):
+            assert dump_yaml(document, allow_unicode=allow_unicode) == yaml.dump(document, allow_unicode=allow_unicode)
+
+
+@pytest.mark.skipif(yaml_loader.CDumper is None, reason="PyYAML was built without LibYAML")
+def test_plain_documents_are_dumped_with_libyaml(monkeypatch):
+    dumpers = []
+    dump = yaml.dump
+
+    def spy(content, **kwargs):
+        dumpers.append(kwargs.get("Dumper"))
+        return dump(content, **kwargs)
+
+    monkeypatch.setattr(yaml, "dump", spy)
+
+    dump_yaml(make_document("Plain text"))
+    dump_yaml(make_document("Two\nlines"))
+
+    assert dumpers == [yaml_loader.CDumper, None]
+
+
+def test_documents_parsed_with_a_sha_are_shared():
+    text = "data:\n  id: cached\n"
+
+    first = load_yaml(text, "0" * 40)
+    second = load_yaml("data:\n  id: ignored\n", "0" * 40)
+
+    assert first is second
+    assert first == {"data": {"id": "cached"}}
+    assert load_yaml(text) is not load_yaml(text)